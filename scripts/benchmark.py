@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmark of ingestion and question answering.
+
+Starts the API against the fake Ollama server (scripts/fake_ollama.py), the
+embedded vector store and the model-free hash embeddings, so it runs offline
+and without a GPU. It uploads a synthetic corpus through /upload, drives /ask
+(or /ask/stream) at a fixed concurrency and prints a JSON report with latency
+percentiles, requests/s, ingestion chunks/s and the server's per-stage times.
+Pass --baseline with an earlier report to compare against it.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Report fields compared with --baseline, and whether higher is better
+COMPARED_FIELDS = {
+    ("upload", "chunks_per_second"): True,
+    ("ask", "requests_per_second"): True,
+    ("ask", "latency", "p50"): False,
+    ("ask", "latency", "p95"): False,
+    ("ask", "latency", "p99"): False,
+}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def summarize(latencies: List[float]) -> Dict[str, Optional[float]]:
+    """Latency percentiles in seconds"""
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    values = np.asarray(latencies)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 6),
+        "p95": round(float(p95), 6),
+        "p99": round(float(p99), 6),
+        "mean": round(float(values.mean()), 6),
+        "max": round(float(values.max()), 6),
+    }
+
+def make_corpus(documents: int, document_size: int, vocabulary: List[str], rng: random.Random) -> List[str]:
+    """Synthetic documents of roughly document_size characters"""
+    corpus = []
+    for _ in range(documents):
+        words, size = [], 0
+        while size < document_size:
+            word = rng.choice(vocabulary)
+            words.append(word)
+            size += len(word) + 1
+        corpus.append(" ".join(words))
+    return corpus
+
+def start_process(args: List[str], env: Dict[str, str], cwd: str, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen(args, env=env, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+
+async def wait_until_up(client: httpx.AsyncClient, url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} before it came up")
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+async def run_concurrently(count: int, concurrency: int, request) -> Dict[str, Any]:
+    """Run request(i) for every i with at most `concurrency` in flight"""
+    latencies, first_tokens, errors = [], [], []
+    next_index = iter(range(count))
+
+    async def worker():
+        for i in next_index:
+            started = time.perf_counter()
+            try:
+                first_token = await request(i)
+                latencies.append(time.perf_counter() - started)
+                if first_token is not None:
+                    first_tokens.append(first_token - started)
+            except Exception as e:
+                errors.append(str(e))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {
+        "seconds": time.perf_counter() - started,
+        "latencies": latencies,
+        "first_tokens": first_tokens,
+        "errors": errors,
+    }
+
+async def upload_corpus(client: httpx.AsyncClient, base_url: str, corpus: List[str], collection: str,
+                        chunk_size: int, concurrency: int) -> Dict[str, Any]:
+    chunks = []
+
+    async def upload(i: int):
+        response = await client.post(
+            f"{base_url}/upload",
+            files={"file": (f"doc-{i}.txt", corpus[i].encode("utf-8"), "text/plain")},
+            data={"collection_name": collection, "chunk_size": str(chunk_size)}
+        )
+        response.raise_for_status()
+        chunks.append(response.json()["chunks_added"])
+
+    run = await run_concurrently(len(corpus), concurrency, upload)
+    return {
+        "documents": len(chunks),
+        "chunks": sum(chunks),
+        "errors": len(run["errors"]),
+        "seconds": round(run["seconds"], 6),
+        "chunks_per_second": round(sum(chunks) / run["seconds"], 3) if run["seconds"] else None,
+        "latency": summarize(run["latencies"]),
+    }
+
+async def ask_questions(client: httpx.AsyncClient, base_url: str, queries: List[str], collection: str,
+                        concurrency: int, stream: bool, max_tokens: Optional[int]) -> Dict[str, Any]:
+    async def ask(i: int) -> Optional[float]:
+        params = {"query": queries[i], "collection_name": collection}
+        if max_tokens:
+            params["max_tokens"] = max_tokens
+        if not stream:
+            response = await client.get(f"{base_url}/ask", params=params)
+            response.raise_for_status()
+            return None
+        first_token = None
+        async with client.stream("GET", f"{base_url}/ask/stream", params=params) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line == "event: token" and first_token is None:
+                    first_token = time.perf_counter()
+                elif line == "event: error":
+                    raise RuntimeError("stream ended with an error event")
+        return first_token
+
+    run = await run_concurrently(len(queries), concurrency, ask)
+    report = {
+        "requests": len(run["latencies"]),
+        "errors": len(run["errors"]),
+        "seconds": round(run["seconds"], 6),
+        "requests_per_second": round(len(run["latencies"]) / run["seconds"], 3) if run["seconds"] else None,
+        "latency": summarize(run["latencies"]),
+    }
+    if stream:
+        report["time_to_first_token"] = summarize(run["first_tokens"])
+    if run["errors"]:
+        report["first_error"] = run["errors"][0]
+    return report
+
+def stage_times(exposition: str) -> Dict[str, Dict[str, float]]:
+    """Count and mean of every pipeline stage from the server's /metrics"""
+    sums, counts = {}, {}
+    for family in text_string_to_metric_families(exposition):
+        if family.name != "rag_stage_duration_seconds":
+            continue
+        for sample in family.samples:
+            stage = sample.labels.get("stage")
+            if sample.name.endswith("_sum"):
+                sums[stage] = sample.value
+            elif sample.name.endswith("_count"):
+                counts[stage] = sample.value
+    return {
+        stage: {"count": int(counts[stage]), "mean_seconds": round(sums[stage] / counts[stage], 6)}
+        for stage in sorted(counts) if counts[stage]
+    }
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change of the key numbers against a baseline report; positive is better"""
+    comparison = {}
+    for path, higher_is_better in COMPARED_FIELDS.items():
+        current, previous = report, baseline
+        for key in path:
+            current = (current or {}).get(key)
+            previous = (previous or {}).get(key)
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous
+        comparison[".".join(path)] = {
+            "baseline": previous,
+            "current": current,
+            "improvement": round(change if higher_is_better else -change, 4),
+        }
+    return comparison
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    vocabulary = [f"term{i}" for i in range(args.vocabulary)]
+    corpus = make_corpus(args.documents, args.document_size, vocabulary, rng)
+    queries = [" ".join(rng.sample(vocabulary, 4)) for _ in range(args.requests + args.warmup)]
+
+    workdir = tempfile.mkdtemp(prefix="rag-benchmark-")
+    ollama_port, app_port = free_port(), free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "OLLAMA_HOST": "127.0.0.1",
+        "OLLAMA_PORT": str(ollama_port),
+        "VECTOR_BACKEND": "embedded",
+        "VECTOR_STORE_DIR": os.path.join(workdir, "vectors"),
+        "MANIFEST_DB_PATH": os.path.join(workdir, "manifests.db"),
+        "JOB_DB_PATH": os.path.join(workdir, "jobs.db"),
+        "JOB_DIR": os.path.join(workdir, "jobs"),
+        "EMBEDDING_BACKEND": args.embedding_backend,
+        "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+        "OLLAMA_MODEL_CONCURRENCY": str(args.model_concurrency),
+        "LOG_LEVEL": "warning",
+    }
+    ollama = start_process([
+        sys.executable, os.path.join(ROOT, "scripts", "fake_ollama.py"),
+        "--port", str(ollama_port),
+        "--prompt-latency-ms", str(args.prompt_latency_ms),
+        "--token-latency-ms", str(args.token_latency_ms),
+        "--answer-tokens", str(args.answer_tokens),
+        "--parallel", str(args.ollama_parallel),
+    ], env, workdir, os.path.join(workdir, "fake_ollama.log"))
+    app = start_process([
+        sys.executable, "-m", "uvicorn", "src.main:app",
+        "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning",
+    ], env, workdir, os.path.join(workdir, "app.log"))
+
+    base_url = f"http://127.0.0.1:{app_port}"
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.upload_concurrency) + 4)
+    try:
+        async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+            await wait_until_up(client, f"http://127.0.0.1:{ollama_port}/api/tags", ollama, args.startup_timeout)
+            await wait_until_up(client, f"{base_url}/health/ready", app, args.startup_timeout)
+
+            upload = await upload_corpus(client, base_url, corpus, args.collection, args.chunk_size,
+                                         args.upload_concurrency)
+            if args.warmup:
+                await ask_questions(client, base_url, queries[:args.warmup], args.collection,
+                                    args.concurrency, args.stream, args.max_tokens)
+            ask = await ask_questions(client, base_url, queries[args.warmup:], args.collection,
+                                      args.concurrency, args.stream, args.max_tokens)
+            stages = stage_times((await client.get(f"{base_url}/metrics")).text)
+    finally:
+        for process in (app, ollama):
+            process.terminate()
+        for process in (app, ollama):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "baseline", "max_regression", "keep_workdir")
+        },
+        "workdir": workdir if args.keep_workdir else None,
+        "upload": upload,
+        "ask": ask,
+        "stages": stages,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion and question answering offline")
+    workload = parser.add_argument_group("workload")
+    workload.add_argument("--documents", type=int, default=50, help="Documents to upload")
+    workload.add_argument("--document-size", type=int, default=20000, help="Characters per document")
+    workload.add_argument("--chunk-size", type=int, default=1000, help="Chunk size of the uploads")
+    workload.add_argument("--vocabulary", type=int, default=5000, help="Distinct words in the synthetic corpus")
+    workload.add_argument("--upload-concurrency", type=int, default=4, help="Uploads in flight")
+    workload.add_argument("--requests", type=int, default=200, help="Questions to ask")
+    workload.add_argument("--warmup", type=int, default=10, help="Questions asked before measuring")
+    workload.add_argument("--concurrency", type=int, default=16, help="Questions in flight")
+    workload.add_argument("--stream", action="store_true", help="Use /ask/stream and report time to first token")
+    workload.add_argument("--max-tokens", type=int, default=None, help="max_tokens of each question")
+    workload.add_argument("--collection", default="benchmark", help="Collection to use")
+    workload.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpus and questions")
+
+    server = parser.add_argument_group("server")
+    server.add_argument("--prompt-latency-ms", type=float, default=50, help="Fake Ollama prompt evaluation time")
+    server.add_argument("--token-latency-ms", type=float, default=10, help="Fake Ollama time per token")
+    server.add_argument("--answer-tokens", type=int, default=32, help="Fake Ollama tokens per answer")
+    server.add_argument("--ollama-parallel", type=int, default=4, help="Requests the fake Ollama runs at once")
+    server.add_argument("--model-concurrency", type=int, default=4, help="OLLAMA_MODEL_CONCURRENCY of the API")
+    server.add_argument("--embedding-backend", default="hash", help="EMBEDDING_BACKEND of the API")
+    server.add_argument("--answer-cache", action="store_true", help="Keep the answer cache enabled")
+    server.add_argument("--timeout", type=float, default=120, help="Client timeout per request")
+    server.add_argument("--startup-timeout", type=float, default=60, help="Time allowed for the servers to start")
+
+    parser.add_argument("--keep-workdir", action="store_true",
+                        help="Keep the temporary directory with the vector store and server logs")
+    parser.add_argument("--output", help="Write the report to this file instead of stdout")
+    parser.add_argument("--baseline", help="Earlier report to compare with")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="Exit with status 1 if a compared number is this much worse than the baseline, e.g. 0.1")
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    failed = bool(report["upload"]["errors"] or report["ask"]["errors"])
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report, json.load(f))
+        if args.max_regression is not None:
+            failed |= any(entry["improvement"] < -args.max_regression for entry in report["comparison"].values())
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
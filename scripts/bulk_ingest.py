@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+"""
+Bulk-ingest .txt/.md files, directories and .zip/.tar archives into a collection.
+Chunking runs in a process pool and chunks are added to Chroma in fixed-size batches.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.config import settings
+from src.services.ingestion_service import bulk_ingestion_service, collect_paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest documents into a collection")
+    parser.add_argument("paths", nargs="+", help="Files, directories or .zip/.tar archives to ingest")
+    parser.add_argument("--collection", required=True, help="Collection to add the documents to")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Size of the chunks to split documents into")
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_SIZE, help="Chunks per Chroma add call")
+    parser.add_argument("--workers", type=int, default=settings.INGEST_WORKERS, help="Number of chunking processes")
+    args = parser.parse_args()
+    
+    try:
+        with tempfile.TemporaryDirectory(prefix="bulk-ingest-") as directory:
+            report = bulk_ingestion_service.ingest(
+                collect_paths(args.paths, directory),
+                collection_name=args.collection,
+                chunk_size=args.chunk_size,
+                batch_size=args.batch_size,
+                workers=args.workers
+            )
+    finally:
+        bulk_ingestion_service.shutdown()
+    
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed_batches"] or report["files_failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+A stand-in for the Ollama HTTP API with configurable latency and throughput.
+Serves /api/tags, /api/generate (streaming and not) and /api/chat, so the
+application can be run and benchmarked without a GPU or a model download.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+import uvicorn
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.config import settings
+
+# Filler words the fake model answers with
+ANSWER_WORDS = ("the", "answer", "is", "in", "the", "retrieved", "context", "and", "it", "says")
+
+def create_app(prompt_latency_ms: float = 50, token_latency_ms: float = 20, answer_tokens: int = 64,
+               parallel: int = 4, load_latency_ms: float = 0) -> FastAPI:
+    """
+    Build the fake Ollama app
+
+    Args:
+        prompt_latency_ms: Prompt evaluation time per request
+        token_latency_ms: Time per generated token, i.e. 1000 / tokens per second
+        answer_tokens: Tokens generated when the request sets no num_predict
+        parallel: Requests processed at once, like OLLAMA_NUM_PARALLEL; the rest wait
+        load_latency_ms: Model load time paid by the first request for each model
+    """
+    app = FastAPI(title="Fake Ollama")
+    slots = asyncio.Semaphore(parallel)
+    loaded = set()
+
+    async def generate(payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        model = payload.get("model") or settings.DEFAULT_MODEL
+        tokens = min(answer_tokens, payload.get("options", {}).get("num_predict") or answer_tokens)
+        prompt = payload.get("prompt") or json.dumps(payload.get("messages", []))
+        async with slots:
+            started = time.perf_counter()
+            load_seconds = 0.0
+            if model not in loaded:
+                load_seconds = load_latency_ms / 1000
+                await asyncio.sleep(load_seconds)
+                loaded.add(model)
+            await asyncio.sleep(prompt_latency_ms / 1000)
+            for i in range(tokens):
+                await asyncio.sleep(token_latency_ms / 1000)
+                yield {"model": model, "response": ANSWER_WORDS[i % len(ANSWER_WORDS)] + " ", "done": False}
+            total = time.perf_counter() - started
+        yield {
+            "model": model,
+            "response": "",
+            "done": True,
+            "total_duration": int(total * 1e9),
+            "load_duration": int(load_seconds * 1e9),
+            "prompt_eval_count": max(1, len(prompt) // 4),
+            "prompt_eval_duration": int(prompt_latency_ms * 1e6),
+            "eval_count": tokens,
+            "eval_duration": int(tokens * token_latency_ms * 1e6),
+        }
+
+    async def respond(payload: Dict[str, Any], to_body):
+        if payload.get("stream", True):
+            async def lines():
+                async for chunk in generate(payload):
+                    yield json.dumps(to_body(chunk)) + "\n"
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+        text = []
+        async for chunk in generate(payload):
+            text.append(chunk["response"])
+        return to_body({**chunk, "response": "".join(text)})
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": settings.DEFAULT_MODEL}]}
+
+    @app.post("/api/generate")
+    async def api_generate(request: Request):
+        payload = await request.json()
+        if not payload.get("prompt"):
+            # A request without a prompt only loads the model
+            async with slots:
+                loaded.add(payload.get("model"))
+            return {"model": payload.get("model"), "response": "", "done": True}
+        return await respond(payload, lambda chunk: chunk)
+
+    @app.post("/api/chat")
+    async def api_chat(request: Request):
+        payload = await request.json()
+
+        def to_chat(chunk):
+            body = {key: value for key, value in chunk.items() if key != "response"}
+            return {**body, "message": {"role": "assistant", "content": chunk["response"]}}
+
+        return await respond(payload, to_chat)
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Ollama API")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=11434, help="Port to listen on")
+    parser.add_argument("--prompt-latency-ms", type=float, default=50, help="Prompt evaluation time per request")
+    parser.add_argument("--token-latency-ms", type=float, default=20, help="Time per generated token")
+    parser.add_argument("--answer-tokens", type=int, default=64, help="Tokens per answer unless num_predict is lower")
+    parser.add_argument("--parallel", type=int, default=4, help="Requests processed at once")
+    parser.add_argument("--load-latency-ms", type=float, default=0, help="Load time of the first request per model")
+    args = parser.parse_args()
+
+    app = create_app(
+        prompt_latency_ms=args.prompt_latency_ms,
+        token_latency_ms=args.token_latency_ms,
+        answer_tokens=args.answer_tokens,
+        parallel=args.parallel,
+        load_latency_ms=args.load_latency_ms
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""
+Export a collection to a snapshot file, or load a snapshot into a collection.
+Snapshots hold the documents, metadata and embeddings, so loading one needs no embedding.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.config import settings
+from src.services.snapshot_service import SNAPSHOT_DTYPES, snapshot_service
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import collection snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Write a collection to a snapshot file")
+    export.add_argument("collection", help="Collection to export")
+    export.add_argument("path", help="Snapshot file to write, e.g. documents.npz")
+    export.add_argument("--dtype", choices=SNAPSHOT_DTYPES, default=settings.SNAPSHOT_DTYPE, help="Vector precision")
+    export.add_argument("--page-size", type=int, default=settings.SNAPSHOT_PAGE_SIZE, help="Documents read at a time")
+
+    load = commands.add_parser("import", help="Load a snapshot file into a collection")
+    load.add_argument("path", help="Snapshot file to load")
+    load.add_argument("--collection", help="Collection to load into (default: the exported collection)")
+    load.add_argument("--force", action="store_true", help="Load even if it was embedded with another model")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        report = snapshot_service.export_collection(args.collection, args.path, args.dtype, args.page_size)
+    else:
+        report = snapshot_service.import_collection(args.path, args.collection, args.force)
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+"""
+Startup benchmark of the API.
+
+Imports src.main in fresh interpreters with -X importtime and reports the
+total import time, the time of every src module (its own and including what
+it imports) and the third-party packages that cost the most. Unless
+--no-serve is given it then starts the server, like scripts/benchmark.py,
+against the fake Ollama server and the embedded vector store, and reports
+the time until /health/live and /health/ready answer and the time of every
+warm-up step. Pass --baseline with an earlier report to compare against it.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from benchmark import ROOT, free_port, start_process
+
+# Report fields compared with --baseline; all of them are better lower
+COMPARED_FIELDS = (
+    ("imports", "total_ms"),
+    ("serve", "time_to_live"),
+    ("serve", "time_to_ready"),
+)
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+def profile_imports(module: str, env: Dict[str, str]) -> Dict[str, Dict[str, float]]:
+    """Own and cumulative import time in microseconds of every module imported by `import module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    times: Dict[str, Dict[str, float]] = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, _, name = match.groups()
+        # A module imported again while it is being imported shows up twice
+        entry = times.setdefault(name, {"self": 0, "cumulative": 0})
+        entry["self"] += int(own)
+        entry["cumulative"] = max(entry["cumulative"], int(cumulative))
+    return times
+
+def import_report(module: str, runs: int, top: int, env: Dict[str, str]) -> Dict[str, Any]:
+    """Median import times over several runs, in milliseconds"""
+    profiles = [profile_imports(module, env) for _ in range(runs)]
+
+    def median_ms(name: str, field: str) -> float:
+        return round(statistics.median(profile.get(name, {}).get(field, 0) for profile in profiles) / 1000, 3)
+
+    names = set().union(*profiles)
+    modules = {
+        name: {"self_ms": median_ms(name, "self"), "cumulative_ms": median_ms(name, "cumulative")}
+        for name in sorted(names) if name == "src" or name.startswith("src.")
+    }
+    # Attribute every module's own time to its top-level package, so nothing is counted twice
+    packages: Dict[str, List[float]] = defaultdict(lambda: [0.0] * runs)
+    for i, profile in enumerate(profiles):
+        for name, entry in profile.items():
+            if name != "src" and not name.startswith("src."):
+                packages[name.split(".")[0]][i] += entry["self"] / 1000
+    package_ms = {name: round(statistics.median(values), 3) for name, values in packages.items()}
+    return {
+        "module": module,
+        "runs": runs,
+        "total_ms": median_ms(module, "cumulative"),
+        "modules": modules,
+        "packages": dict(sorted(package_ms.items(), key=lambda item: -item[1])[:top]),
+        "loaded": {
+            "chromadb": any("chromadb" in profile for profile in profiles),
+            "langgraph": any("langgraph" in profile for profile in profiles),
+            "langchain_core": any("langchain_core" in profile for profile in profiles),
+        },
+    }
+
+def wait_for(client: httpx.Client, url: str, process: subprocess.Popen, started: float, timeout: float) -> float:
+    """Seconds from started until url answers 200"""
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} before it came up")
+        try:
+            if client.get(url).status_code == 200:
+                return round(time.perf_counter() - started, 3)
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def serve_report(args: argparse.Namespace, env: Dict[str, str]) -> Dict[str, Any]:
+    """Time until the server is live and ready, and the time of each warm-up step"""
+    workdir = tempfile.mkdtemp(prefix="rag-startup-")
+    ollama_port, app_port = free_port(), free_port()
+    env = {
+        **env,
+        "OLLAMA_HOST": "127.0.0.1",
+        "OLLAMA_PORT": str(ollama_port),
+        "VECTOR_BACKEND": "embedded",
+        "VECTOR_STORE_DIR": os.path.join(workdir, "vectors"),
+        "MANIFEST_DB_PATH": os.path.join(workdir, "manifests.db"),
+        "JOB_DB_PATH": os.path.join(workdir, "jobs.db"),
+        "JOB_DIR": os.path.join(workdir, "jobs"),
+        "EMBEDDING_BACKEND": args.embedding_backend,
+        "HEALTH_PROBE_INTERVAL": "0.5",
+        "LOG_LEVEL": "warning",
+    }
+    ollama = start_process([
+        sys.executable, os.path.join(ROOT, "scripts", "fake_ollama.py"), "--port", str(ollama_port),
+    ], env, workdir, os.path.join(workdir, "fake_ollama.log"))
+    base_url = f"http://127.0.0.1:{app_port}"
+    app = None
+    try:
+        with httpx.Client(timeout=5) as client:
+            wait_for(client, f"http://127.0.0.1:{ollama_port}/api/tags", ollama, time.perf_counter(),
+                     args.startup_timeout)
+            started = time.perf_counter()
+            app = start_process([
+                sys.executable, "-m", "uvicorn", "src.main:app",
+                "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning",
+            ], env, workdir, os.path.join(workdir, "app.log"))
+            time_to_live = wait_for(client, f"{base_url}/health/live", app, started, args.startup_timeout)
+            time_to_ready = wait_for(client, f"{base_url}/health/ready", app, started, args.startup_timeout)
+            ready = client.get(f"{base_url}/health/ready").json()
+    finally:
+        for process in (app, ollama):
+            if process is not None:
+                process.terminate()
+        for process in (app, ollama):
+            if process is None:
+                continue
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "time_to_live": time_to_live,
+        "time_to_ready": time_to_ready,
+        "warmup_seconds": ready["warmup"]["seconds"],
+        "warmup_steps": ready["warmup"]["steps"],
+    }
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change of the key numbers against a baseline report; positive is better"""
+    comparison = {}
+    for path in COMPARED_FIELDS:
+        current, previous = report, baseline
+        for key in path:
+            current = (current or {}).get(key)
+            previous = (previous or {}).get(key)
+        if not current or not previous:
+            continue
+        comparison[".".join(path)] = {
+            "baseline": previous,
+            "current": current,
+            "improvement": round(-(current - previous) / previous, 4),
+        }
+    return comparison
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import and startup time of the API")
+    parser.add_argument("--module", default="src.main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Import runs; the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="Third-party packages to list")
+    parser.add_argument("--no-serve", action="store_true", help="Only profile the imports")
+    parser.add_argument("--embedding-backend", default="hash", help="EMBEDDING_BACKEND of the server")
+    parser.add_argument("--startup-timeout", type=float, default=60, help="Time allowed for the servers to start")
+    parser.add_argument("--output", help="Write the report to this file instead of stdout")
+    parser.add_argument("--baseline", help="Earlier report to compare with")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="Exit with status 1 if a compared number is this much worse than the baseline, e.g. 0.2")
+    args = parser.parse_args()
+
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    report: Dict[str, Optional[Dict[str, Any]]] = {
+        "imports": import_report(args.module, args.runs, args.top, env),
+        "serve": None if args.no_serve else serve_report(args, env),
+    }
+    failed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report, json.load(f))
+        if args.max_regression is not None:
+            failed = any(entry["improvement"] < -args.max_regression for entry in report["comparison"].values())
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,5 +2,8 @@ from src.api.dependencies.dependencies import (
     get_chroma_client,
     get_ollama_service,
     get_langgraph_service,
-    get_file_service
+    get_file_service,
+    get_bulk_ingestion_service,
+    get_job_service,
+    get_answer_cache
 ) 
\ No newline at end of file
@@ -5,10 +5,21 @@ from src.db.chroma_client import chroma_client
 from src.services.ollama_service import ollama_service
 from src.services.langgraph_service import langgraph_service
 from src.services.file_service import file_service
+from src.services.cache_service import answer_cache
+from src.services.ingestion_service import bulk_ingestion_service
+from src.services.job_service import job_service
+from src.services.model_registry import model_registry
+from src.services.scheduler import llm_scheduler
+from src.services.session_service import session_store
+from src.services.snapshot_service import snapshot_service
+from src.core.tracing import trace_sink
 
 def get_chroma_client():
     """Dependency for ChromaDB client"""
-    if not chroma_client.client:
+    # While the circuit is open, fail fast with a 503 instead of reconnecting
+    if chroma_client.breaker is not None:
+        chroma_client.breaker.check()
+    if not chroma_client.is_connected:
         success = chroma_client.connect()
         if not success:
             raise HTTPException(
@@ -17,10 +28,11 @@ def get_chroma_client():
             )
     return chroma_client
 
-def get_ollama_service():
+async def get_ollama_service():
     """Dependency for Ollama service"""
+    ollama_service.breaker.check()
     if not ollama_service.is_connected:
-        success = ollama_service.connect()
+        success = await ollama_service.connect()
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -34,4 +46,36 @@ def get_langgraph_service():
 
 def get_file_service():
     """Dependency for File service"""
-    return file_service 
\ No newline at end of file
+    return file_service 
+
+def get_bulk_ingestion_service():
+    """Dependency for the bulk ingestion service"""
+    return bulk_ingestion_service
+
+def get_job_service():
+    """Dependency for the ingestion job service"""
+    return job_service
+
+def get_answer_cache():
+    """Dependency for the answer cache"""
+    return answer_cache
+
+def get_model_registry():
+    """Dependency for the model registry"""
+    return model_registry
+
+def get_llm_scheduler():
+    """Dependency for the LLM request scheduler"""
+    return llm_scheduler
+
+def get_session_store():
+    """Dependency for the conversation session store"""
+    return session_store
+
+def get_snapshot_service():
+    """Dependency for the collection snapshot service"""
+    return snapshot_service
+
+def get_trace_sink():
+    """Dependency for the request trace sink"""
+    return trace_sink
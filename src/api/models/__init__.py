@@ -1,7 +1,26 @@
 from src.api.models.api_models import (
     AskResponse,
+    BatchQuery,
+    BatchAskRequest,
+    BatchAskResult,
+    BatchAskResponse,
+    SearchFilter,
+    SearchRequest,
+    SearchHit,
+    SearchResult,
+    SearchResponse,
     CollectionResponse,
     CollectionCreateResponse,
+    DeleteResponse,
     FileUploadResponse,
+    BulkUploadResponse,
+    SnapshotImportResponse,
+    TraceSpan,
+    TraceResponse,
+    JobResponse,
+    JobListResponse,
+    CacheStatsResponse,
+    ModelInfo,
+    ModelListResponse,
     ErrorResponse
 ) 
\ No newline at end of file
@@ -1,11 +1,76 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Literal, Optional, Union
 
 class AskResponse(BaseModel):
     """Response model for the ask endpoint"""
     answer: str
     sources: List[Dict[str, Any]]
 
+class BatchQuery(BaseModel):
+    """A single query of a batch ask request"""
+    query: str
+    collection_name: Union[str, List[str]]
+    model_name: Optional[str] = None
+    temperature: Optional[float] = Field(default=None, ge=0, le=2)
+    top_p: Optional[float] = Field(default=None, gt=0, le=1)
+    max_tokens: Optional[int] = Field(default=None, ge=1, le=8192)
+    n_results: Optional[int] = Field(default=None, ge=1, le=50)
+    vector_weight: Optional[float] = Field(default=None, ge=0)
+    lexical_weight: Optional[float] = Field(default=None, ge=0)
+
+class BatchAskRequest(BaseModel):
+    """Request model for the batch ask endpoint"""
+    queries: List[BatchQuery] = Field(min_length=1)
+    stream: bool = False
+    concurrency: Optional[int] = Field(default=None, ge=1)
+    priority: Literal["interactive", "batch"] = "batch"
+
+class BatchAskResult(BaseModel):
+    """The answer to one query of a batch, or the error it failed with"""
+    index: int
+    query: str
+    answer: Optional[str] = None
+    sources: List[Dict[str, Any]] = []
+    error: Optional[str] = None
+
+class BatchAskResponse(BaseModel):
+    """Response model for the batch ask endpoint"""
+    results: List[BatchAskResult]
+
+class SearchFilter(BaseModel):
+    """Metadata conditions a search hit must meet, all of them when several are given"""
+    sources: Optional[List[str]] = Field(default=None, min_length=1)
+    chunk_min: Optional[int] = Field(default=None, ge=0)
+    chunk_max: Optional[int] = Field(default=None, ge=0)
+
+class SearchRequest(BaseModel):
+    """Request model for the search endpoint"""
+    queries: List[str] = Field(min_length=1)
+    collection_name: str
+    n_results: int = Field(default=10, ge=1)
+    offset: int = Field(default=0, ge=0)
+    filter: Optional[SearchFilter] = None
+    vector_weight: Optional[float] = Field(default=None, ge=0)
+    lexical_weight: Optional[float] = Field(default=None, ge=0)
+
+class SearchHit(BaseModel):
+    """A chunk found by a search"""
+    id: str
+    distance: Optional[float] = None
+    score: float
+    content: str
+    metadata: Dict[str, Any]
+
+class SearchResult(BaseModel):
+    """The hits of one query of a search, and the offset of the next page if there may be one"""
+    query: str
+    hits: List[SearchHit]
+    next_offset: Optional[int] = None
+
+class SearchResponse(BaseModel):
+    """Response model for the search endpoint"""
+    results: List[SearchResult]
+
 class CollectionResponse(BaseModel):
     """Response model for the collections endpoint"""
     collections: List[str]
@@ -14,13 +79,126 @@ class CollectionCreateResponse(BaseModel):
     """Response model for the collection creation endpoint"""
     message: str
 
+class DeleteResponse(BaseModel):
+    """Response model for endpoints that delete or clear something"""
+    message: str
+
 class FileUploadResponse(BaseModel):
     """Response model for the file upload endpoint"""
     message: str
     collection: str
     chunks_added: int
+    chunks_unchanged: int = 0
+    chunks_removed: int = 0
     file_kept: bool
 
+class JobResponse(BaseModel):
+    """Response model for ingestion jobs"""
+    id: str
+    state: str
+    filename: str
+    collection: str
+    chunks_total: int
+    chunks_done: int
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+class JobListResponse(BaseModel):
+    """Response model for the job listing endpoint"""
+    jobs: List[JobResponse]
+
+class BulkUploadResponse(BaseModel):
+    """Response model for the bulk upload endpoint"""
+    collection: str
+    files_processed: int
+    files_failed: int
+    chunks_added: int
+    chunks_unchanged: int
+    chunks_removed: int
+    chunks_failed: int
+    batches: int
+    failed_batches: int
+    elapsed_seconds: float
+    files_per_second: float
+    chunks_per_second: float
+    errors: List[Dict[str, Any]]
+
+class SnapshotImportResponse(BaseModel):
+    """Response model for the snapshot import endpoint"""
+    collection: str
+    documents_added: int
+    pages: int
+    dtype: str
+    elapsed_seconds: float
+
+class TraceSpan(BaseModel):
+    """A timed operation of a traced request"""
+    span_id: str
+    parent_id: Optional[str] = None
+    name: str
+    start: float
+    duration_ms: Optional[float] = None
+    attributes: Dict[str, Any] = {}
+    error: Optional[str] = None
+
+class TraceResponse(BaseModel):
+    """Response model for the trace endpoint"""
+    trace_id: str
+    name: str
+    start: Optional[float] = None
+    duration_ms: Optional[float] = None
+    spans: List[TraceSpan]
+
+class CacheStatsResponse(BaseModel):
+    """Response model for the answer cache stats endpoint"""
+    hits: int
+    semantic_hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+    hit_rate: float
+    entries: int
+    bytes: int
+    max_entries: int
+    max_bytes: int
+    semantic: bool
+
+class SessionStatsResponse(BaseModel):
+    """Response model for the session stats endpoint"""
+    sessions: int
+    created: int
+    expired: int
+    evicted: int
+    ttl: float
+    max_sessions: int
+
+class ModelInfo(BaseModel):
+    """Configuration and usage counters of one model"""
+    name: str
+    default: bool
+    preload: bool
+    loaded: bool
+    available: Optional[bool] = None
+    max_concurrency: int
+    context_window: int
+    in_flight: int
+    requests: int
+    failures: int
+    last_used: Optional[float] = None
+    queue_depth: int = 0
+    admitted: int = 0
+    rejected: int = 0
+    timeouts: int = 0
+    wait_seconds_total: float = 0.0
+    avg_service_seconds: Optional[float] = None
+
+class ModelListResponse(BaseModel):
+    """Response model for the models endpoint"""
+    default_model: str
+    models: List[ModelInfo]
+
 class ErrorResponse(BaseModel):
     """Response model for errors"""
     detail: str 
\ No newline at end of file
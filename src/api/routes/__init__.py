@@ -2,6 +2,11 @@ from fastapi import APIRouter
 from src.api.routes.collection_routes import router as collection_router
 from src.api.routes.file_routes import router as file_router
 from src.api.routes.query_routes import router as query_router
+from src.api.routes.cache_routes import router as cache_router
+from src.api.routes.job_routes import router as job_router
+from src.api.routes.model_routes import router as model_router
+from src.api.routes.session_routes import router as session_router
+from src.api.routes.trace_routes import router as trace_router
 
 # Create a router that includes all routes
 router = APIRouter()
@@ -9,4 +14,9 @@ router = APIRouter()
 # Include all routers
 router.include_router(collection_router)
 router.include_router(file_router)
-router.include_router(query_router) 
\ No newline at end of file
+router.include_router(query_router)
+router.include_router(cache_router)
+router.include_router(job_router)
+router.include_router(model_router)
+router.include_router(session_router)
+router.include_router(trace_router)
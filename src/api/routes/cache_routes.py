@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+
+from src.api.models.api_models import CacheStatsResponse, DeleteResponse
+from src.api.dependencies.dependencies import get_answer_cache
+from src.services.cache_service import AnswerCache
+
+router = APIRouter(prefix="/cache", tags=["Cache"])
+
+@router.get("/stats", response_model=CacheStatsResponse)
+async def get_cache_stats(answer_cache: AnswerCache = Depends(get_answer_cache)):
+    """Hit/miss counters and current size of the answer cache"""
+    return answer_cache.stats()
+
+@router.delete("", response_model=DeleteResponse)
+async def clear_cache(answer_cache: AnswerCache = Depends(get_answer_cache)):
+    """Drop every cached answer"""
+    answer_cache.clear()
+    return {"message": "Answer cache cleared"}
@@ -1,9 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+import os
+import shutil
+import tempfile
 
-from src.api.models.api_models import CollectionResponse, CollectionCreateResponse
-from src.api.dependencies.dependencies import get_chroma_client
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from typing import List, Optional
+
+from src.api.models.api_models import CollectionResponse, CollectionCreateResponse, SnapshotImportResponse
+from src.api.dependencies.dependencies import get_chroma_client, get_snapshot_service
+from src.core import metrics
+from src.core.resilience import BackendUnavailable
 from src.db.chroma_client import ChromaDBClient
+from src.services.snapshot_service import SNAPSHOT_DTYPES, SnapshotService
 
 router = APIRouter(prefix="/collections", tags=["Collections"])
 
@@ -16,8 +26,78 @@ async def get_collections(chroma_client: ChromaDBClient = Depends(get_chroma_cli
 @router.post("/{collection_name}", response_model=CollectionCreateResponse)
 async def create_collection(collection_name: str, chroma_client: ChromaDBClient = Depends(get_chroma_client)):
     """Create a new collection"""
+    metrics.label_request(collection_name=collection_name)
     try:
         chroma_client.create_collection(name=collection_name)
         return {"message": f"Collection '{collection_name}' created successfully"}
+    except BackendUnavailable:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{collection_name}/snapshot", response_class=FileResponse)
+async def export_snapshot(
+    collection_name: str,
+    dtype: Optional[str] = Query(default=None, description=f"Vector precision, one of {SNAPSHOT_DTYPES} (default: SNAPSHOT_DTYPE)"),
+    chroma_client: ChromaDBClient = Depends(get_chroma_client),
+    snapshot_service: SnapshotService = Depends(get_snapshot_service)
+):
+    """
+    Download a snapshot of a collection: its ids, documents, metadata and embeddings in an .npz file
+    
+    Load it with `POST /collections/{collection_name}/snapshot` to rebuild the
+    collection without recomputing any embeddings.
+    """
+    metrics.label_request(collection_name=collection_name)
+    if collection_name not in chroma_client.list_collections():
+        raise HTTPException(status_code=404, detail=f"Collection '{collection_name}' not found")
+    
+    fd, path = tempfile.mkstemp(suffix=".npz")
+    os.close(fd)
+    try:
+        await run_in_threadpool(snapshot_service.export_collection, collection_name, path, dtype)
+    except ValueError as e:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BackendUnavailable:
+        os.remove(path)
+        raise
+    except Exception as e:
+        os.remove(path)
+        raise HTTPException(status_code=500, detail=str(e))
+    return FileResponse(
+        path,
+        media_type="application/octet-stream",
+        filename=f"{collection_name}.npz",
+        background=BackgroundTask(os.remove, path)
+    )
+
+@router.post("/{collection_name}/snapshot", response_model=SnapshotImportResponse)
+async def import_snapshot(
+    collection_name: str,
+    file: UploadFile = File(...),
+    force: bool = Form(False),
+    chroma_client: ChromaDBClient = Depends(get_chroma_client),
+    snapshot_service: SnapshotService = Depends(get_snapshot_service)
+):
+    """
+    Load a snapshot into a collection, creating it if needed, without recomputing embeddings
+    
+    Parameters:
+    - file: A snapshot downloaded from `GET /collections/{collection_name}/snapshot`
+    - force: Load it even if it was embedded with another model than the one queries use (default: False)
+    """
+    metrics.label_request(collection_name=collection_name)
+    fd, path = tempfile.mkstemp(suffix=".npz")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            await run_in_threadpool(shutil.copyfileobj, file.file, buffer)
+        return await run_in_threadpool(snapshot_service.import_collection, path, collection_name, force)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BackendUnavailable:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        os.remove(path)
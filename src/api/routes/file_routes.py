@@ -1,9 +1,20 @@
+import os
+import shutil
+import tempfile
+
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
 
-from src.api.models.api_models import FileUploadResponse
-from src.api.dependencies.dependencies import get_file_service, get_chroma_client
+from src.api.models.api_models import FileUploadResponse, BulkUploadResponse, JobResponse
+from src.api.dependencies.dependencies import get_file_service, get_chroma_client, get_bulk_ingestion_service, get_job_service
+from src.api.routes.job_routes import format_job
+from src.core import metrics
+from src.core.config import settings
+from src.core.resilience import BackendUnavailable
 from src.services.file_service import FileService
+from src.services.ingestion_service import BulkIngestionService, spool_documents
+from src.services.job_service import JobService
 from src.db.chroma_client import ChromaDBClient
 
 router = APIRouter(tags=["Files"])
@@ -14,18 +25,26 @@ async def upload_file(
     collection_name: str = Form(...),
     chunk_size: Optional[int] = Form(1000),
     keep_file: bool = Form(False),
+    chunk_overlap: Optional[int] = Form(None),
+    size_unit: Optional[str] = Form(None),
     file_service: FileService = Depends(get_file_service),
     chroma_client: ChromaDBClient = Depends(get_chroma_client)
 ):
     """
     Upload a .txt or .md file and add its content to the specified collection
     
+    The file is chunked while it is read and chunks are added in batches, so
+    memory use stays bounded regardless of the file size.
+    
     Parameters:
     - file: The file to upload (.txt or .md)
     - collection_name: The name of the collection to add the document to
     - chunk_size: The size of chunks to split the document into (default: 1000)
     - keep_file: Whether to keep the uploaded file in the data/uploads directory (default: False)
+    - chunk_overlap: How much of each chunk is repeated at the start of the next (default: CHUNK_OVERLAP)
+    - size_unit: Whether chunk_size and chunk_overlap count "chars" or "tokens" (default: CHUNK_SIZE_UNIT)
     """
+    metrics.label_request(collection_name=collection_name)
     try:
         # Ensure chunk_size is an integer
         chunk_size_value = 1000 if chunk_size is None else chunk_size
@@ -34,10 +53,106 @@ async def upload_file(
             file=file,
             collection_name=collection_name,
             chunk_size=chunk_size_value,
-            keep_file=keep_file
+            keep_file=keep_file,
+            chunk_overlap=chunk_overlap,
+            size_unit=size_unit
         )
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except BackendUnavailable:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+@router.post("/upload/async", response_model=JobResponse, status_code=202)
+async def upload_file_async(
+    file: UploadFile = File(...),
+    collection_name: str = Form(...),
+    chunk_size: Optional[int] = Form(1000),
+    keep_file: bool = Form(False),
+    chunk_overlap: Optional[int] = Form(None),
+    size_unit: Optional[str] = Form(None),
+    job_service: JobService = Depends(get_job_service)
+):
+    """
+    Queue a .txt or .md file for background ingestion and return its job at once
+    
+    Poll `/jobs/{job_id}` for the job's state and progress.
+    
+    Parameters:
+    - file: The file to upload (.txt or .md)
+    - collection_name: The name of the collection to add the document to
+    - chunk_size: The size of chunks to split the document into (default: 1000)
+    - keep_file: Whether to keep the uploaded file in the data/uploads directory (default: False)
+    - chunk_overlap: How much of each chunk is repeated at the start of the next (default: CHUNK_OVERLAP)
+    - size_unit: Whether chunk_size and chunk_overlap count "chars" or "tokens" (default: CHUNK_SIZE_UNIT)
+    """
+    metrics.label_request(collection_name=collection_name)
+    try:
+        job = await job_service.submit(
+            file=file,
+            collection_name=collection_name,
+            chunk_size=1000 if chunk_size is None else chunk_size,
+            keep_file=keep_file,
+            chunk_overlap=chunk_overlap,
+            size_unit=size_unit
+        )
+        return format_job(job)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/upload/bulk", response_model=BulkUploadResponse)
+async def upload_bulk(
+    files: List[UploadFile] = File(...),
+    collection_name: str = Form(...),
+    chunk_size: Optional[int] = Form(1000),
+    batch_size: Optional[int] = Form(None),
+    bulk_ingestion_service: BulkIngestionService = Depends(get_bulk_ingestion_service),
+    chroma_client: ChromaDBClient = Depends(get_chroma_client)
+):
+    """
+    Upload many .txt/.md files, or .zip/.tar archives of them, into a collection
+    
+    Files and archive members are spooled to disk under JOB_DIR and read from
+    there by the chunking processes, so uploads are never held in memory whole.
+    
+    Parameters:
+    - files: The files and/or archives to upload
+    - collection_name: The name of the collection to add the documents to
+    - chunk_size: The size of chunks to split the documents into (default: 1000)
+    - batch_size: Number of chunks embedded and added per batch (default: INGEST_BATCH_SIZE)
+    
+    Returns throughput (files/s, chunks/s) and the errors of any failed files or batches.
+    """
+    metrics.label_request(collection_name=collection_name)
+    os.makedirs(settings.JOB_DIR, exist_ok=True)
+    directory = tempfile.mkdtemp(prefix="bulk-", dir=settings.JOB_DIR)
+    try:
+        def spool():
+            documents = []
+            for upload in files:
+                documents.extend(spool_documents(upload.filename or "", upload.file, directory))
+            return documents
+        
+        try:
+            documents = await run_in_threadpool(spool)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not read upload: {e}")
+        
+        try:
+            return await run_in_threadpool(
+                bulk_ingestion_service.ingest,
+                documents,
+                collection_name,
+                1000 if chunk_size is None else chunk_size,
+                batch_size
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await run_in_threadpool(shutil.rmtree, directory, True)
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Any, Dict, Optional
+
+from src.api.models.api_models import JobResponse, JobListResponse
+from src.api.dependencies.dependencies import get_job_service
+from src.services.job_service import JobService
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+def format_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a stored job into its API representation"""
+    return {
+        "id": job["id"],
+        "state": job["state"],
+        "filename": job["filename"],
+        "collection": job["collection_name"],
+        "chunks_total": job["chunks_total"],
+        "chunks_done": job["chunks_done"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
+@router.get("", response_model=JobListResponse)
+async def list_jobs(
+    state: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    job_service: JobService = Depends(get_job_service)
+):
+    """List the most recent ingestion jobs, optionally filtered by state"""
+    return {"jobs": [format_job(job) for job in job_service.list_jobs(state=state, limit=limit)]}
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, job_service: JobService = Depends(get_job_service)):
+    """Get the state and progress of an ingestion job"""
+    job = job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return format_job(job)
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends
+
+from src.api.models.api_models import ModelListResponse
+from src.api.dependencies.dependencies import get_llm_scheduler, get_model_registry, get_ollama_service
+from src.services.model_registry import ModelRegistry
+from src.services.ollama_service import OllamaService
+from src.services.scheduler import LLMScheduler
+
+router = APIRouter(prefix="/models", tags=["Models"])
+
+@router.get("", response_model=ModelListResponse)
+async def get_models(
+    model_registry: ModelRegistry = Depends(get_model_registry),
+    llm_scheduler: LLMScheduler = Depends(get_llm_scheduler),
+    ollama_service: OllamaService = Depends(get_ollama_service)
+):
+    """
+    List the models this deployment serves
+    
+    Includes every configured model and any model requested since startup,
+    with its concurrency limit, in-flight requests, scheduler queue depth,
+    wait time and rejections, and whether Ollama has it.
+    """
+    try:
+        available = set(await ollama_service.list_models())
+    except Exception as e:
+        print(f"Warning: Could not list Ollama models: {e}")
+        available = None
+    
+    models = model_registry.stats()
+    queues = llm_scheduler.stats()
+    for model in models:
+        model.update(queues.get(model["name"], {}))
+        model["available"] = model["name"] in available if available is not None else None
+    return {"default_model": model_registry.default_model, "models": models}
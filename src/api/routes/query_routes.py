@@ -1,20 +1,42 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Dict, Any
 
-from src.api.models.api_models import AskResponse
+from src.api.models.api_models import (
+    AskResponse, BatchAskRequest, BatchAskResponse, SearchFilter, SearchRequest, SearchResponse
+)
 from src.api.dependencies.dependencies import get_langgraph_service, get_ollama_service, get_chroma_client
-from src.services.langgraph_service import LangGraphService
+from src.services.langgraph_service import LangGraphService, join_collections
 from src.services.ollama_service import OllamaService
+from src.services.scheduler import PRIORITIES, SchedulerRejected
 from src.db.chroma_client import ChromaDBClient
+from src.core import metrics
+from src.core.resilience import BackendUnavailable
 from src.core.config import settings
 
 router = APIRouter(tags=["Queries"])
 
+def parse_collections(values: List[str]) -> str:
+    """Collection names given as repeated or comma-separated query parameters"""
+    names = [name.strip() for value in values for name in value.split(",") if name.strip()]
+    if not names:
+        raise HTTPException(status_code=422, detail="collection_name must name at least one collection")
+    return join_collections(names)
+
 @router.get("/ask", response_model=AskResponse)
 async def ask(
     query: str,
-    collection_name: str,
+    collection_name: List[str] = Query(),
     model_name: str = Query(default=settings.DEFAULT_MODEL),
+    temperature: Optional[float] = Query(default=None, ge=0, le=2),
+    top_p: Optional[float] = Query(default=None, gt=0, le=1),
+    max_tokens: Optional[int] = Query(default=None, ge=1, le=8192),
+    n_results: int = Query(default=settings.RETRIEVAL_N_RESULTS, ge=1, le=50),
+    vector_weight: float = Query(default=settings.HYBRID_VECTOR_WEIGHT, ge=0),
+    lexical_weight: float = Query(default=settings.HYBRID_LEXICAL_WEIGHT, ge=0),
+    session_id: Optional[str] = Query(default=None, min_length=1, max_length=128),
     langgraph_service: LangGraphService = Depends(get_langgraph_service),
     ollama_service: OllamaService = Depends(get_ollama_service),
     chroma_client: ChromaDBClient = Depends(get_chroma_client)
@@ -24,18 +46,32 @@ async def ask(
     
     Parameters:
     - query: The question to ask
-    - collection_name: The name of the collection to search in
+    - collection_name: The name of the collection to search in. Repeat it, or
+      separate names with commas, to search several collections concurrently
+      and merge their results (each is given RETRIEVAL_COLLECTION_TIMEOUT)
     - model_name: The name of the Ollama model to use (default: tinyllama:latest)
+    - temperature, top_p, max_tokens: (Optional) Generation options for this request
+    - n_results: Number of documents to retrieve (default: RETRIEVAL_N_RESULTS)
+    - vector_weight: Weight of dense search in the rank fusion, 0 disables it
+    - lexical_weight: Weight of BM25 keyword search in the rank fusion, 0 disables it
+    - session_id: (Optional) Conversation to continue. Earlier questions and
+      answers of the session are part of the prompt, and follow-ups reuse
+      the documents retrieved for the previous turn. Sessions expire after
+      SESSION_TTL seconds idle.
     """
+    collection_name = parse_collections(collection_name)
+    metrics.label_request(collection_name=collection_name, model_name=model_name)
     try:
-        # Update the model name if different from default
-        if model_name != ollama_service.model_name:
-            ollama_service.model_name = model_name
-        
         # Run the LangGraph agent
-        result = langgraph_service.run_agent(
+        result = await langgraph_service.run_agent(
             query=query,
-            collection_name=collection_name
+            collection_name=collection_name,
+            model_name=model_name,
+            generation={"temperature": temperature, "top_p": top_p, "max_tokens": max_tokens},
+            n_results=n_results,
+            vector_weight=vector_weight,
+            lexical_weight=lexical_weight,
+            session_id=session_id
         )
         
         # Return the result
@@ -43,8 +79,202 @@ async def ask(
             "answer": result["answer"],
             "sources": result["sources"]
         }
+    except (SchedulerRejected, BackendUnavailable):
+        # Answered with a 429 or 503 by the app's exception handlers
+        raise
     except Exception as e:
         import traceback
         print(f"Error in ask endpoint: {e}")
         print(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+def build_where(search_filter: Optional[SearchFilter]) -> Optional[Dict[str, Any]]:
+    """Chroma `where` filter on the source and chunk metadata written at ingestion"""
+    if search_filter is None:
+        return None
+    conditions = []
+    if search_filter.sources:
+        conditions.append({"source": {"$in": search_filter.sources}})
+    if search_filter.chunk_min is not None:
+        conditions.append({"chunk": {"$gte": search_filter.chunk_min}})
+    if search_filter.chunk_max is not None:
+        conditions.append({"chunk": {"$lte": search_filter.chunk_max}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/ask/stream")
+async def ask_stream(
+    query: str,
+    collection_name: List[str] = Query(),
+    model_name: str = Query(default=settings.DEFAULT_MODEL),
+    temperature: Optional[float] = Query(default=None, ge=0, le=2),
+    top_p: Optional[float] = Query(default=None, gt=0, le=1),
+    max_tokens: Optional[int] = Query(default=None, ge=1, le=8192),
+    n_results: int = Query(default=settings.RETRIEVAL_N_RESULTS, ge=1, le=50),
+    vector_weight: float = Query(default=settings.HYBRID_VECTOR_WEIGHT, ge=0),
+    lexical_weight: float = Query(default=settings.HYBRID_LEXICAL_WEIGHT, ge=0),
+    session_id: Optional[str] = Query(default=None, min_length=1, max_length=128),
+    langgraph_service: LangGraphService = Depends(get_langgraph_service),
+    ollama_service: OllamaService = Depends(get_ollama_service),
+    chroma_client: ChromaDBClient = Depends(get_chroma_client)
+):
+    """
+    Ask a question and stream the answer as Server-Sent Events
+    
+    Takes the same parameters as /ask.
+    
+    Events:
+    - sources: the retrieved documents, sent before generation starts
+    - token: each generated token as soon as Ollama produces it
+    - stats: Ollama's usage stats (eval_count, eval_duration, ...)
+    - error: sent instead of the remaining events if generation fails
+    """
+    collection_name = parse_collections(collection_name)
+    metrics.label_request(collection_name=collection_name, model_name=model_name)
+    
+    async def event_stream():
+        try:
+            async for event, data in langgraph_service.stream_agent(
+                query=query,
+                collection_name=collection_name,
+                model_name=model_name,
+                generation={"temperature": temperature, "top_p": top_p, "max_tokens": max_tokens},
+                n_results=n_results,
+                vector_weight=vector_weight,
+                lexical_weight=lexical_weight,
+                session_id=session_id
+            ):
+                yield format_sse(event, data)
+        except (SchedulerRejected, BackendUnavailable) as e:
+            yield format_sse("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            print(f"Error in ask stream endpoint: {e}")
+            yield format_sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/ask/batch", response_model=BatchAskResponse)
+async def ask_batch(
+    request: BatchAskRequest,
+    langgraph_service: LangGraphService = Depends(get_langgraph_service),
+    ollama_service: OllamaService = Depends(get_ollama_service),
+    chroma_client: ChromaDBClient = Depends(get_chroma_client)
+):
+    """
+    Answer many questions in one request
+    
+    Each query has its own collection, model, generation options and
+    retrieval parameters. Queries
+    against the same collection are retrieved together in one batched search,
+    and answers are generated concurrently (at most `concurrency` at a time,
+    default BATCH_CONCURRENCY). Generations are scheduled with `priority`
+    "batch" by default, so interactive /ask traffic runs first.
+    
+    With `stream` false the results are returned in request order. With
+    `stream` true each result is sent as an NDJSON line as soon as it is ready,
+    and its `index` gives its position in the request.
+    """
+    if len(request.queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch can have at most {settings.BATCH_MAX_QUERIES} queries"
+        )
+    
+    # Label the request when the whole batch targets one collection or model
+    collections = {join_collections(query.collection_name) for query in request.queries}
+    models = {query.model_name or settings.DEFAULT_MODEL for query in request.queries}
+    metrics.label_request(
+        collection_name=collections.pop() if len(collections) == 1 else None,
+        model_name=models.pop() if len(models) == 1 else None
+    )
+    
+    items = [query.model_dump() for query in request.queries]
+    results = langgraph_service.run_batch(
+        items,
+        concurrency=request.concurrency,
+        priority=PRIORITIES[request.priority]
+    )
+    
+    if request.stream:
+        async def result_stream():
+            async for result in results:
+                yield json.dumps(result) + "\n"
+        
+        return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+    
+    ordered = [None] * len(items)
+    async for result in results:
+        ordered[result["index"]] = result
+    return {"results": ordered}
+
+@router.post("/search", response_model=SearchResponse)
+async def search(
+    request: SearchRequest,
+    chroma_client: ChromaDBClient = Depends(get_chroma_client)
+):
+    """
+    Search a collection without generating an answer
+    
+    Returns the ranked chunks of each query with their ids, vector distances
+    (null for chunks only BM25 found) and fused scores. All queries are
+    embedded and searched in one batch.
+    
+    Parameters:
+    - queries: The queries to search for
+    - collection_name: The collection to search in
+    - n_results: Number of chunks per query and page
+    - offset: Number of chunks to skip, for the following pages
+    - filter: (Optional) Only return chunks of the given `sources`, or whose
+      `chunk` index is between `chunk_min` and `chunk_max`
+    - vector_weight, lexical_weight: Weights of the rank fusion, as for /ask
+    """
+    if len(request.queries) > settings.SEARCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A search can have at most {settings.SEARCH_MAX_QUERIES} queries"
+        )
+    if request.offset + request.n_results > settings.SEARCH_MAX_RESULTS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"offset + n_results can be at most {settings.SEARCH_MAX_RESULTS}"
+        )
+    
+    metrics.label_request(collection_name=request.collection_name)
+    try:
+        # Fetch the pages up to the requested one, as ranks depend on the whole fusion
+        limit = request.offset + request.n_results
+        contexts = await run_in_threadpool(
+            chroma_client.query_collection_batch,
+            request.collection_name,
+            request.queries,
+            limit,
+            request.vector_weight,
+            request.lexical_weight,
+            None,
+            build_where(request.filter)
+        )
+    except (SchedulerRejected, BackendUnavailable):
+        raise
+    except Exception as e:
+        print(f"Error in search endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {
+        "results": [
+            {
+                "query": query,
+                "hits": context[request.offset:limit],
+                "next_offset": limit if len(context) >= limit else None
+            }
+            for query, context in zip(request.queries, contexts)
+        ]
+    }
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from src.api.models.api_models import DeleteResponse, SessionStatsResponse
+from src.api.dependencies.dependencies import get_session_store
+from src.services.session_service import SessionStore
+
+router = APIRouter(prefix="/sessions", tags=["Sessions"])
+
+@router.get("/stats", response_model=SessionStatsResponse)
+async def get_session_stats(session_store: SessionStore = Depends(get_session_store)):
+    """Live conversation sessions and how many have expired or been evicted"""
+    return session_store.stats()
+
+@router.delete("/{session_id}", response_model=DeleteResponse)
+async def delete_session(session_id: str, session_store: SessionStore = Depends(get_session_store)):
+    """End a conversation, dropping its history"""
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return {"message": f"Session {session_id} deleted"}
@@ -0,0 +1,48 @@
+import os
+import re
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response
+
+from src.api.models.api_models import TraceResponse
+from src.api.dependencies.dependencies import get_trace_sink
+from src.core.profiler import read_folded, render_flamegraph
+from src.core.tracing import TraceSink, profile_path
+
+router = APIRouter(prefix="/traces", tags=["Tracing"])
+
+# Trace ids are uuid4 hex strings, which also keeps them safe as file names
+TRACE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+def check_trace_id(trace_id: str) -> str:
+    if not TRACE_ID_PATTERN.match(trace_id):
+        raise HTTPException(status_code=422, detail="Invalid trace id")
+    return trace_id
+
+@router.get("/{trace_id}", response_model=TraceResponse)
+async def get_trace(trace_id: str, trace_sink: TraceSink = Depends(get_trace_sink)):
+    """The spans of a traced request, as given by its X-Trace-Id response header"""
+    trace = await run_in_threadpool(trace_sink.find, check_trace_id(trace_id))
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} not found")
+    return trace
+
+@router.get("/{trace_id}/flamegraph")
+async def get_flamegraph(trace_id: str, format: Literal["svg", "folded"] = "svg"):
+    """
+    The flame graph of a profiled request
+
+    Parameters:
+    - format: "svg" for a flame graph to open in a browser, or "folded" for
+      the folded stacks, which flamegraph.pl and speedscope read
+    """
+    path = profile_path(check_trace_id(trace_id))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"No profile for trace {trace_id}")
+    if format == "folded":
+        with open(path) as f:
+            return PlainTextResponse(f.read())
+    stacks = await run_in_threadpool(read_folded, path)
+    return Response(content=render_flamegraph(stacks, title=f"Trace {trace_id}"), media_type="image/svg+xml")
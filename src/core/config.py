@@ -11,15 +11,142 @@ class Settings:
     # Database Settings
     CHROMA_HOST: str = os.environ.get("CHROMA_HOST", "localhost")
     CHROMA_PORT: int = int(os.environ.get("CHROMA_PORT", "8000"))
+    CHROMA_CONNECT_TIMEOUT: float = float(os.environ.get("CHROMA_CONNECT_TIMEOUT", "5"))
+    CHROMA_REQUEST_TIMEOUT: float = float(os.environ.get("CHROMA_REQUEST_TIMEOUT", "60"))
+    VECTOR_BACKEND: str = os.environ.get("VECTOR_BACKEND", "chroma")  # "chroma" or "embedded"
+    VECTOR_STORE_DIR: str = os.environ.get("VECTOR_STORE_DIR", "data/vectors")
+    
+    # Retrieval Settings
+    RETRIEVAL_N_RESULTS: int = int(os.environ.get("RETRIEVAL_N_RESULTS", "3"))
+    HYBRID_VECTOR_WEIGHT: float = float(os.environ.get("HYBRID_VECTOR_WEIGHT", "1.0"))
+    HYBRID_LEXICAL_WEIGHT: float = float(os.environ.get("HYBRID_LEXICAL_WEIGHT", "1.0"))
+    HYBRID_CANDIDATES: int = int(os.environ.get("HYBRID_CANDIDATES", "20"))
+    HYBRID_RRF_K: int = int(os.environ.get("HYBRID_RRF_K", "60"))
+    RETRIEVAL_COLLECTION_TIMEOUT: float = float(os.environ.get("RETRIEVAL_COLLECTION_TIMEOUT", "2.0"))  # Seconds per multi-collection search
+    RETRIEVAL_MAX_WORKERS: int = int(os.environ.get("RETRIEVAL_MAX_WORKERS", "8"))
+    RETRIEVAL_COLLECTION_MAX_IN_FLIGHT: int = int(os.environ.get("RETRIEVAL_COLLECTION_MAX_IN_FLIGHT", "2"))  # Searches per collection
+    LEXICAL_LOAD_PAGE_SIZE: int = int(os.environ.get("LEXICAL_LOAD_PAGE_SIZE", "5000"))
+    
+    # Rerank Settings
+    RERANK_ENABLED: bool = os.environ.get("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL: str = os.environ.get("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES: int = int(os.environ.get("RERANK_CANDIDATES", "50"))  # Documents retrieved for reranking
+    RERANK_BATCH_SIZE: int = int(os.environ.get("RERANK_BATCH_SIZE", "32"))
+    RERANK_CACHE_SIZE: int = int(os.environ.get("RERANK_CACHE_SIZE", "16384"))
+    RERANK_LATENCY_BUDGET_MS: float = float(os.environ.get("RERANK_LATENCY_BUDGET_MS", "300"))
+    
+    # Embedding Settings
+    EMBEDDING_ENABLED: bool = os.environ.get("EMBEDDING_ENABLED", "true").lower() == "true"
+    EMBEDDING_BACKEND: str = os.environ.get("EMBEDDING_BACKEND", "sentence-transformers")
+    EMBEDDING_MODEL: str = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    EMBEDDING_BATCH_WINDOW_MS: float = float(os.environ.get("EMBEDDING_BATCH_WINDOW_MS", "5"))
+    EMBEDDING_MAX_BATCH_SIZE: int = int(os.environ.get("EMBEDDING_MAX_BATCH_SIZE", "64"))
+    EMBEDDING_THREADS: int = int(os.environ.get("EMBEDDING_THREADS", "2"))
+    EMBEDDING_CACHE_SIZE: int = int(os.environ.get("EMBEDDING_CACHE_SIZE", "4096"))
     
     # LLM Settings
     OLLAMA_HOST: str = os.environ.get("OLLAMA_HOST", "localhost")
     OLLAMA_PORT: int = int(os.environ.get("OLLAMA_PORT", "11434"))
     DEFAULT_MODEL: str = "tinyllama:latest"
+    OLLAMA_CONNECT_TIMEOUT: float = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "5"))
+    OLLAMA_REQUEST_TIMEOUT: float = float(os.environ.get("OLLAMA_REQUEST_TIMEOUT", "120"))
+    OLLAMA_MAX_CONNECTIONS: int = int(os.environ.get("OLLAMA_MAX_CONNECTIONS", "32"))
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = int(os.environ.get("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "16"))
+    OLLAMA_KEEPALIVE_EXPIRY: float = float(os.environ.get("OLLAMA_KEEPALIVE_EXPIRY", "30"))
+    # Models to preload and keep loaded, with optional concurrency limits: "tinyllama:latest=8,llama3:8b=2"
+    OLLAMA_MODELS: str = os.environ.get("OLLAMA_MODELS", "")
+    OLLAMA_MODEL_CONCURRENCY: int = int(os.environ.get("OLLAMA_MODEL_CONCURRENCY", "4"))
+    OLLAMA_KEEP_ALIVE: str = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")  # For models not in OLLAMA_MODELS
+    # Models not in OLLAMA_MODELS tracked at once; the least recently used idle one is forgotten first
+    OLLAMA_MAX_UNCONFIGURED_MODELS: int = int(os.environ.get("OLLAMA_MAX_UNCONFIGURED_MODELS", "8"))
+    # Context window (num_ctx) per model: "llama3:8b=8192"; other models use DEFAULT_CONTEXT_WINDOW
+    OLLAMA_CONTEXT_WINDOWS: str = os.environ.get("OLLAMA_CONTEXT_WINDOWS", "")
+    DEFAULT_CONTEXT_WINDOW: int = int(os.environ.get("DEFAULT_CONTEXT_WINDOW", "2048"))
+    # Requests allowed to wait per model beyond its concurrency limit, and for how long
+    SCHEDULER_MAX_QUEUE: int = int(os.environ.get("SCHEDULER_MAX_QUEUE", "64"))
+    SCHEDULER_QUEUE_TIMEOUT: float = float(os.environ.get("SCHEDULER_QUEUE_TIMEOUT", "30"))
+    
+    # Resilience Settings
+    BACKEND_RETRIES: int = int(os.environ.get("BACKEND_RETRIES", "2"))  # Retries of calls that could not connect
+    BACKEND_RETRY_BASE_DELAY: float = float(os.environ.get("BACKEND_RETRY_BASE_DELAY", "0.1"))
+    BACKEND_RETRY_MAX_DELAY: float = float(os.environ.get("BACKEND_RETRY_MAX_DELAY", "2"))
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_TIMEOUT: float = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", "30"))
+    HEALTH_PROBE_INTERVAL: float = float(os.environ.get("HEALTH_PROBE_INTERVAL", "10"))
+    HEALTH_PROBE_TIMEOUT: float = float(os.environ.get("HEALTH_PROBE_TIMEOUT", "2"))
+    
+    # Session Settings
+    SESSION_TTL: float = float(os.environ.get("SESSION_TTL", "1800"))  # Seconds a session may be idle
+    SESSION_MAX: int = int(os.environ.get("SESSION_MAX", "10000"))
+    SESSION_HISTORY_TURNS: int = int(os.environ.get("SESSION_HISTORY_TURNS", "6"))  # Turns kept verbatim
+    SESSION_SUMMARIZE: bool = os.environ.get("SESSION_SUMMARIZE", "false").lower() == "true"
+    SESSION_CARRY_DOCS: int = int(os.environ.get("SESSION_CARRY_DOCS", "3"))  # Documents reused from the last turn
+    
+    # Prompt Packing Settings
+    PROMPT_RESERVED_TOKENS: int = int(os.environ.get("PROMPT_RESERVED_TOKENS", "128"))  # Margin for token estimate error
+    PROMPT_DEDUP_THRESHOLD: float = float(os.environ.get("PROMPT_DEDUP_THRESHOLD", "0.8"))
+    
+    # Multi-Process Serving Settings
+    WORKERS: int = int(os.environ.get("WORKERS", os.environ.get("WEB_CONCURRENCY", "1")))  # Uvicorn worker processes
+    # Share caches, collection generations and backend health between the workers through SQLite
+    SHARED_STATE_ENABLED: bool = os.environ.get("SHARED_STATE_ENABLED", str(WORKERS > 1)).lower() == "true"
+    SHARED_STATE_DB_PATH: str = os.environ.get("SHARED_STATE_DB_PATH", "data/shared.db")
+    SHARED_CACHE_MAX_ENTRIES: int = int(os.environ.get("SHARED_CACHE_MAX_ENTRIES", "100000"))
+    SHARED_CACHE_TTL: float = float(os.environ.get("SHARED_CACHE_TTL", "3600"))
+    
+    # Chunk manifest used to deduplicate re-ingested documents
+    MANIFEST_DB_PATH: str = os.environ.get("MANIFEST_DB_PATH", "data/manifests.db")
+    
+    # Ingestion Job Settings
+    JOB_DB_PATH: str = os.environ.get("JOB_DB_PATH", "data/jobs.db")
+    JOB_DIR: str = os.environ.get("JOB_DIR", "data/jobs")
+    JOB_WORKERS: int = int(os.environ.get("JOB_WORKERS", "2"))
+    JOB_HEARTBEAT_INTERVAL: float = float(os.environ.get("JOB_HEARTBEAT_INTERVAL", "10"))
+    JOB_STALE_AFTER: float = float(os.environ.get("JOB_STALE_AFTER", "60"))  # Seconds without a heartbeat
+    
+    # Batch Query Settings
+    BATCH_MAX_QUERIES: int = int(os.environ.get("BATCH_MAX_QUERIES", "1000"))
+    BATCH_CONCURRENCY: int = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+    
+    # Search Settings
+    SEARCH_MAX_QUERIES: int = int(os.environ.get("SEARCH_MAX_QUERIES", "100"))
+    SEARCH_MAX_RESULTS: int = int(os.environ.get("SEARCH_MAX_RESULTS", "200"))
+    
+    # Answer Cache Settings
+    ANSWER_CACHE_ENABLED: bool = os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+    ANSWER_CACHE_MAX_BYTES: int = int(os.environ.get("ANSWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    ANSWER_CACHE_TTL: float = float(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+    ANSWER_CACHE_SEMANTIC: bool = os.environ.get("ANSWER_CACHE_SEMANTIC", "false").lower() == "true"
+    ANSWER_CACHE_SEMANTIC_MAX_DISTANCE: float = float(os.environ.get("ANSWER_CACHE_SEMANTIC_MAX_DISTANCE", "0.05"))
     
     # File Storage Settings
     UPLOAD_DIR: str = "data/uploads"
     
+    # Chunking Settings
+    CHUNK_OVERLAP: int = int(os.environ.get("CHUNK_OVERLAP", "0"))
+    CHUNK_SIZE_UNIT: str = os.environ.get("CHUNK_SIZE_UNIT", "chars")
+    
+    # Bulk Ingestion Settings
+    INGEST_BATCH_SIZE: int = int(os.environ.get("INGEST_BATCH_SIZE", "256"))
+    INGEST_WORKERS: int = int(os.environ.get("INGEST_WORKERS", str(os.cpu_count() or 1)))
+    INGEST_WRITERS: int = int(os.environ.get("INGEST_WRITERS", "2"))
+    INGEST_QUEUE_SIZE: int = int(os.environ.get("INGEST_QUEUE_SIZE", "8"))
+    
+    # Snapshot Settings
+    SNAPSHOT_PAGE_SIZE: int = int(os.environ.get("SNAPSHOT_PAGE_SIZE", "1000"))  # Documents per page read and written
+    SNAPSHOT_DTYPE: str = os.environ.get("SNAPSHOT_DTYPE", "float16")  # "float16" or "float32"
+    
+    # Tracing Settings
+    TRACING_ENABLED: bool = os.environ.get("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_SAMPLE_RATE: float = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))  # Share of requests traced unasked
+    TRACE_FILE: str = os.environ.get("TRACE_FILE", "data/traces.jsonl")
+    TRACE_FILE_MAX_BYTES: int = int(os.environ.get("TRACE_FILE_MAX_BYTES", str(64 * 1024 * 1024)))
+    PROFILING_ENABLED: bool = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILE_DIR: str = os.environ.get("PROFILE_DIR", "data/profiles")
+    PROFILE_MAX_FILES: int = int(os.environ.get("PROFILE_MAX_FILES", "100"))  # Oldest profiles are deleted past this
+    PROFILE_INTERVAL: float = float(os.environ.get("PROFILE_INTERVAL", "0.005"))  # Seconds between stack samples
+    
     # CORS Settings
     CORS_ORIGINS: list = ["*"]
     CORS_METHODS: list = ["*"]
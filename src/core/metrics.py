@@ -0,0 +1,299 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Collection, Dict, FrozenSet, Iterable, Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from src.core import tracing
+
+# Buckets for LLM calls, which take seconds rather than milliseconds
+LLM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, float("inf"))
+
+# Label values of collections and models that are not known, and of requests
+# spanning several collections, so clients cannot create series at will
+OTHER_LABEL = "other"
+MULTI_LABEL = "multi"
+
+# Minimum seconds between reloads of the known collection names
+KNOWN_NAMES_TTL = 30.0
+
+# Ollama's response timings, reported in nanoseconds
+OLLAMA_PHASES = (
+    ("load", "load_duration"),
+    ("prompt_eval", "prompt_eval_duration"),
+    ("eval", "eval_duration"),
+)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each pipeline stage",
+    ["stage"]
+)
+RETRIEVAL_SKIPPED = Counter(
+    "rag_retrieval_skipped_total",
+    "Collections left out of a multi-collection search because they timed out, failed or were busy",
+    ["collection", "reason"]
+)
+OLLAMA_SECONDS = Histogram(
+    "rag_ollama_duration_seconds",
+    "Ollama call time: the whole HTTP call and the load, prompt eval and eval phases Ollama reports",
+    ["model", "phase"],
+    buckets=LLM_BUCKETS
+)
+OLLAMA_TOKENS = Counter(
+    "rag_ollama_tokens_total",
+    "Prompt and completion tokens processed by Ollama",
+    ["model", "kind"]
+)
+OLLAMA_TOKENS_PER_SECOND = Gauge(
+    "rag_ollama_tokens_per_second",
+    "Throughput of the most recent Ollama call",
+    ["model", "phase"]
+)
+HTTP_REQUESTS = Counter(
+    "rag_http_requests_total",
+    "HTTP requests by route, collection, model and status",
+    ["route", "method", "status", "collection", "model"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "rag_http_request_duration_seconds",
+    "HTTP request time until the last byte of the response, streams included",
+    ["route", "method"],
+    buckets=LLM_BUCKETS
+)
+
+# Collection and model of the request being served, set by the route handler
+_request_labels: ContextVar[Optional[Dict[str, str]]] = ContextVar("request_labels", default=None)
+
+class KnownNames:
+    """
+    Names a label may take
+
+    Lookups never call the loader: the names are reloaded from background
+    work such as the health probes, and names created by this process are
+    added right away. Names created by another worker are labelled "other",
+    and deleted ones kept, until the next reload. A failed load keeps the
+    previous names.
+    """
+
+    def __init__(self, loader: Optional[Callable[[], Collection[str]]] = None):
+        self.loader = loader
+        self.names: FrozenSet[str] = frozenset()
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def refresh(self, max_age: float = 0):
+        """Reload the names unless they were loaded less than max_age seconds ago"""
+        if self.loader is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._loaded_at < max_age:
+                return
+            self._loaded_at = now
+        try:
+            self.names = frozenset(self.loader())
+        except Exception:
+            pass
+
+    def add(self, name: str):
+        if name not in self.names:
+            with self._lock:
+                self.names = self.names | {name}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+known_collections = KnownNames()
+known_models = KnownNames()
+
+def register_label_values(collections: Callable[[], Collection[str]], models: Callable[[], Collection[str]]):
+    """
+    Set where the known collection and model names come from; other names are labelled "other"
+
+    The models are configured, so they are loaded right away; the
+    collections are loaded by refresh_collection_names.
+    """
+    known_collections.loader = collections
+    known_models.loader = models
+    known_models.refresh()
+
+def refresh_collection_names():
+    """Reload the known collection names, at most every KNOWN_NAMES_TTL seconds"""
+    known_collections.refresh(KNOWN_NAMES_TTL)
+
+def collection_label(collection_name: str) -> str:
+    """Label value of a collection name, or of comma-separated names"""
+    if "," in collection_name:
+        return MULTI_LABEL
+    return collection_name if collection_name in known_collections else OTHER_LABEL
+
+def model_label(model_name: str) -> str:
+    """Label value of a model name"""
+    return model_name if model_name in known_models else OTHER_LABEL
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a pipeline stage, as a span too when the request is traced; use as a context manager or decorator"""
+    with STAGE_SECONDS.labels(stage=stage).time(), tracing.span(f"stage.{stage}"):
+        yield
+
+def timed_iter(iterable: Iterable[Any], stage: str) -> Iterator[Any]:
+    """Yield from an iterable, observing the time spent producing its items as one stage"""
+    iterator = iter(iterable)
+    elapsed = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - started
+            yield item
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(elapsed)
+
+def observe_ollama(model_name: str, seconds: float, result: Dict[str, Any]):
+    """
+    Record an Ollama call
+
+    Args:
+        model_name: The model that served the call
+        seconds: Wall time of the HTTP call
+        result: The response body, or the final stream chunk, with Ollama's usage stats
+    """
+    OLLAMA_SECONDS.labels(model=model_name, phase="http").observe(seconds)
+    for phase, field in OLLAMA_PHASES:
+        if result.get(field):
+            OLLAMA_SECONDS.labels(model=model_name, phase=phase).observe(result[field] / 1e9)
+    for kind, phase, count_field, duration_field in (
+        ("prompt", "prompt_eval", "prompt_eval_count", "prompt_eval_duration"),
+        ("completion", "eval", "eval_count", "eval_duration"),
+    ):
+        count = result.get(count_field)
+        if not count:
+            continue
+        OLLAMA_TOKENS.labels(model=model_name, kind=kind).inc(count)
+        if result.get(duration_field):
+            OLLAMA_TOKENS_PER_SECOND.labels(model=model_name, phase=phase).set(count / (result[duration_field] / 1e9))
+
+def label_request(collection_name: Optional[str] = None, model_name: Optional[str] = None):
+    """Attach the collection and model to the current request's metrics, bounded as labels"""
+    labels = _request_labels.get()
+    if labels is None:
+        return
+    if collection_name:
+        labels["collection"] = collection_label(collection_name)
+    if model_name:
+        labels["model"] = model_label(model_name)
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them until their body is fully sent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        labels = {"collection": "", "model": ""}
+        token = _request_labels.set(labels)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_labels.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUEST_SECONDS.labels(route=route, method=method).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(
+                route=route,
+                method=method,
+                status=str(status["code"]),
+                collection=labels["collection"],
+                model=labels["model"]
+            ).inc()
+
+class ServiceStatsCollector:
+    """Exposes the counters services already keep, read at scrape time"""
+
+    def __init__(self, scheduler_stats: Callable[[], Dict[str, Dict[str, Any]]],
+                 model_stats: Callable[[], Any], cache_stats: Callable[[], Dict[str, Any]],
+                 embedding_stats: Callable[[], Dict[str, Any]],
+                 circuit_stats: Optional[Callable[[], Dict[str, Dict[str, Any]]]] = None):
+        self.scheduler_stats = scheduler_stats
+        self.model_stats = model_stats
+        self.cache_stats = cache_stats
+        self.embedding_stats = embedding_stats
+        self.circuit_stats = circuit_stats
+
+    def collect(self):
+        queue_depth = GaugeMetricFamily("rag_scheduler_queue_depth", "Requests waiting for a model slot", labels=["model"])
+        admitted = CounterMetricFamily("rag_scheduler_admitted", "Requests given a model slot", labels=["model"])
+        rejected = CounterMetricFamily("rag_scheduler_rejected", "Requests rejected because the queue was full", labels=["model"])
+        timeouts = CounterMetricFamily("rag_scheduler_timeouts", "Requests rejected after waiting past their deadline", labels=["model"])
+        wait = CounterMetricFamily("rag_scheduler_wait_seconds", "Time requests spent waiting for a model slot", labels=["model"])
+        for model_name, stats in self.scheduler_stats().items():
+            queue_depth.add_metric([model_name], stats["queue_depth"])
+            admitted.add_metric([model_name], stats["admitted"])
+            rejected.add_metric([model_name], stats["rejected"])
+            timeouts.add_metric([model_name], stats["timeouts"])
+            wait.add_metric([model_name], stats["wait_seconds_total"])
+        yield from (queue_depth, admitted, rejected, timeouts, wait)
+
+        in_flight = GaugeMetricFamily("rag_model_in_flight", "Requests running on a model", labels=["model"])
+        failures = CounterMetricFamily("rag_model_failures", "Failed requests per model", labels=["model"])
+        for model in self.model_stats():
+            in_flight.add_metric([model["name"]], model["in_flight"])
+            failures.add_metric([model["name"]], model["failures"])
+        yield from (in_flight, failures)
+
+        cache = self.cache_stats()
+        lookups = CounterMetricFamily("rag_answer_cache_lookups", "Answer cache lookups by result", labels=["result"])
+        for result in ("hits", "semantic_hits", "misses"):
+            lookups.add_metric([result], cache[result])
+        yield lookups
+        yield GaugeMetricFamily("rag_answer_cache_entries", "Answers in the cache", value=cache["entries"])
+        yield GaugeMetricFamily("rag_answer_cache_bytes", "Size of the cached answers", value=cache["bytes"])
+
+        embedding = self.embedding_stats()
+        embedding_lookups = CounterMetricFamily("rag_embedding_cache_lookups", "Query embedding cache lookups by result", labels=["result"])
+        embedding_lookups.add_metric(["hits"], embedding["cache_hits"])
+        embedding_lookups.add_metric(["shared_hits"], embedding["shared_cache_hits"])
+        embedding_lookups.add_metric(["misses"], embedding["cache_misses"])
+        yield embedding_lookups
+        yield CounterMetricFamily("rag_embedding_batches", "Embedding batches run", value=embedding["batches"])
+        yield CounterMetricFamily("rag_embedding_texts", "Texts embedded", value=embedding["texts"])
+
+        if self.circuit_stats is not None:
+            circuit_open = GaugeMetricFamily("rag_circuit_open", "Whether a backend's circuit is open (1) or half open (0.5)", labels=["backend"])
+            opened = CounterMetricFamily("rag_circuit_opened", "Times a backend's circuit opened", labels=["backend"])
+            rejected = CounterMetricFamily("rag_circuit_rejected", "Calls failed fast while a backend's circuit was open", labels=["backend"])
+            for backend, stats in self.circuit_stats().items():
+                circuit_open.add_metric([backend], {"closed": 0, "half_open": 0.5, "open": 1}[stats["state"]])
+                opened.add_metric([backend], stats["opened"])
+                rejected.add_metric([backend], stats["rejected"])
+            yield from (circuit_open, opened, rejected)
+
+def register_collector(collector):
+    """Add a collector to the registry served on /metrics"""
+    REGISTRY.register(collector)
+
+def render() -> bytes:
+    """The current metrics in the Prometheus text format"""
+    return generate_latest(REGISTRY)
+
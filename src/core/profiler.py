@@ -0,0 +1,141 @@
+import html
+import os
+import sys
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Optional
+
+# Innermost frames of threads that are waiting rather than working, as (file, function)
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+    ("runners.py", "run"),
+}
+
+# Flame graph geometry, in pixels
+FRAME_HEIGHT = 16
+GRAPH_WIDTH = 1200
+MIN_FRAME_WIDTH = 0.5
+CHAR_WIDTH = 7
+
+def frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of every thread of the process at a fixed interval
+
+    A background thread reads sys._current_frames(), so the profiled code runs
+    unchanged and only pays for the GIL hand-offs. Stacks are folded into
+    "thread;outer;...;inner" strings counted by occurrence, the input format
+    of flame graphs. Threads found waiting are left out.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Dict[str, int]:
+        """Stop sampling and return the folded stacks"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return dict(self.stacks)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+def write_folded(path: str, stacks: Dict[str, int]):
+    """Write folded stacks, one "stack count" line each, as read by flamegraph.pl and speedscope"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f"{stack} {count}\n")
+
+def read_folded(path: str) -> Dict[str, int]:
+    stacks = {}
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack:
+                stacks[stack] = int(count)
+    return stacks
+
+def render_flamegraph(stacks: Dict[str, int], title: str = "Flame graph") -> str:
+    """Render folded stacks as an SVG flame graph, callers below their callees"""
+    root = {"count": 0, "children": {}}
+    for stack, count in stacks.items():
+        node = root
+        node["count"] += count
+        for frame in stack.split(";"):
+            node = node["children"].setdefault(frame, {"count": 0, "children": {}})
+            node["count"] += count
+
+    def depth(node) -> int:
+        return 1 + max((depth(child) for child in node["children"].values()), default=0)
+
+    total = root["count"] or 1
+    scale = GRAPH_WIDTH / total
+    levels = depth(root) - 1
+    height = (levels + 2) * FRAME_HEIGHT
+    rects = []
+
+    def draw(node, name: str, x: float, level: int):
+        width = node["count"] * scale
+        if width < MIN_FRAME_WIDTH:
+            return
+        y = height - (level + 1) * FRAME_HEIGHT
+        # Stable warm colours, so a function keeps its colour across graphs
+        hue = zlib.crc32(name.encode("utf-8")) % 60
+        label = html.escape(f"{name} ({node['count']} samples, {100 * node['count'] / total:.1f}%)")
+        text = name if len(name) * CHAR_WIDTH < width else name[:max(0, int(width / CHAR_WIDTH) - 2)] + ".."
+        rects.append(
+            f'<g><title>{label}</title>'
+            f'<rect x="{x:.2f}" y="{y}" width="{width:.2f}" height="{FRAME_HEIGHT - 1}" fill="hsl({hue},90%,60%)"/>'
+            + (f'<text x="{x + 3:.2f}" y="{y + FRAME_HEIGHT - 4}">{html.escape(text)}</text>' if width > 3 * CHAR_WIDTH else "")
+            + '</g>'
+        )
+        for child_name, child in sorted(node["children"].items()):
+            draw(child, child_name, x, level + 1)
+            x += child["count"] * scale
+
+    x = 0.0
+    for name, child in sorted(root["children"].items()):
+        draw(child, name, x, 0)
+        x += child["count"] * scale
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{GRAPH_WIDTH}" height="{height}" '
+        f'font-family="monospace" font-size="11">'
+        f'<text x="4" y="12">{html.escape(title)} ({root["count"]} samples)</text>'
+        + "".join(rects)
+        + "</svg>"
+    )
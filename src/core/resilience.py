@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple, TypeVar
+
+import httpx
+
+from src.core.config import settings
+
+if TYPE_CHECKING:
+    # src.db imports this module through the Chroma backend, so only for annotations
+    from src.db.shared_store import SharedStore
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Errors raised before a request reached the backend, so retrying cannot repeat it
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Whether an error means the backend is unreachable or hung, rather than it refusing a request"""
+    # A pool timeout means our own connection pool is exhausted, not that the backend is down
+    return isinstance(error, (httpx.TransportError, ConnectionError)) and not isinstance(error, httpx.PoolTimeout)
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Seconds to wait before retry number attempt + 1, with full jitter"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+class BackendUnavailable(Exception):
+    """Raised instead of calling a backend whose circuit is open"""
+
+    def __init__(self, backend: str, retry_after: int):
+        super().__init__(f"{backend} is unavailable, retry in {retry_after}s")
+        self.backend = backend
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Fails calls to a backend fast while it is down
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    raise BackendUnavailable without touching the backend, instead of each
+    waiting for its own timeout. Once reset_timeout has passed, one trial
+    call is let through: its success closes the circuit, its failure opens it
+    again. Only transport errors and timeouts count as failures; a backend
+    that answers with an error is up.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._counters = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        """"closed", "open" or "half_open\""""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._trial or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def _reject(self, elapsed: float):
+        self._counters["rejected"] += 1
+        raise BackendUnavailable(self.name, max(1, math.ceil(self.reset_timeout - elapsed)))
+
+    def check(self):
+        """Raise BackendUnavailable if the circuit is open, without taking the trial call"""
+        with self._lock:
+            if self._opened_at is not None:
+                elapsed = time.monotonic() - self._opened_at
+                if elapsed < self.reset_timeout:
+                    self._reject(elapsed)
+
+    def before_call(self):
+        """Admit a call, or raise BackendUnavailable if the circuit is open"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed < self.reset_timeout or self._trial:
+                self._reject(elapsed)
+            self._trial = True
+
+    def record_success(self):
+        """The backend answered; close the circuit"""
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit for {self.name} closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        """The backend could not be reached; open the circuit after enough failures in a row"""
+        with self._lock:
+            self._failures += 1
+            if self._trial or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._open()
+            self._trial = False
+
+    def trip(self):
+        """Open the circuit now, such as when a health probe fails"""
+        with self._lock:
+            if self._opened_at is None:
+                self._open()
+            self._trial = False
+
+    def _open(self):
+        if self._opened_at is None:
+            self._counters["opened"] += 1
+            logger.warning(f"Circuit for {self.name} opened after {self._failures} failures")
+        self._opened_at = time.monotonic()
+
+    def release(self):
+        """Give up a trial call that ended without an outcome, such as when it was cancelled"""
+        with self._lock:
+            self._trial = False
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Wrap one call to the backend, recording its outcome"""
+        self.before_call()
+        try:
+            yield
+        except Exception as e:
+            if is_backend_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        except BaseException:
+            self.release()
+            raise
+        else:
+            self.record_success()
+
+    def stats(self) -> Dict[str, Any]:
+        """State and counters"""
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures, **self._counters}
+
+def call_with_retry(fn: Callable[[], T], breaker: CircuitBreaker, retries: Optional[int] = None) -> T:
+    """Call a backend through its breaker, retrying with jittered backoff while the connection fails"""
+    retries = settings.BACKEND_RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        try:
+            with breaker.guard():
+                return fn()
+        except RETRYABLE_ERRORS:
+            if attempt >= retries:
+                raise
+        time.sleep(backoff_delay(attempt, settings.BACKEND_RETRY_BASE_DELAY, settings.BACKEND_RETRY_MAX_DELAY))
+        attempt += 1
+
+async def acall_with_retry(fn: Callable[[], Awaitable[T]], breaker: CircuitBreaker,
+                           retries: Optional[int] = None) -> T:
+    """Async version of call_with_retry"""
+    retries = settings.BACKEND_RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        try:
+            with breaker.guard():
+                return await fn()
+        except RETRYABLE_ERRORS:
+            if attempt >= retries:
+                raise
+        await asyncio.sleep(backoff_delay(attempt, settings.BACKEND_RETRY_BASE_DELAY, settings.BACKEND_RETRY_MAX_DELAY))
+        attempt += 1
+
+class HealthProber:
+    """
+    Probes the backends in the background so health checks never wait on them
+
+    Every interval each registered probe runs with a timeout. A passing probe
+    closes the backend's circuit, so traffic resumes as soon as it is back; a
+    failing one opens it, so requests fail fast instead of timing out one by
+    one.
+
+    With a shared store, one worker process at a time holds the lease to
+    probe a backend and publishes the result; the other workers apply it to
+    their own breakers instead of probing too.
+
+    A backend's on_healthy callback runs in every worker after each healthy
+    result, for background work that should only reach a backend that is up.
+    """
+
+    def __init__(self, interval: float = 10, timeout: float = 2, shared: Optional["SharedStore"] = None):
+        self.interval = interval
+        self.timeout = timeout
+        self.shared = shared
+        self._probes: Dict[str, Tuple[Callable[[], Awaitable[Any]], Optional[CircuitBreaker]]] = {}
+        self._on_healthy: Dict[str, Callable[[], Any]] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, probe: Callable[[], Awaitable[Any]], breaker: Optional[CircuitBreaker] = None,
+                 on_healthy: Optional[Callable[[], Any]] = None):
+        """Add a backend; probe raises if the backend is unhealthy, on_healthy runs in a thread when it is not"""
+        self._probes[name] = (probe, breaker)
+        if on_healthy is not None:
+            self._on_healthy[name] = on_healthy
+
+    async def _healthy(self, name: str):
+        callback = self._on_healthy.get(name)
+        if callback is not None:
+            try:
+                await asyncio.to_thread(callback)
+            except Exception as e:
+                logger.warning(f"Post-probe work for {name} failed: {e}")
+
+    def _adopt(self, name: str, status: Dict[str, Any]):
+        """Apply a result published by the worker that probed"""
+        _, breaker = self._probes[name]
+        if breaker is not None:
+            if status["healthy"]:
+                breaker.record_success()
+            else:
+                breaker.trip()
+        self._status[name] = {**status, "circuit": breaker.state if breaker is not None else None}
+
+    async def _probe(self, name: str):
+        probe, breaker = self._probes[name]
+        if self.shared is not None:
+            # Hold the lease a little longer than an interval, so its holder keeps it
+            claimed = await asyncio.to_thread(self.shared.claim, f"probe:{name}", self.interval * 1.5)
+            if not claimed:
+                status = await asyncio.to_thread(self.shared.get_json, f"health:{name}")
+                if status is not None:
+                    self._adopt(name, status)
+                    if status["healthy"]:
+                        await self._healthy(name)
+                    return
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(probe(), self.timeout)
+            healthy, error = True, None
+            if breaker is not None:
+                breaker.record_success()
+        except Exception as e:
+            healthy, error = False, str(e) or type(e).__name__
+            if breaker is not None:
+                breaker.trip()
+        if healthy != self._status.get(name, {}).get("healthy", healthy):
+            logger.warning(f"{name} is {'healthy' if healthy else 'unhealthy'}" + (f": {error}" if error else ""))
+        self._status[name] = {
+            "healthy": healthy,
+            "latency_ms": round((time.monotonic() - started) * 1000, 1),
+            "checked_at": time.time(),
+            "error": error,
+            "circuit": breaker.state if breaker is not None else None,
+        }
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.put_json, f"health:{name}", self._status[name], self.interval * 3)
+        if healthy:
+            await self._healthy(name)
+
+    async def probe_all(self):
+        """Probe every backend once, concurrently"""
+        await asyncio.gather(*(self._probe(name) for name in self._probes))
+
+    async def _run(self):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start probing in the background"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop probing"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """The latest probe result of each backend that has been probed"""
+        return dict(self._status)
+
+# Create a singleton instance; main.py gives it the shared store
+health_prober = HealthProber(
+    interval=settings.HEALTH_PROBE_INTERVAL,
+    timeout=settings.HEALTH_PROBE_TIMEOUT
+)
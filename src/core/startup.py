@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A named warm-up step; it fails by raising or by returning False
+Step = Tuple[str, Callable[[], Awaitable[Any]]]
+
+class Warmup:
+    """
+    Runs the slow startup steps in the background and times each of them
+
+    Steps are given as sequences: the sequences run concurrently and the
+    steps of one sequence in order, so connecting to one backend does not
+    wait on loading a model for another. A failed step skips the rest of its
+    sequence, such as preloading models when Ollama could not be reached;
+    what it would have set up then happens on first use instead.
+    """
+
+    def __init__(self):
+        self._steps: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    async def _run_step(self, name: str, step: Callable[[], Awaitable[Any]]) -> bool:
+        started = time.monotonic()
+        self._steps[name] = {"status": "running", "seconds": None, "error": None}
+        try:
+            ok = await step() is not False
+            error = None if ok else "failed"
+        except Exception as e:
+            ok, error = False, str(e) or type(e).__name__
+        seconds = round(time.monotonic() - started, 3)
+        self._steps[name] = {"status": "ok" if ok else "failed", "seconds": seconds, "error": error}
+        if ok:
+            logger.info(f"Warm-up step {name} took {seconds}s")
+        else:
+            logger.error(f"Warm-up step {name} failed after {seconds}s: {error}")
+        return ok
+
+    async def _run_sequence(self, steps: Sequence[Step]):
+        for i, (name, step) in enumerate(steps):
+            if not await self._run_step(name, step):
+                for skipped, _ in steps[i + 1:]:
+                    self._steps[skipped] = {"status": "skipped", "seconds": None, "error": f"{name} failed"}
+                return
+
+    async def _run(self, sequences: List[Sequence[Step]]):
+        try:
+            await asyncio.gather(*(self._run_sequence(steps) for steps in sequences))
+        finally:
+            self._finished = time.monotonic()
+            logger.info(f"Warm-up finished in {self._finished - self._started:.3f}s")
+
+    def start(self, sequences: List[Sequence[Step]]):
+        """Start running the steps in the background"""
+        if self._task is not None and not self._task.done():
+            return
+        for steps in sequences:
+            for name, _ in steps:
+                self._steps[name] = {"status": "pending", "seconds": None, "error": None}
+        self._started, self._finished = time.monotonic(), None
+        self._task = asyncio.create_task(self._run(sequences))
+
+    async def stop(self):
+        """Cancel the steps still running"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def done(self) -> bool:
+        """Whether every step has finished, successfully or not"""
+        return self._finished is not None
+
+    def status(self) -> Dict[str, Any]:
+        """Progress, total time and the outcome and time of every step"""
+        if self._started is None:
+            seconds = None
+        else:
+            seconds = round((self._finished or time.monotonic()) - self._started, 3)
+        return {"done": self.done, "seconds": seconds, "steps": dict(self._steps)}
+
+# Create a singleton instance
+warmup = Warmup()
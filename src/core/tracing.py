@@ -0,0 +1,324 @@
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from src.core.config import settings
+from src.core.profiler import SamplingProfiler, write_folded
+
+logger = logging.getLogger(__name__)
+
+# Request header and query parameter asking for a trace, or for a trace and a profile
+TRACE_FLAG = "trace"
+PROFILE_FLAG = "profile"
+TRUE_VALUES = ("1", "true", "yes", "on")
+
+# Arguments of traced functions recorded as span attributes
+TRACED_ARGUMENTS = ("collection_name", "collection_names", "n_results")
+
+class Span:
+    """A timed operation of a trace"""
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+class NoopSpan:
+    """Stands in for a span when the request is not traced"""
+
+    def set(self, **attributes: Any):
+        pass
+
+    def end(self, error: Optional[BaseException] = None):
+        pass
+
+NOOP_SPAN = NoopSpan()
+
+class Trace:
+    """The spans of one request; threads and tasks of the request add theirs to the same trace"""
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.spans: List[Span] = []
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        span = Span(self, name, parent.span_id if parent is not None else None, attributes)
+        # list.append is atomic, so spans ending in worker threads need no lock
+        self.spans.append(span)
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        root = self.spans[0] if self.spans else None
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name if root else "",
+            "start": root.start if root else None,
+            "duration_ms": root.duration_ms if root else None,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+# Trace and innermost open span of the request being served
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+def start_span(name: str, **attributes: Any):
+    """
+    Start a span without making it the current one, for work that outlives a
+    context manager such as an async generator; the caller must end it
+    """
+    trace = _trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    return trace.start_span(name, _span.get(), **attributes)
+
+@contextmanager
+def use_span(span):
+    """Make a span the parent of the spans started inside the block"""
+    if not isinstance(span, Span):
+        yield span
+        return
+    token = _span.set(span)
+    try:
+        yield span
+    finally:
+        _span.reset(token)
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """Record the block as a span of the current trace, if the request is traced"""
+    trace = _trace.get()
+    if trace is None:
+        yield NOOP_SPAN
+        return
+    current = trace.start_span(name, _span.get(), **attributes)
+    token = _span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    finally:
+        _span.reset(token)
+        current.end()
+
+def traced(name: str):
+    """Decorator recording each call of a function or coroutine function as a span"""
+    def decorator(fn: Callable):
+        signature = inspect.signature(fn)
+
+        def arguments(args, kwargs) -> Dict[str, Any]:
+            try:
+                bound = signature.bind_partial(*args, **kwargs).arguments
+            except TypeError:
+                return {}
+            return {key: bound[key] for key in TRACED_ARGUMENTS if key in bound}
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _trace.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(name, **arguments(args, kwargs)):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _trace.get() is None:
+                return fn(*args, **kwargs)
+            with span(name, **arguments(args, kwargs)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class TraceSink:
+    """
+    Appends finished traces as JSON lines to a local file
+
+    Each write is one append of a whole line, so the workers of a host can
+    share the file. Once it outgrows max_bytes it is moved to `<path>.1`,
+    replacing the previous one.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def write(self, trace: Dict[str, Any]):
+        line = json.dumps(trace, default=str) + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            try:
+                if os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+            except FileNotFoundError:
+                pass
+            with open(self.path, "a") as f:
+                f.write(line)
+
+    def find(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """Look a trace up by id, in the current file and the rotated one"""
+        for path in (self.path, self.path + ".1"):
+            try:
+                with open(path) as f:
+                    for line in f:
+                        if trace_id in line:
+                            trace = json.loads(line)
+                            if trace.get("trace_id") == trace_id:
+                                return trace
+            except FileNotFoundError:
+                continue
+        return None
+
+def profile_path(trace_id: str) -> str:
+    """Where the folded stacks of a profiled request are kept"""
+    return os.path.join(settings.PROFILE_DIR, f"{trace_id}.folded")
+
+def save_profile(trace_id: str, stacks: Dict[str, int]):
+    """Save a request's folded stacks, deleting the oldest profiles past PROFILE_MAX_FILES"""
+    write_folded(profile_path(trace_id), stacks)
+    with os.scandir(settings.PROFILE_DIR) as entries:
+        profiles = [entry for entry in entries if entry.name.endswith(".folded") and entry.is_file()]
+    if len(profiles) > settings.PROFILE_MAX_FILES:
+        profiles.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in profiles[:len(profiles) - settings.PROFILE_MAX_FILES]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+# Only one request is profiled at a time, as the profiler samples the whole process
+_profile_lock = threading.Lock()
+
+class TracingMiddleware:
+    """
+    ASGI middleware tracing the requests that ask for it
+
+    A request is traced when it sends an `X-Trace: 1` header or a `trace=1`
+    query parameter, or at random for TRACE_SAMPLE_RATE of requests. Its
+    trace id is returned in the X-Trace-Id response header. With
+    PROFILING_ENABLED, `X-Profile: 1` or `profile=1` also samples the
+    process's stacks while the request runs and saves them under PROFILE_DIR
+    for its flame graph, keeping the latest PROFILE_MAX_FILES profiles.
+    """
+
+    def __init__(self, app, sink: Optional[TraceSink] = None):
+        self.app = app
+        self.sink = sink if sink is not None else trace_sink
+
+    @staticmethod
+    def _flags(scope) -> Dict[str, bool]:
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        flags = {}
+        for flag in (TRACE_FLAG, PROFILE_FLAG):
+            value = headers.get(f"x-{flag}") or (query.get(flag) or [""])[0]
+            flags[flag] = value.lower() in TRUE_VALUES
+        return flags
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        flags = self._flags(scope)
+        profile = flags[PROFILE_FLAG] and settings.PROFILING_ENABLED
+        if not (flags[TRACE_FLAG] or profile or random.random() < settings.TRACE_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        root = trace.start_span(f"{scope['method']} {scope['path']}", method=scope["method"], path=scope["path"])
+        trace_token, span_token = _trace.set(trace), _span.set(root)
+
+        profiler = None
+        if profile:
+            if _profile_lock.acquire(blocking=False):
+                profiler = SamplingProfiler(settings.PROFILE_INTERVAL)
+                profiler.start()
+                # The sampler cannot tell threads apart by request
+                root.set(profile_scope="all threads of the process, including other requests'")
+            else:
+                root.set(profile="skipped: another request is being profiled")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set(status=message["status"])
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"x-trace-id", trace.trace_id.encode("latin-1"))
+                ]}
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _span.reset(span_token)
+            _trace.reset(trace_token)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                root.name = f"{scope['method']} {route}"
+            root.end(error)
+            if profiler is not None:
+                try:
+                    stacks = profiler.stop()
+                    root.set(profile_samples=profiler.samples)
+                    await asyncio.to_thread(save_profile, trace.trace_id, stacks)
+                except Exception as e:
+                    logger.warning(f"Could not save the profile of trace {trace.trace_id}: {e}")
+                finally:
+                    _profile_lock.release()
+            try:
+                await asyncio.to_thread(self.sink.write, trace.to_dict())
+            except Exception as e:
+                logger.warning(f"Could not export trace {trace.trace_id}: {e}")
+
+# Create a singleton instance
+trace_sink = TraceSink(settings.TRACE_FILE, settings.TRACE_FILE_MAX_BYTES)
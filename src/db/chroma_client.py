@@ -1,88 +1,475 @@
-import chromadb
-from typing import List, Dict, Any, Optional
+import contextvars
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from src.core import metrics, tracing
 from src.core.config import settings
+from src.db.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from src.db.shared_store import SharedStore, shared_store
+from src.db.vector_store import create_vector_store, matches_where
+
+# Growth factor of the BM25 matches fetched while too few pass a filter
+LEXICAL_OVERFETCH = 4
+
+def get_embedding_service():
+    """Get the embedding service; imported lazily because src.services imports this module"""
+    from src.services.embedding_service import embedding_service
+    return embedding_service
 
 class ChromaDBClient:
-    def __init__(self):
-        self.client = None
-        
+    """
+    Vector database facade used by the services
+
+    Storage and search are delegated to the backend selected by
+    VECTOR_BACKEND: a Chroma server or the embedded in-process store.
+
+    With a shared store, every write bumps the collection's generation there.
+    Retrieval results are cached in the shared store under the current
+    generation, so worker processes reuse each other's searches, and a
+    worker whose BM25 index missed another worker's writes rebuilds it.
+    """
+
+    def __init__(self, backend: Optional[str] = None, shared: Optional[SharedStore] = None):
+        self.store = create_vector_store(backend or settings.VECTOR_BACKEND)
+        self.lexical_index = LexicalIndex(loader=self.iter_documents)
+        self.shared = shared
+        # Collection generation each BM25 index is known to reflect
+        self._lexical_generations: Dict[str, int] = {}
+        self._generation_lock = threading.Lock()
+        # Searches of a multi-collection query run side by side
+        self.pool = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_MAX_WORKERS, thread_name_prefix="retrieve")
+        # Searches of each collection running on the pool, including those given up on
+        self._in_flight: Dict[str, int] = {}
+        self._in_flight_lock = threading.Lock()
+
+    @property
+    def is_connected(self) -> bool:
+        """Whether the backend is connected"""
+        return self.store.is_connected
+
+    @property
+    def needs_embeddings(self) -> bool:
+        """Whether embeddings are computed here rather than by the backend"""
+        return settings.EMBEDDING_ENABLED or self.store.requires_embeddings
+
+    @property
+    def breaker(self):
+        """Circuit breaker of the backend, None for the embedded store"""
+        return self.store.breaker
+
     def connect(self):
-        """Connect to ChromaDB"""
-        try:
-            self.client = chromadb.HttpClient(
-                host=settings.CHROMA_HOST, 
-                port=settings.CHROMA_PORT
-            )
-            collections = self.client.list_collections()
-            print(f"Connected to Chroma. Found {len(collections)} collections.")
-            return True
-        except Exception as e:
-            print(f"Warning: Could not connect to Chroma: {e}")
-            print("Make sure Chroma is running.")
-            return False
-    
-    def get_client(self):
-        """Get the ChromaDB client"""
-        if not self.client:
-            self.connect()
-        return self.client
+        """Connect to the vector store backend"""
+        return self.store.connect()
+
+    def ping(self):
+        """Check that the backend answers, connecting if needed; raises if it does not"""
+        self.store.ping()
+        if not self.store.is_connected and not self.store.connect():
+            raise ConnectionError("Could not connect to the vector store")
     
+    @tracing.traced("chroma.list_collections")
     def list_collections(self) -> List[str]:
         """List all collections in the database"""
-        client = self.get_client()
-        collections = client.list_collections()
-        return [collection.name for collection in collections]
+        return self.store.list_collections()
     
+    @tracing.traced("chroma.create_collection")
     def create_collection(self, name: str):
         """Create a new collection"""
-        client = self.get_client()
-        return client.create_collection(name=name)
+        collection = self.store.create_collection(name)
+        metrics.known_collections.add(name)
+        return collection
     
+    @tracing.traced("chroma.get_or_create_collection")
     def get_or_create_collection(self, name: str):
         """Get or create a collection"""
-        client = self.get_client()
-        return client.get_or_create_collection(name=name)
-    
-    def get_collection(self, name: str):
-        """Get a collection"""
-        client = self.get_client()
-        return client.get_collection(name=name)
+        collection = self.store.get_or_create_collection(name)
+        metrics.known_collections.add(name)
+        return collection
+
+    def generation(self, collection_name: str) -> int:
+        """Shared generation of a collection, bumped by every write from any worker"""
+        if self.shared is None:
+            return 0
+        return self.shared.counter("collection_generation", collection_name)
+
+    def _record_write(self, collection_name: str):
+        if self.shared is None:
+            return
+        generation = self.shared.incr("collection_generation", collection_name)
+        with self._generation_lock:
+            # Our BM25 index already has this write, but not any another worker made in between
+            if self._lexical_generations.get(collection_name) == generation - 1:
+                self._lexical_generations[collection_name] = generation
+
+    def _sync_lexical_index(self, collection_name: str):
+        """Drop a collection's BM25 index if another worker wrote to the collection since it was built"""
+        generation = self.generation(collection_name)
+        with self._generation_lock:
+            seen = self._lexical_generations.get(collection_name)
+            self._lexical_generations[collection_name] = generation
+        if seen is not None and seen != generation:
+            self.lexical_index.drop(collection_name)
     
+    @tracing.traced("chroma.add_documents")
     def add_documents(self, collection_name: str, documents: List[str], 
-                     ids: List[str], metadatas: List[Dict[str, Any]]):
-        """Add documents to a collection"""
-        collection = self.get_or_create_collection(collection_name)
-        collection.add(
-            documents=documents,
-            ids=ids,
-            metadatas=metadatas
-        )
+                     ids: List[str], metadatas: List[Dict[str, Any]],
+                     embeddings: Optional[List[List[float]]] = None):
+        """Add documents to a collection, embedding them unless their embeddings are given"""
+        if embeddings is None and self.needs_embeddings:
+            with metrics.track_stage("embed_documents"):
+                embeddings = get_embedding_service().embed_documents(documents)
+        with metrics.track_stage("vector_add"):
+            self.store.add(
+                collection_name=collection_name,
+                ids=ids,
+                documents=documents,
+                metadatas=metadatas,
+                embeddings=embeddings
+            )
+        with metrics.track_stage("lexical_add"):
+            self.lexical_index.add(collection_name, ids, documents)
+        # Adding documents creates the collection if it is new
+        metrics.known_collections.add(collection_name)
+        self._record_write(collection_name)
+    
+    @tracing.traced("chroma.update_metadatas")
+    def update_metadatas(self, collection_name: str, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Update the metadata of documents without re-embedding them"""
+        self.store.update_metadatas(collection_name, ids, metadatas)
+        self._record_write(collection_name)
+    
+    @tracing.traced("chroma.delete_documents")
+    def delete_documents(self, collection_name: str, ids: List[str]):
+        """Delete documents from a collection"""
+        self.store.delete(collection_name, ids)
+        self.lexical_index.remove(collection_name, ids)
+        self._record_write(collection_name)
+
+    def iter_documents(self, collection_name: str, page_size: Optional[int] = None) -> Iterator[Tuple[List[str], List[str]]]:
+        """Page through every (ids, documents) of a collection"""
+        page_size = page_size or settings.LEXICAL_LOAD_PAGE_SIZE
+        offset = 0
+        while True:
+            page = self.store.get(collection_name, offset=offset, limit=page_size)
+            if not page["ids"]:
+                return
+            yield page["ids"], page["documents"]
+            offset += len(page["ids"])
+    
+    def iter_records(self, collection_name: str, page_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Page through every document of a collection with its metadata and embedding"""
+        page_size = page_size or settings.LEXICAL_LOAD_PAGE_SIZE
+        offset = 0
+        while True:
+            page = self.store.get(collection_name, offset=offset, limit=page_size, include_embeddings=True)
+            if not page["ids"]:
+                return
+            yield page
+            offset += len(page["ids"])
     
-    def query_collection(self, collection_name: str, query_text: str, n_results: int = 3):
-        """Query a collection"""
+    def query_collection(self, collection_name: str, query_text: str, n_results: int = 3,
+                         vector_weight: Optional[float] = None, lexical_weight: Optional[float] = None):
+        """
+        Query a collection, fusing dense and BM25 results
+
+        Args:
+            collection_name: The name of the collection to search
+            query_text: The query
+            n_results: Number of documents to return
+            vector_weight: Weight of the dense ranking in the fusion (default: HYBRID_VECTOR_WEIGHT)
+            lexical_weight: Weight of the BM25 ranking in the fusion (default: HYBRID_LEXICAL_WEIGHT)
+
+        Returns:
+            A list of {"id", "content", "metadata", "score"} dicts, best first
+        """
         try:
-            collection = self.get_collection(name=collection_name)
-            results = collection.query(
-                query_texts=[query_text],
-                n_results=n_results
-            )
-            
-            # Extract documents and metadata
-            documents = results['documents'][0] if results['documents'] else []
-            metadatas = results['metadatas'][0] if results['metadatas'] else []
-            
-            # Format context
-            context = []
-            for doc, meta in zip(documents, metadatas):
-                context.append({
-                    "content": doc,
-                    "metadata": meta
-                })
-            
-            return context
+            return self.query_collection_batch(collection_name, [query_text], n_results, vector_weight, lexical_weight)[0]
         except Exception as e:
             print(f"Error querying collection: {e}")
             return []
 
+    @tracing.traced("chroma.query_collection_batch")
+    def query_collection_batch(self, collection_name: str, query_texts: List[str], n_results: int = 3,
+                               vector_weight: Optional[float] = None,
+                               lexical_weight: Optional[float] = None,
+                               query_embeddings: Optional[List[List[float]]] = None,
+                               where: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Query a collection with several queries at once
+
+        The queries are embedded as one batch, unless their embeddings are
+        given, and sent to the vector store in a single query call. Unlike
+        query_collection, errors are raised.
+
+        Each document's score is its fused rank score divided by the best
+        attainable one, so it lies in (0, 1] whatever the weights. Its
+        distance is the vector store's distance to the query, or None if
+        only BM25 found it, and its lexical_score is its BM25 score, or None
+        if BM25 did not find it. Only documents whose metadata matches `where`,
+        a filter in Chroma's syntax, are returned.
+
+        With a shared store, results are looked up there first and only the
+        queries that miss are searched.
+
+        Returns:
+            One context list per query, in the same order
+        """
+        vector_weight = settings.HYBRID_VECTOR_WEIGHT if vector_weight is None else vector_weight
+        lexical_weight = settings.HYBRID_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+        if self.shared is None:
+            return self._search_batch(collection_name, query_texts, n_results, vector_weight, lexical_weight,
+                                      query_embeddings, where)
+        
+        generation = self.generation(collection_name)
+        filter_key = json.dumps(where, sort_keys=True) if where else ""
+        keys = [
+            f"retrieval:{collection_name}:{generation}:{n_results}:{vector_weight}:{lexical_weight}:"
+            + hashlib.sha256(f"{filter_key}\0{query_text}".encode("utf-8")).hexdigest()
+            for query_text in query_texts
+        ]
+        contexts = [self.shared.get_json(key) for key in keys]
+        missing = [i for i, context in enumerate(contexts) if context is None]
+        if missing:
+            computed = self._search_batch(
+                collection_name,
+                [query_texts[i] for i in missing],
+                n_results,
+                vector_weight,
+                lexical_weight,
+                None if query_embeddings is None else [query_embeddings[i] for i in missing],
+                where
+            )
+            for i, context in zip(missing, computed):
+                contexts[i] = context
+                self.shared.put_json(keys[i], context)
+        return contexts
+
+    def _search_batch(self, collection_name: str, query_texts: List[str], n_results: int,
+                      vector_weight: float, lexical_weight: float,
+                      query_embeddings: Optional[List[List[float]]] = None,
+                      where: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """Search a collection with several queries, fusing dense and BM25 results"""
+        hybrid = lexical_weight > 0
+        candidates = max(n_results, settings.HYBRID_CANDIDATES) if hybrid else n_results
+        k = settings.HYBRID_RRF_K
+        
+        documents: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        vector_ids: List[List[str]] = [[] for _ in query_texts]
+        distances: List[Dict[str, float]] = [{} for _ in query_texts]
+        lexical_scores: List[Dict[str, float]] = [{} for _ in query_texts]
+        if vector_weight > 0 or not hybrid:
+            results = self._vector_query(collection_name, query_texts, candidates, query_embeddings, where)
+            result_distances = results.get('distances') or [[None] * len(ids) for ids in results['ids']]
+            for ranking, query_distances, ids, docs, metas, dists in zip(
+                    vector_ids, distances, results['ids'], results['documents'], results['metadatas'], result_distances):
+                for doc_id, doc, meta, distance in zip(ids, docs, metas, dists):
+                    documents[doc_id] = (doc, meta)
+                    ranking.append(doc_id)
+                    query_distances[doc_id] = distance
+        
+        if hybrid:
+            if self.shared is not None:
+                self._sync_lexical_index(collection_name)
+            rankings = []
+            for query_text, ranking, query_lexical_scores in zip(query_texts, vector_ids, lexical_scores):
+                query_lexical_scores.update(self._lexical_search(collection_name, query_text, candidates, where, documents))
+                lexical_ids = list(query_lexical_scores)
+                fused = reciprocal_rank_fusion(
+                    [ranking, lexical_ids],
+                    [vector_weight, lexical_weight],
+                    k=k
+                )
+                rankings.append(fused[:n_results])
+            self._fetch_documents(collection_name, [doc_id for ranking in rankings for doc_id, _ in ranking], documents)
+            best_score = (vector_weight + lexical_weight) / (k + 1)
+        else:
+            rankings = [[(doc_id, 1 / (k + rank)) for rank, doc_id in enumerate(ranking[:n_results], start=1)]
+                        for ranking in vector_ids]
+            best_score = 1 / (k + 1)
+        
+        # Format context
+        contexts = []
+        for ranking, query_distances, query_lexical_scores in zip(rankings, distances, lexical_scores):
+            context = []
+            for doc_id, score in ranking:
+                if doc_id in documents:
+                    doc, meta = documents[doc_id]
+                    context.append({
+                        "id": doc_id,
+                        "content": doc,
+                        "metadata": meta,
+                        "score": score / best_score,
+                        "distance": query_distances.get(doc_id),
+                        "lexical_score": query_lexical_scores.get(doc_id)
+                    })
+            contexts.append(context)
+        
+        return contexts
+
+    def _lexical_search(self, collection_name: str, query_text: str, n_results: int,
+                        where: Optional[Dict[str, Any]],
+                        documents: Dict[str, Tuple[str, Dict[str, Any]]]) -> List[Tuple[str, float]]:
+        """
+        BM25 search for the best n_results matches that pass the `where` filter
+
+        The BM25 index has no metadata, so its matches are filtered by the
+        stored metadata. Filtered searches fetch ever more matches until
+        n_results pass or there are no more, so a selective filter still
+        gets a full page.
+        """
+        fetch = n_results
+        while True:
+            with metrics.track_stage("lexical_query"):
+                matches = self.lexical_index.search(collection_name, query_text, fetch)
+            if not where:
+                return matches
+            self._fetch_documents(collection_name, [doc_id for doc_id, _ in matches], documents)
+            passed = [(doc_id, score) for doc_id, score in matches
+                      if doc_id in documents and matches_where(documents[doc_id][1], where)]
+            if len(passed) >= n_results or len(matches) < fetch:
+                return passed[:n_results]
+            fetch *= LEXICAL_OVERFETCH
+
+    def _fetch_documents(self, collection_name: str, ids: List[str], documents: Dict[str, Tuple[str, Dict[str, Any]]]):
+        """Add the (document, metadata) of the ids not yet in documents"""
+        missing = list({doc_id for doc_id in ids if doc_id not in documents})
+        if missing:
+            page = self.store.get(collection_name, ids=missing)
+            for doc_id, doc, meta in zip(page['ids'], page['documents'], page['metadatas']):
+                documents[doc_id] = (doc, meta)
+
+    @tracing.traced("chroma.query_collections")
+    def query_collections(self, collection_names: List[str], query_text: str, n_results: int = 3,
+                          vector_weight: Optional[float] = None, lexical_weight: Optional[float] = None,
+                          timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Query several collections concurrently and merge the results
+
+        The query is embedded once, then every collection is searched in its
+        own thread. A collection that fails, or has not answered within
+        `timeout` seconds, is left out so it cannot hold up the others. A
+        search given up on keeps running, so a collection with
+        RETRIEVAL_COLLECTION_MAX_IN_FLIGHT searches still running is skipped
+        rather than searched again, leaving the pool to the others.
+
+        Each collection's scores are relative to its own best match, so they
+        are not merged directly. The vector distances of all the hits, which
+        share the query embedding, are ranked across collections instead. BM25
+        scores depend on each index's document frequencies and lengths, so
+        they are only comparable within a collection: each hit's is divided by
+        the best one of its collection before they are ranked. The two
+        rankings are fused as in a single collection. Ties keep the order of
+        collection_names, and a document found in several collections is kept
+        once.
+
+        Args:
+            collection_names: The collections to search
+            query_text: The query
+            n_results: Number of documents to return in total
+            vector_weight: Weight of the dense ranking in the fusion (default: HYBRID_VECTOR_WEIGHT)
+            lexical_weight: Weight of the BM25 ranking in the fusion (default: HYBRID_LEXICAL_WEIGHT)
+            timeout: Seconds to wait for the collections (default: RETRIEVAL_COLLECTION_TIMEOUT)
+
+        Returns:
+            A list of {"id", "content", "metadata", "score", "collection"} dicts, best first
+        """
+        timeout = settings.RETRIEVAL_COLLECTION_TIMEOUT if timeout is None else timeout
+        vector_weight = settings.HYBRID_VECTOR_WEIGHT if vector_weight is None else vector_weight
+        lexical_weight = settings.HYBRID_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+        query_embeddings = None
+        if self.needs_embeddings and (vector_weight > 0 or lexical_weight <= 0):
+            with metrics.track_stage("embed_queries"):
+                query_embeddings = get_embedding_service().embed_queries([query_text])
+        
+        def search(name: str):
+            try:
+                return self.query_collection_batch(name, [query_text], n_results, vector_weight, lexical_weight,
+                                                   query_embeddings)
+            finally:
+                with self._in_flight_lock:
+                    self._in_flight[name] -= 1
+
+        futures = {}
+        for name in collection_names:
+            with self._in_flight_lock:
+                busy = self._in_flight.get(name, 0) >= settings.RETRIEVAL_COLLECTION_MAX_IN_FLIGHT
+                if not busy:
+                    self._in_flight[name] = self._in_flight.get(name, 0) + 1
+            if busy:
+                metrics.RETRIEVAL_SKIPPED.labels(collection=metrics.collection_label(name), reason="busy").inc()
+                print(f"Warning: Collection {name} is still busy with earlier searches, answering without it")
+                continue
+            # Each search runs in a copy of the caller's context, so it joins the caller's trace
+            futures[name] = self.pool.submit(contextvars.copy_context().run, search, name)
+        wait(futures.values(), timeout=timeout)
+        
+        found: Dict[str, Dict[str, Any]] = {}
+        for name, future in futures.items():
+            if not future.done():
+                if future.cancel():
+                    # Never started, so it will not release its slot itself
+                    with self._in_flight_lock:
+                        self._in_flight[name] -= 1
+                metrics.RETRIEVAL_SKIPPED.labels(collection=metrics.collection_label(name), reason="timeout").inc()
+                print(f"Warning: Collection {name} did not answer within {timeout}s, answering without it")
+            elif future.exception() is not None:
+                metrics.RETRIEVAL_SKIPPED.labels(collection=metrics.collection_label(name), reason="error").inc()
+                print(f"Error querying collection {name}: {future.exception()}")
+            else:
+                for document in future.result()[0]:
+                    found.setdefault(document["id"], {**document, "collection": name})
+        
+        # BM25 scores depend on each index's term statistics, so each
+        # collection's are scaled by its best one before they are compared
+        top_lexical: Dict[str, float] = {}
+        for doc in found.values():
+            if doc.get("lexical_score") is not None:
+                top_lexical[doc["collection"]] = max(top_lexical.get(doc["collection"], 0.0), doc["lexical_score"])
+        
+        def relative_lexical(doc: Dict[str, Any]) -> float:
+            top = top_lexical[doc["collection"]]
+            return doc["lexical_score"] / top if top > 0 else 0.0
+        
+        # Sorts are stable, so ties keep the order of the collections
+        hybrid = lexical_weight > 0
+        dense = sorted((doc for doc in found.values() if doc.get("distance") is not None), key=lambda doc: doc["distance"])
+        lexical = sorted((doc for doc in found.values() if doc.get("lexical_score") is not None),
+                         key=relative_lexical, reverse=True)
+        weights = [vector_weight if hybrid else 1.0, lexical_weight]
+        k = settings.HYBRID_RRF_K
+        fused = reciprocal_rank_fusion([[doc["id"] for doc in dense], [doc["id"] for doc in lexical]], weights, k=k)
+        best_score = sum(weights) / (k + 1)
+        
+        context = [{**found[doc_id], "score": score / best_score} for doc_id, score in fused]
+        # Hits with neither signal, e.g. from a store that returns no distances, come last
+        ranked = {doc["id"] for doc in context}
+        context.extend(doc for doc in found.values() if doc["id"] not in ranked)
+        return context[:n_results]
+
+    def _vector_query(self, collection_name: str, query_texts: List[str], n_results: int,
+                      query_embeddings: Optional[List[List[float]]] = None,
+                      where: Optional[Dict[str, Any]] = None) -> Dict[str, List[List[Any]]]:
+        """Dense nearest-neighbour search for a batch of queries"""
+        if self.needs_embeddings:
+            if query_embeddings is None:
+                with metrics.track_stage("embed_queries"):
+                    query_embeddings = get_embedding_service().embed_queries(query_texts)
+            with metrics.track_stage("vector_query"):
+                return self.store.query(
+                    collection_name,
+                    query_embeddings=query_embeddings,
+                    n_results=n_results,
+                    where=where
+                )
+        with metrics.track_stage("vector_query"):
+            return self.store.query(
+                collection_name,
+                query_texts=query_texts,
+                n_results=n_results,
+                where=where
+            )
+
 # Create a singleton instance
-chroma_client = ChromaDBClient() 
\ No newline at end of file
+chroma_client = ChromaDBClient(shared=shared_store) 
\ No newline at end of file
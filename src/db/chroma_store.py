@@ -0,0 +1,157 @@
+import threading
+
+import httpx
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from src.core.config import settings
+from src.core.resilience import CircuitBreaker, call_with_retry
+from src.db.vector_store import VectorStore
+
+T = TypeVar("T")
+
+class ChromaVectorStore(VectorStore):
+    """
+    Vector store backed by a Chroma server over HTTP
+
+    Every call goes through a circuit breaker and is retried with jittered
+    backoff while the connection fails, and the HTTP session has connect and
+    request timeouts, so a hung server cannot hold requests indefinitely.
+
+    Collection handles are kept per process, saving the lookup round trip
+    that every call used to start with. They are bound to this process's
+    HTTP session, so unlike cached data they cannot be shared between
+    workers.
+    """
+
+    def __init__(self):
+        self.client = None
+        self.breaker = CircuitBreaker(
+            "chroma",
+            failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.CIRCUIT_RESET_TIMEOUT
+        )
+        self._connect_lock = threading.Lock()
+        self._collections: Dict[str, Any] = {}
+
+    @property
+    def is_connected(self) -> bool:
+        return self.client is not None
+
+    def ping(self):
+        """Check that the server answers within the connect timeout"""
+        response = httpx.get(
+            f"http://{settings.CHROMA_HOST}:{settings.CHROMA_PORT}/api/v2/heartbeat",
+            timeout=settings.CHROMA_CONNECT_TIMEOUT
+        )
+        if response.status_code >= 500:
+            raise ConnectionError(f"Chroma heartbeat returned status code {response.status_code}")
+
+    def _connect(self):
+        # Imported on first use: chromadb is slow to import
+        import chromadb
+        
+        # The chromadb client calls the server from its constructor without a
+        # timeout, so check that the server answers first
+        self.ping()
+        client = chromadb.HttpClient(
+            host=settings.CHROMA_HOST, 
+            port=settings.CHROMA_PORT
+        )
+        # chromadb creates its HTTP session without timeouts
+        session = getattr(getattr(client, "_server", None), "_session", None)
+        if isinstance(session, httpx.Client):
+            session.timeout = httpx.Timeout(settings.CHROMA_REQUEST_TIMEOUT, connect=settings.CHROMA_CONNECT_TIMEOUT)
+        self._collections = {}
+        self.client = client
+
+    def connect(self) -> bool:
+        """Connect to ChromaDB"""
+        try:
+            with self._connect_lock:
+                call_with_retry(self._connect, self.breaker)
+            collections = self.client.list_collections()
+            print(f"Connected to Chroma. Found {len(collections)} collections.")
+            return True
+        except Exception as e:
+            print(f"Warning: Could not connect to Chroma: {e}")
+            print("Make sure Chroma is running.")
+            return False
+
+    def get_client(self):
+        """Get the ChromaDB client, connecting on first use"""
+        if not self.client:
+            with self._connect_lock:
+                if not self.client:
+                    self._connect()
+        return self.client
+
+    def _call(self, fn: Callable[[Any], T]) -> T:
+        """Call the server with the client, through the circuit breaker"""
+        return call_with_retry(lambda: fn(self.get_client()), self.breaker)
+
+    def _call_collection(self, name: str, fn: Callable[[Any], T], create: bool = False) -> T:
+        """Call the server with a collection's cached handle, looking it up on first use"""
+        def call(client):
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = client.get_or_create_collection(name) if create else client.get_collection(name)
+                self._collections[name] = collection
+            try:
+                return fn(collection)
+            except Exception:
+                # The collection may have been deleted or recreated elsewhere; look it up again next time
+                self._collections.pop(name, None)
+                raise
+        return self._call(call)
+
+    def list_collections(self) -> List[str]:
+        return self._call(lambda client: [collection.name for collection in client.list_collections()])
+
+    def create_collection(self, name: str):
+        return self._call(lambda client: client.create_collection(name=name))
+
+    def get_or_create_collection(self, name: str):
+        return self._call(lambda client: client.get_or_create_collection(name=name))
+
+    def get_collection(self, name: str):
+        """Get a collection"""
+        return self._call_collection(name, lambda collection: collection)
+
+    def add(self, collection_name: str, ids: List[str], documents: List[str],
+            metadatas: List[Dict[str, Any]], embeddings: Optional[List[List[float]]] = None):
+        self._call_collection(collection_name, lambda collection: collection.add(
+            documents=documents,
+            embeddings=embeddings,
+            ids=ids,
+            metadatas=metadatas
+        ), create=True)
+
+    def update_metadatas(self, collection_name: str, ids: List[str], metadatas: List[Dict[str, Any]]):
+        self._call_collection(collection_name, lambda collection: collection.update(ids=ids, metadatas=metadatas))
+
+    def delete(self, collection_name: str, ids: List[str]):
+        self._call_collection(collection_name, lambda collection: collection.delete(ids=ids))
+
+    def get(self, collection_name: str, ids: Optional[List[str]] = None, offset: int = 0,
+            limit: Optional[int] = None, include_embeddings: bool = False) -> Dict[str, Any]:
+        include = ["documents", "metadatas", "embeddings"] if include_embeddings else ["documents", "metadatas"]
+        page = self._call_collection(collection_name, lambda collection: collection.get(
+            ids=ids,
+            offset=offset or None,
+            limit=limit,
+            include=include
+        ))
+        if include_embeddings:
+            embeddings = page["embeddings"]
+            page = {**page, "embeddings": np.asarray([] if embeddings is None else embeddings, dtype=np.float32)}
+        return page
+
+    def query(self, collection_name: str, query_embeddings: Optional[List[List[float]]] = None,
+              query_texts: Optional[List[str]] = None, n_results: int = 3,
+              where: Optional[Dict[str, Any]] = None) -> Dict[str, List[List[Any]]]:
+        def query(collection):
+            if query_embeddings is not None:
+                return collection.query(query_embeddings=query_embeddings, n_results=n_results, where=where or None)
+            return collection.query(query_texts=query_texts, n_results=n_results, where=where or None)
+        return self._call_collection(collection_name, query)
@@ -0,0 +1,293 @@
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.db.vector_store import VectorStore, matches_where
+
+# Same naming rules as Chroma, which also keeps names safe as directory names
+COLLECTION_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9._-]{1,61}[a-zA-Z0-9]$")
+
+VECTORS_FILE = "vectors.f32"
+RECORDS_FILE = "records.jsonl"
+META_FILE = "meta.json"
+
+class EmbeddedCollection:
+    """
+    One collection of the embedded store
+
+    Unit-length float32 vectors are appended to a raw file that is memory-mapped
+    as an (n, dim) matrix. Ids, documents and metadata are kept in memory and
+    persisted as an append-only JSONL log of add/update/delete records, which is
+    replayed on load. Deleted rows stay in the matrix and are masked out.
+    The indices of the live rows are computed once per change rather than on
+    every page, so paging through a collection stays linear.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.rows: Dict[str, int] = {}
+        self.alive = bytearray()
+        self._live: Optional[np.ndarray] = None
+        self.vectors: Optional[np.ndarray] = None
+        self.lock = threading.RLock()
+        self._load()
+
+    @property
+    def count(self) -> int:
+        return len(self.rows)
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self._path(META_FILE)):
+            with open(self._path(META_FILE)) as f:
+                self.dim = json.load(f)["dim"]
+        if not os.path.exists(self._path(RECORDS_FILE)):
+            return
+
+        with open(self._path(RECORDS_FILE)) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                op = record["op"]
+                if op == "add":
+                    self._apply_add(record["id"], record["document"], record["metadata"])
+                elif op == "update" and record["id"] in self.rows:
+                    self.metadatas[self.rows[record["id"]]] = record["metadata"]
+                elif op == "delete" and record["id"] in self.rows:
+                    self.alive[self.rows.pop(record["id"])] = 0
+                    self._live = None
+        self._map_vectors()
+
+    def _map_vectors(self):
+        """(Re)map the vector file, covering only rows that have a record"""
+        rows = len(self.ids)
+        if rows == 0 or self.dim is None:
+            self.vectors = None
+            return
+        self.vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def _live_rows(self) -> np.ndarray:
+        """Indices of the rows that were not deleted or replaced"""
+        if self._live is None:
+            self._live = np.flatnonzero(np.frombuffer(bytes(self.alive), dtype=np.uint8))
+        return self._live
+
+    def _apply_add(self, chunk_id: str, document: str, metadata: Dict[str, Any]):
+        self._live = None
+        if chunk_id in self.rows:
+            self.alive[self.rows[chunk_id]] = 0
+        self.rows[chunk_id] = len(self.ids)
+        self.ids.append(chunk_id)
+        self.documents.append(document)
+        self.metadatas.append(metadata)
+        self.alive.append(1)
+
+    def _append_records(self, records: List[Dict[str, Any]]):
+        with open(self._path(RECORDS_FILE), "a") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], embeddings: List[List[float]]):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("Expected one embedding per document")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self._path(META_FILE), "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self.dim}")
+
+            # Vectors are written before their records, so a crash in between
+            # leaves unreferenced rows rather than records without vectors
+            with open(self._path(VECTORS_FILE), "ab") as f:
+                f.seek(len(self.ids) * self.dim * 4)
+                f.truncate()
+                f.write(vectors.tobytes())
+            self._append_records([
+                {"op": "add", "id": chunk_id, "document": document, "metadata": metadata}
+                for chunk_id, document, metadata in zip(ids, documents, metadatas)
+            ])
+            for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                self._apply_add(chunk_id, document, metadata)
+            self._map_vectors()
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        with self.lock:
+            records = []
+            for chunk_id, metadata in zip(ids, metadatas):
+                if chunk_id in self.rows:
+                    self.metadatas[self.rows[chunk_id]] = metadata
+                    records.append({"op": "update", "id": chunk_id, "metadata": metadata})
+            self._append_records(records)
+
+    def delete(self, ids: List[str]):
+        with self.lock:
+            records = []
+            for chunk_id in ids:
+                if chunk_id in self.rows:
+                    self.alive[self.rows.pop(chunk_id)] = 0
+                    self._live = None
+                    records.append({"op": "delete", "id": chunk_id})
+            self._append_records(records)
+
+    def get(self, ids: Optional[List[str]] = None, offset: int = 0,
+            limit: Optional[int] = None, include_embeddings: bool = False) -> Dict[str, Any]:
+        with self.lock:
+            if ids is not None:
+                rows = [self.rows[chunk_id] for chunk_id in ids if chunk_id in self.rows]
+            else:
+                end = None if limit is None else offset + limit
+                rows = self._live_rows()[offset:end].tolist()
+            page = {
+                "ids": [self.ids[row] for row in rows],
+                "documents": [self.documents[row] for row in rows],
+                "metadatas": [self.metadatas[row] for row in rows],
+            }
+            if include_embeddings:
+                if rows:
+                    page["embeddings"] = np.array(self.vectors[rows], dtype=np.float32)
+                else:
+                    page["embeddings"] = np.zeros((0, self.dim or 0), dtype=np.float32)
+            return page
+
+    def query(self, query_embeddings: List[List[float]], n_results: int,
+              where: Optional[Dict[str, Any]] = None) -> Dict[str, List[List[Any]]]:
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        with self.lock:
+            vectors, count = self.vectors, self.count
+            alive = np.frombuffer(bytes(self.alive), dtype=np.bool_)
+            if where:
+                # Filtered out rows are masked like deleted ones
+                alive = alive & np.fromiter((matches_where(metadata, where) for metadata in self.metadatas),
+                                            dtype=np.bool_, count=len(self.metadatas))
+                count = int(alive.sum())
+            k = min(n_results, count)
+            if vectors is None or k == 0:
+                for key in results:
+                    results[key] = [[] for _ in queries]
+                return results
+
+            # (rows, queries) cosine similarities in one matrix product
+            scores = vectors @ queries.T
+            if count < len(alive):
+                scores[~alive] = -np.inf
+
+            for column in range(scores.shape[1]):
+                column_scores = scores[:, column]
+                top = np.argpartition(-column_scores, k - 1)[:k]
+                top = top[np.argsort(-column_scores[top])]
+                results["ids"].append([self.ids[row] for row in top])
+                results["documents"].append([self.documents[row] for row in top])
+                results["metadatas"].append([self.metadatas[row] for row in top])
+                results["distances"].append([float(1.0 - column_scores[row]) for row in top])
+        return results
+
+class EmbeddedVectorStore(VectorStore):
+    """
+    In-process vector store keeping each collection in memory-mapped NumPy files
+
+    Search is an exact, vectorized top-k over cosine distance, so it needs no
+    separate server. Documents must be added with precomputed embeddings.
+    """
+
+    requires_embeddings = True
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.collections: Dict[str, EmbeddedCollection] = {}
+        self._connected = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def connect(self) -> bool:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._connected = True
+            print(f"Using embedded vector store at {self.directory}. Found {len(self.list_collections())} collections.")
+            return True
+        except Exception as e:
+            print(f"Warning: Could not open embedded vector store: {e}")
+            return False
+
+    def _collection_dir(self, name: str) -> str:
+        if not COLLECTION_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid collection name '{name}'")
+        return os.path.join(self.directory, name)
+
+    def list_collections(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if os.path.isdir(os.path.join(self.directory, name))
+        )
+
+    def get_collection(self, name: str) -> EmbeddedCollection:
+        """Get an existing collection"""
+        with self._lock:
+            if name not in self.collections:
+                directory = self._collection_dir(name)
+                if not os.path.isdir(directory):
+                    raise ValueError(f"Collection {name} does not exist.")
+                self.collections[name] = EmbeddedCollection(directory)
+            return self.collections[name]
+
+    def create_collection(self, name: str) -> EmbeddedCollection:
+        with self._lock:
+            directory = self._collection_dir(name)
+            if os.path.isdir(directory):
+                raise ValueError(f"Collection {name} already exists")
+            self.collections[name] = EmbeddedCollection(directory)
+            return self.collections[name]
+
+    def get_or_create_collection(self, name: str) -> EmbeddedCollection:
+        with self._lock:
+            if name not in self.collections:
+                self.collections[name] = EmbeddedCollection(self._collection_dir(name))
+            return self.collections[name]
+
+    def add(self, collection_name: str, ids: List[str], documents: List[str],
+            metadatas: List[Dict[str, Any]], embeddings: Optional[List[List[float]]] = None):
+        if embeddings is None:
+            raise ValueError("The embedded vector store needs precomputed embeddings")
+        self.get_or_create_collection(collection_name).add(ids, documents, metadatas, embeddings)
+
+    def update_metadatas(self, collection_name: str, ids: List[str], metadatas: List[Dict[str, Any]]):
+        self.get_collection(collection_name).update_metadatas(ids, metadatas)
+
+    def delete(self, collection_name: str, ids: List[str]):
+        self.get_collection(collection_name).delete(ids)
+
+    def get(self, collection_name: str, ids: Optional[List[str]] = None, offset: int = 0,
+            limit: Optional[int] = None, include_embeddings: bool = False) -> Dict[str, Any]:
+        return self.get_collection(collection_name).get(ids, offset, limit, include_embeddings)
+
+    def query(self, collection_name: str, query_embeddings: Optional[List[List[float]]] = None,
+              query_texts: Optional[List[str]] = None, n_results: int = 3,
+              where: Optional[Dict[str, Any]] = None) -> Dict[str, List[List[Any]]]:
+        if query_embeddings is None:
+            raise ValueError("The embedded vector store needs precomputed query embeddings")
+        return self.get_collection(collection_name).query(query_embeddings, n_results, where)
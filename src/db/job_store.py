@@ -0,0 +1,176 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from src.core.config import settings
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+JOB_COLUMNS = (
+    "id", "state", "filename", "collection_name", "chunk_size", "chunk_overlap", "size_unit", "keep_file", "file_path",
+    "chunks_total", "chunks_done", "error", "created_at", "updated_at"
+)
+
+class JobStore:
+    """SQLite-backed persistence for ingestion jobs"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Get the SQLite connection, creating the database on first use"""
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    collection_name TEXT NOT NULL,
+                    chunk_size INTEGER NOT NULL,
+                    keep_file INTEGER NOT NULL,
+                    file_path TEXT NOT NULL,
+                    chunks_total INTEGER NOT NULL DEFAULT 0,
+                    chunks_done INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at)")
+            # Process running a job and when it last said so, added after the table
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner_pid" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+            if "heartbeat_at" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            # Chunking options, NULL for jobs queued before they were stored
+            if "chunk_overlap" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN chunk_overlap INTEGER")
+            if "size_unit" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN size_unit TEXT")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def create(self, job_id: str, filename: str, collection_name: str, chunk_size: int,
+               keep_file: bool, file_path: str, chunk_overlap: Optional[int] = None,
+               size_unit: Optional[str] = None) -> Dict[str, Any]:
+        """Insert a new queued job"""
+        now = time.time()
+        with self._lock:
+            conn = self.get_connection()
+            conn.execute(
+                "INSERT INTO jobs (id, state, filename, collection_name, chunk_size, chunk_overlap, size_unit, "
+                "keep_file, file_path, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, filename, collection_name, chunk_size, chunk_overlap, size_unit,
+                 int(keep_file), file_path, now, now)
+            )
+            conn.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by id"""
+        with self._lock:
+            row = self.get_connection().execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list(self, state: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """List the most recent jobs, optionally filtered by state"""
+        query = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs"
+        params: tuple = ()
+        if state:
+            query += " WHERE state = ?"
+            params = (state,)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self.get_connection().execute(query, params + (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def update(self, job_id: str, **fields):
+        """Update some fields of a job"""
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            conn = self.get_connection()
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            conn.commit()
+
+    def claim(self, job_id: str) -> bool:
+        """Mark a queued job running in this process; returns False if another worker got to it first"""
+        now = time.time()
+        with self._lock:
+            conn = self.get_connection()
+            claimed = conn.execute(
+                "UPDATE jobs SET state = ?, chunks_done = 0, error = NULL, owner_pid = ?, heartbeat_at = ?, "
+                "updated_at = ? WHERE id = ? AND state = ?",
+                (JOB_RUNNING, os.getpid(), now, now, job_id, JOB_QUEUED)
+            ).rowcount == 1
+            conn.commit()
+        return claimed
+
+    def heartbeat(self, owner_pid: int):
+        """Record that a process is still running the jobs it claimed"""
+        with self._lock:
+            conn = self.get_connection()
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE state = ? AND owner_pid = ?",
+                (time.time(), JOB_RUNNING, owner_pid)
+            )
+            conn.commit()
+
+    def requeue_abandoned(self, is_alive: Callable[[int], bool], stale_after: float) -> List[str]:
+        """
+        Requeue the running jobs whose process is gone, and return their ids
+
+        A job is abandoned if it has no owner, if is_alive says its owner is
+        dead, or if its owner has not sent a heartbeat for stale_after
+        seconds, which also covers a PID reused by another process. Each job
+        is requeued only if it is unchanged since it was read, so of several
+        processes sweeping at once only one requeues it.
+        """
+        deadline = time.time() - stale_after
+        requeued = []
+        with self._lock:
+            conn = self.get_connection()
+            rows = conn.execute(
+                "SELECT id, owner_pid, heartbeat_at FROM jobs WHERE state = ? ORDER BY created_at", (JOB_RUNNING,)
+            ).fetchall()
+            for row in rows:
+                owner, heartbeat_at = row["owner_pid"], row["heartbeat_at"]
+                if owner is not None and heartbeat_at is not None and heartbeat_at >= deadline and is_alive(owner):
+                    continue
+                if conn.execute(
+                    "UPDATE jobs SET state = ?, chunks_done = 0, owner_pid = NULL, heartbeat_at = NULL, updated_at = ? "
+                    "WHERE id = ? AND state = ? AND owner_pid IS ? AND heartbeat_at IS ?",
+                    (JOB_QUEUED, time.time(), row["id"], JOB_RUNNING, owner, heartbeat_at)
+                ).rowcount == 1:
+                    requeued.append(row["id"])
+            conn.commit()
+        return requeued
+
+    def queued(self) -> List[str]:
+        """Ids of the queued jobs, oldest first"""
+        with self._lock:
+            rows = self.get_connection().execute(
+                "SELECT id FROM jobs WHERE state = ? ORDER BY created_at", (JOB_QUEUED,)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+# Create a singleton instance
+job_store = JobStore(settings.JOB_DB_PATH)
@@ -0,0 +1,227 @@
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Words, plus identifiers such as error codes and dotted names kept whole
+TOKEN_PATTERN = re.compile(r"\w+(?:[-.:/]\w+)*")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Compact posting lists once this many deleted documents have piled up
+MIN_COMPACT_DEAD = 1024
+
+# Yields (ids, documents) pages of a collection, used to build an index lazily
+DocumentLoader = Callable[[str], Iterable[Tuple[List[str], List[str]]]]
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into terms; compound identifiers are also indexed by their parts"""
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        term = match.group()
+        terms.append(term)
+        if not term.isalnum() and "_" not in term:
+            terms.extend(re.findall(r"\w+", term))
+    return terms
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], weights: Sequence[float],
+                           k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked id lists with weighted reciprocal rank fusion
+
+    Each id scores sum(weight / (k + rank)) over the rankings it appears in.
+
+    Returns:
+        (id, score) pairs, best first
+    """
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        if not weight:
+            continue
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class CollectionIndex:
+    """
+    BM25 inverted index of one collection
+
+    Documents get sequential row numbers; each term maps to two parallel
+    uint32 arrays of rows and term frequencies. Deleted rows are masked out
+    and purged from the posting lists once enough of them accumulate.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.lengths = array("I")
+        self.alive = bytearray()
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.total_length = 0
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+
+    @property
+    def count(self) -> int:
+        return len(self.rows)
+
+    def _remove_row(self, doc_id: str):
+        row = self.rows.pop(doc_id)
+        self.alive[row] = 0
+        self.total_length -= self.lengths[row]
+
+    def add(self, ids: List[str], documents: List[str]):
+        """Index documents, replacing any already indexed under the same id"""
+        tokenized = [Counter(tokenize(document)) for document in documents]
+        with self.lock:
+            for doc_id, counts in zip(ids, tokenized):
+                if doc_id in self.rows:
+                    self._remove_row(doc_id)
+                row = len(self.ids)
+                self.ids.append(doc_id)
+                self.rows[doc_id] = row
+                self.alive.append(1)
+                length = sum(counts.values())
+                self.lengths.append(length)
+                self.total_length += length
+                for term, frequency in counts.items():
+                    posting = self.postings.get(term)
+                    if posting is None:
+                        posting = self.postings[term] = (array("I"), array("I"))
+                    posting[0].append(row)
+                    posting[1].append(frequency)
+
+    def remove(self, ids: List[str]):
+        """Forget documents"""
+        with self.lock:
+            for doc_id in ids:
+                if doc_id in self.rows:
+                    self._remove_row(doc_id)
+            dead = len(self.ids) - len(self.rows)
+            if dead >= MIN_COMPACT_DEAD and dead > len(self.rows):
+                self._compact()
+
+    def _compact(self):
+        """Renumber the live rows and drop deleted rows from the posting lists"""
+        alive = np.frombuffer(bytes(self.alive), dtype=np.uint8).astype(bool)
+        new_rows = np.cumsum(alive, dtype=np.int64) - 1
+        postings = {}
+        for term, (rows, frequencies) in self.postings.items():
+            rows_np = np.array(rows, dtype=np.uint32)
+            keep = alive[rows_np]
+            if keep.any():
+                postings[term] = (
+                    array("I", new_rows[rows_np[keep]].astype(np.uint32).tobytes()),
+                    array("I", np.array(frequencies, dtype=np.uint32)[keep].tobytes())
+                )
+        self.postings = postings
+        self.ids = [doc_id for doc_id, flag in zip(self.ids, self.alive) if flag]
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.lengths = array("I", (length for length, flag in zip(self.lengths, self.alive) if flag))
+        self.alive = bytearray(b"\x01" * len(self.ids))
+
+    def search(self, query: str, n_results: int) -> List[Tuple[str, float]]:
+        """
+        Score documents against a query with BM25
+
+        Returns:
+            Up to `n_results` (id, score) pairs, best first
+        """
+        terms = set(tokenize(query))
+        with self.lock:
+            count = self.count
+            if not terms or count == 0:
+                return []
+            average_length = self.total_length / count or 1.0
+            matched_rows, matched_scores = [], []
+
+            # Only the rows in the query terms' posting lists are touched; the
+            # frombuffer views are temporaries so the arrays can still grow later
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                rows = np.frombuffer(posting[0], dtype=np.uint32).astype(np.int64)
+                live = np.frombuffer(self.alive, dtype=np.uint8)[rows].astype(bool)
+                rows = rows[live]
+                if not len(rows):
+                    continue
+                frequencies = np.frombuffer(posting[1], dtype=np.uint32)[live].astype(np.float32)
+                lengths = np.frombuffer(self.lengths, dtype=np.uint32)[rows].astype(np.float32)
+                df = len(rows)
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average_length)
+                matched_rows.append(rows)
+                matched_scores.append(idf * frequencies * (BM25_K1 + 1) / (frequencies + norms))
+
+            if not matched_rows:
+                return []
+            rows, inverse = np.unique(np.concatenate(matched_rows), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(matched_scores))
+            k = min(n_results, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.ids[rows[i]], float(scores[i])) for i in top]
+
+class LexicalIndex:
+    """
+    In-memory BM25 indexes kept alongside the vector store collections
+
+    A collection's index is built from the vector store the first time it is
+    searched, then kept up to date as documents are added and deleted.
+    """
+
+    def __init__(self, loader: Optional[DocumentLoader] = None):
+        self.loader = loader
+        self._indexes: Dict[str, CollectionIndex] = {}
+        self._lock = threading.Lock()
+
+    def get_index(self, collection_name: str) -> CollectionIndex:
+        """Get a collection's index, building it on first use"""
+        with self._lock:
+            index = self._indexes.get(collection_name)
+            building = index is None
+            if building:
+                index = self._indexes[collection_name] = CollectionIndex()
+
+        if building:
+            # Documents added while the build runs go straight into the new index
+            try:
+                if self.loader is not None:
+                    for ids, documents in self.loader(collection_name):
+                        index.add(ids, documents)
+            except Exception:
+                with self._lock:
+                    self._indexes.pop(collection_name, None)
+                raise
+            finally:
+                index.ready.set()
+        index.ready.wait()
+        return index
+
+    def add(self, collection_name: str, ids: List[str], documents: List[str]):
+        """Index new documents, if the collection's index has been built"""
+        index = self._indexes.get(collection_name)
+        if index is not None:
+            index.add(ids, documents)
+
+    def remove(self, collection_name: str, ids: List[str]):
+        """Remove documents from the collection's index, if it has been built"""
+        index = self._indexes.get(collection_name)
+        if index is not None:
+            index.remove(ids)
+
+    def search(self, collection_name: str, query: str, n_results: int) -> List[Tuple[str, float]]:
+        """Find the best BM25 matches for a query in a collection"""
+        return self.get_index(collection_name).search(query, n_results)
+
+    def drop(self, collection_name: str):
+        """Forget a collection's index"""
+        with self._lock:
+            self._indexes.pop(collection_name, None)
@@ -0,0 +1,72 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.core.config import settings
+
+class ManifestStore:
+    """
+    SQLite-backed manifest of the chunk ids ingested for each (collection, source)
+
+    Re-ingestion compares a document's new chunk ids against its manifest to
+    find the chunks that need embedding and the stale ones that need deleting.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Get the SQLite connection, creating the database on first use"""
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS chunks (
+                    collection_name TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    chunk_index INTEGER NOT NULL,
+                    PRIMARY KEY (collection_name, source, chunk_id)
+                )"""
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, collection_name: str, source: str) -> Dict[str, int]:
+        """Get the chunk ids of a source, mapped to their chunk index"""
+        with self._lock:
+            rows = self.get_connection().execute(
+                "SELECT chunk_id, chunk_index FROM chunks WHERE collection_name = ? AND source = ?",
+                (collection_name, source)
+            ).fetchall()
+        return {chunk_id: chunk_index for chunk_id, chunk_index in rows}
+
+    def add(self, collection_name: str, source: str, entries: Iterable[Tuple[str, int]]):
+        """Record (chunk id, chunk index) pairs for a source, replacing existing indexes"""
+        with self._lock:
+            conn = self.get_connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (collection_name, source, chunk_id, chunk_index) VALUES (?, ?, ?, ?)",
+                [(collection_name, source, chunk_id, chunk_index) for chunk_id, chunk_index in entries]
+            )
+            conn.commit()
+
+    def remove(self, collection_name: str, source: str, chunk_ids: List[str]):
+        """Forget some chunk ids of a source"""
+        with self._lock:
+            conn = self.get_connection()
+            conn.executemany(
+                "DELETE FROM chunks WHERE collection_name = ? AND source = ? AND chunk_id = ?",
+                [(collection_name, source, chunk_id) for chunk_id in chunk_ids]
+            )
+            conn.commit()
+
+# Create a singleton instance
+manifest_store = ManifestStore(settings.MANIFEST_DB_PATH)
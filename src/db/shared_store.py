@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Evict once every this many writes rather than on every write
+EVICT_EVERY = 64
+
+# Hits refresh an entry's last use once it is older than this share of the TTL,
+# so reads rarely take the write lock; LRU order is approximate to that extent
+TOUCH_FRACTION = 0.1
+
+class SharedStore:
+    """
+    SQLite-backed state shared by the worker processes of one host
+
+    Uvicorn workers are separate processes, so whatever a module singleton
+    caches is computed and held once per worker. What is kept here is visible
+    to every worker:
+
+    - byte values with a TTL, evicted least recently used once there are
+      more than max_entries of them;
+    - integer counters, used as collection generations so a write in one
+      worker invalidates the caches of the others;
+    - leases, so periodic work such as health probes runs in one worker at a
+      time.
+
+    The database is in WAL mode, so readers never wait for the writer. Cache
+    reads and writes are best effort: if the database is busy or broken they
+    miss rather than fail the request. Counters fall back to this process's
+    last known value plus the increments it could not write, which are
+    written with its next successful increment.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 100000, ttl: float = 3600, timeout: float = 5):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.timeout = timeout
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0}
+        # Last value read of each shared counter, and increments not written yet
+        self._known: Dict[Tuple[str, str], int] = {}
+        self._unwritten: Dict[Tuple[str, str], int] = {}
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Get this process's SQLite connection, creating the database on first use"""
+        # A connection must not be used by a forked child, open a new one there
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (accessed_at)")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS counters (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value INTEGER NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    holder INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                )"""
+            )
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _error(self, operation: str, error: Exception):
+        self._counters["errors"] += 1
+        logger.warning(f"Shared store {operation} failed: {error}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Get a value, or None if it is missing or expired"""
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self.get_connection()
+                row = conn.execute("SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None or row[1] <= now:
+                    self._counters["misses"] += 1
+                    return None
+                if now - row[2] > self.ttl * TOUCH_FRACTION:
+                    conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                self._counters["hits"] += 1
+                return row[0]
+            except sqlite3.Error as e:
+                self._error("read", e)
+                return None
+
+    def put(self, key: str, value: bytes, ttl: Optional[float] = None):
+        """Store a value, evicting expired and least recently used entries now and then"""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            try:
+                conn = self.get_connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, sqlite3.Binary(value), expires_at, now)
+                )
+                self._writes += 1
+                self._counters["writes"] += 1
+                if self._writes % EVICT_EVERY == 0:
+                    self._evict(conn, now)
+                conn.commit()
+            except sqlite3.Error as e:
+                self._error("write", e)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        evicted = conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+        (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        if count > self.max_entries:
+            evicted += conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            ).rowcount
+        self._counters["evictions"] += evicted
+
+    def get_json(self, key: str) -> Any:
+        """Get a JSON value, or None"""
+        value = self.get(key)
+        return None if value is None else json.loads(value)
+
+    def put_json(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a JSON-serializable value"""
+        self.put(key, json.dumps(value, default=str).encode("utf-8"), ttl)
+
+    def counter(self, namespace: str, key: str) -> int:
+        """Current value of a counter, 0 if it was never incremented"""
+        with self._lock:
+            try:
+                row = self.get_connection().execute(
+                    "SELECT value FROM counters WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                self._known[(namespace, key)] = row[0] if row else 0
+            except sqlite3.Error as e:
+                self._error("counter read", e)
+            return self._known.get((namespace, key), 0) + self._unwritten.get((namespace, key), 0)
+
+    def incr(self, namespace: str, key: str) -> int:
+        """Increment a counter and return its new value"""
+        with self._lock:
+            increment = self._unwritten.get((namespace, key), 0) + 1
+            try:
+                conn = self.get_connection()
+                # The write lock is held until the commit, so the value read back is our own
+                conn.execute(
+                    "INSERT INTO counters (namespace, key, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET value = value + excluded.value",
+                    (namespace, key, increment)
+                )
+                (value,) = conn.execute(
+                    "SELECT value FROM counters WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                conn.commit()
+            except sqlite3.Error as e:
+                self._error("counter write", e)
+                self._rollback()
+                self._unwritten[(namespace, key)] = increment
+                return self._known.get((namespace, key), 0) + increment
+            self._unwritten.pop((namespace, key), None)
+            self._known[(namespace, key)] = value
+            return value
+
+    def _rollback(self):
+        try:
+            if self._conn is not None:
+                self._conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    def claim(self, name: str, ttl: float) -> bool:
+        """
+        Take or renew a lease for ttl seconds
+
+        Returns whether this process holds the lease, which it keeps by
+        claiming it again before it expires. If the database cannot be
+        reached, every process is told it holds the lease, so the work is
+        done more than once rather than not at all.
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self.get_connection()
+                claimed = conn.execute(
+                    "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                    "WHERE leases.expires_at <= ? OR leases.holder = excluded.holder",
+                    (name, os.getpid(), now + ttl, now)
+                ).rowcount == 1
+                conn.commit()
+                return claimed
+            except sqlite3.Error as e:
+                self._error("lease", e)
+                return True
+
+    def clear(self):
+        """Drop every cached value; counters and leases are kept"""
+        with self._lock:
+            conn = self.get_connection()
+            conn.execute("DELETE FROM entries")
+            conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """This process's hit/miss counters and the number of shared entries"""
+        with self._lock:
+            try:
+                (entries,) = self.get_connection().execute("SELECT COUNT(*) FROM entries").fetchone()
+            except sqlite3.Error:
+                entries = None
+            return {**self._counters, "entries": entries, "max_entries": self.max_entries, "pid": os.getpid()}
+
+# Create a singleton instance, or None when a single process serves the API
+shared_store = (
+    SharedStore(settings.SHARED_STATE_DB_PATH, settings.SHARED_CACHE_MAX_ENTRIES, settings.SHARED_CACHE_TTL)
+    if settings.SHARED_STATE_ENABLED else None
+)
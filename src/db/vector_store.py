@@ -0,0 +1,112 @@
+from typing import Any, Dict, List, Optional
+
+# Comparison operators of Chroma's metadata filters
+WHERE_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+def matches_where(metadata: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """Whether metadata passes a filter in Chroma's `where` syntax, for backends that filter themselves"""
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator not in WHERE_OPERATORS:
+                    raise ValueError(f"Unsupported filter operator '{operator}'")
+                if not WHERE_OPERATORS[operator](metadata.get(key), operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+class VectorStore:
+    """
+    Interface of the vector store backends behind ChromaDBClient
+
+    Query results use Chroma's layout: a dict of "ids", "documents",
+    "metadatas" and "distances", each holding one list per query.
+    """
+
+    # Whether documents must be added with precomputed embeddings
+    requires_embeddings = False
+
+    # Circuit breaker of a backend reached over the network
+    breaker = None
+
+    @property
+    def is_connected(self) -> bool:
+        raise NotImplementedError
+
+    def connect(self) -> bool:
+        """Connect to the backend, returning whether it succeeded"""
+        raise NotImplementedError
+
+    def ping(self):
+        """Raise if the backend does not answer; in-process backends always do"""
+
+    def list_collections(self) -> List[str]:
+        """List all collections"""
+        raise NotImplementedError
+
+    def create_collection(self, name: str):
+        """Create a new collection, failing if it already exists"""
+        raise NotImplementedError
+
+    def get_or_create_collection(self, name: str):
+        """Get or create a collection"""
+        raise NotImplementedError
+
+    def add(self, collection_name: str, ids: List[str], documents: List[str],
+            metadatas: List[Dict[str, Any]], embeddings: Optional[List[List[float]]] = None):
+        """Add documents to a collection, creating it if needed"""
+        raise NotImplementedError
+
+    def update_metadatas(self, collection_name: str, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replace the metadata of existing documents"""
+        raise NotImplementedError
+
+    def delete(self, collection_name: str, ids: List[str]):
+        """Delete documents from a collection"""
+        raise NotImplementedError
+
+    def get(self, collection_name: str, ids: Optional[List[str]] = None, offset: int = 0,
+            limit: Optional[int] = None, include_embeddings: bool = False) -> Dict[str, Any]:
+        """
+        Get documents by id, or a page of all documents
+
+        Returns flat "ids", "documents" and "metadatas" lists, plus an (n, dim)
+        float32 "embeddings" array if include_embeddings is set.
+        """
+        raise NotImplementedError
+
+    def query(self, collection_name: str, query_embeddings: Optional[List[List[float]]] = None,
+              query_texts: Optional[List[str]] = None, n_results: int = 3,
+              where: Optional[Dict[str, Any]] = None) -> Dict[str, List[List[Any]]]:
+        """Find the nearest documents to each query among those whose metadata matches `where`"""
+        raise NotImplementedError
+
+def create_vector_store(backend: str) -> VectorStore:
+    """Create the vector store for a backend name"""
+    if backend == "chroma":
+        from src.db.chroma_store import ChromaVectorStore
+        return ChromaVectorStore()
+    if backend == "embedded":
+        from src.db.embedded_store import EmbeddedVectorStore
+        from src.core.config import settings
+        return EmbeddedVectorStore(settings.VECTOR_STORE_DIR)
+    raise ValueError(f"Unsupported vector backend '{backend}', expected 'chroma' or 'embedded'")
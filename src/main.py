@@ -1,13 +1,26 @@
 import os
 import logging
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 
+from src.core import metrics, tracing
 from src.core.config import settings
+from src.core.resilience import BackendUnavailable, health_prober
+from src.core.startup import warmup
 from src.api.routes import router
 from src.db.chroma_client import chroma_client
+from src.db.shared_store import shared_store
 from src.services.ollama_service import ollama_service
+from src.services.ingestion_service import bulk_ingestion_service
+from src.services.job_service import job_service
+from src.services.embedding_service import embedding_service
+from src.services.rerank_service import rerank_service
+from src.services.cache_service import answer_cache
+from src.services.model_registry import model_registry
+from src.services.scheduler import SchedulerRejected, llm_scheduler
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -27,27 +40,69 @@ app.add_middleware(
     allow_headers=settings.CORS_HEADERS,
 )
 
+# Count and time every request
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Trace and profile the requests that ask for it
+app.add_middleware(tracing.TracingMiddleware)
+
+# Export the counters the services keep on /metrics
+metrics.register_collector(metrics.ServiceStatsCollector(
+    scheduler_stats=llm_scheduler.stats,
+    model_stats=model_registry.stats,
+    cache_stats=answer_cache.stats,
+    embedding_stats=embedding_service.stats,
+    circuit_stats=lambda: {
+        name: breaker.stats()
+        for name, breaker in (("chroma", chroma_client.breaker), ("ollama", ollama_service.breaker))
+        if breaker is not None
+    }
+))
+
+# Label metrics only with existing collections and configured models;
+# the collection names are reloaded after healthy Chroma probes
+metrics.register_label_values(collections=chroma_client.list_collections, models=model_registry.preloaded)
+
+# Keep /health current without calling the backends on the request path,
+# probing from one worker at a time when they share state
+health_prober.shared = shared_store
+health_prober.register("chroma", lambda: run_in_threadpool(chroma_client.ping), chroma_client.breaker,
+                       on_healthy=metrics.refresh_collection_names)
+health_prober.register("ollama", ollama_service.ping, ollama_service.breaker)
+
 # Include API router
 app.include_router(router, prefix=settings.API_PREFIX)
 
+@app.exception_handler(SchedulerRejected)
+async def scheduler_rejected_handler(request: Request, exc: SchedulerRejected):
+    """Shed overload with a 429 telling the client when to retry"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(BackendUnavailable)
+async def backend_unavailable_handler(request: Request, exc: BackendUnavailable):
+    """Fail fast with a 503 while a backend's circuit is open"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize connections on startup"""
+    """Start the background work; connecting to the backends and loading models is left to the warm-up"""
     logger.info("Starting application initialization")
     
-    # Initialize database connection
-    try:
-        chroma_client.connect()
-        logger.info("Successfully connected to ChromaDB")
-    except Exception as e:
-        logger.error(f"Failed to connect to ChromaDB: {e}")
-    
-    # Initialize LLM
-    try:
-        ollama_service.connect()
-        logger.info(f"Successfully connected to Ollama using model: {ollama_service.model_name}")
-    except Exception as e:
-        logger.error(f"Failed to connect to Ollama: {e}")
+    # The embedded store holds collections in memory and appends to their files, one process at a time
+    if settings.WORKERS > 1 and settings.VECTOR_BACKEND == "embedded":
+        raise RuntimeError("The embedded vector store cannot be served by several workers; "
+                           "use VECTOR_BACKEND=chroma or WORKERS=1")
+    if settings.WORKERS > 1 and not settings.SHARED_STATE_ENABLED:
+        logger.warning(f"Serving with {settings.WORKERS} workers without shared state: "
+                       "caches, invalidations and health are kept per worker")
     
     # Create upload directory if it doesn't exist
     try:
@@ -56,12 +111,44 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Failed to create uploads directory: {e}")
     
+    # Start the ingestion job workers, resuming any unfinished jobs
+    try:
+        job_service.start()
+        logger.info(f"Started {settings.JOB_WORKERS} ingestion job workers")
+    except Exception as e:
+        logger.error(f"Failed to start ingestion job workers: {e}")
+    
+    # Connect to the backends and load the models in the background, so the
+    # server answers /health/live at once and /health/ready once it is warm.
+    # Whatever fails here is set up on first use instead.
+    sequences = [
+        [("chroma_connect", lambda: run_in_threadpool(chroma_client.connect))],
+        [
+            ("ollama_connect", ollama_service.connect),
+            # Load the configured models so the first requests don't pay for it
+            ("ollama_preload", ollama_service.preload_models),
+        ],
+    ]
+    if settings.EMBEDDING_ENABLED:
+        sequences.append([("embedding_load", lambda: run_in_threadpool(embedding_service.load))])
+    if settings.RERANK_ENABLED:
+        sequences.append([("rerank_load", lambda: run_in_threadpool(rerank_service.load))])
+    warmup.start(sequences)
+    
+    # Probe the backends in the background from now on
+    health_prober.start()
+    
     logger.info("Application startup complete")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on shutdown"""
     logger.info("Shutting down application")
+    await warmup.stop()
+    await health_prober.stop()
+    await ollama_service.close()
+    bulk_ingestion_service.shutdown()
+    job_service.stop(wait=False)
 
 @app.get("/")
 async def root():
@@ -70,23 +157,48 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """Health check endpoint"""
+    """Health check endpoint, answered from the latest background probes"""
+    probes = health_prober.status()
     health_status = {
         "status": "healthy",
         "services": {
-            "chroma": chroma_client.client is not None,
-            "ollama": ollama_service.is_connected
-        }
+            "chroma": probes["chroma"]["healthy"] if "chroma" in probes else chroma_client.is_connected,
+            "ollama": probes["ollama"]["healthy"] if "ollama" in probes else ollama_service.is_connected
+        },
+        "probes": probes
     }
     
     # If any service is down, return unhealthy status
     if not all(health_status["services"].values()):
         health_status["status"] = "unhealthy"
         logger.warning(f"Health check failed: {health_status}")
-        return health_status, 503
+        return JSONResponse(status_code=503, content=health_status)
     
     logger.debug("Health check passed")
     return health_status
 
+@app.get("/health/live")
+async def health_live():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness: the warm-up has finished and every backend passed its latest probe"""
+    probes = health_prober.status()
+    ready = warmup.done and bool(probes) and all(probe["healthy"] for probe in probes.values())
+    content = {"status": "ready" if ready else "not_ready", "warmup": warmup.status(), "probes": probes}
+    if not ready:
+        return JSONResponse(status_code=503, content=content)
+    return content
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus metrics endpoint"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
-    uvicorn.run("src.main:app", host="0.0.0.0", port=8081, reload=True) 
\ No newline at end of file
+    if settings.WORKERS > 1:
+        uvicorn.run("src.main:app", host="0.0.0.0", port=8081, workers=settings.WORKERS)
+    else:
+        uvicorn.run("src.main:app", host="0.0.0.0", port=8081, reload=True) 
\ No newline at end of file
@@ -1,3 +1,8 @@
+from src.services.cache_service import answer_cache
 from src.services.ollama_service import ollama_service
 from src.services.langgraph_service import langgraph_service
-from src.services.file_service import file_service 
\ No newline at end of file
+from src.services.file_service import file_service
+from src.services.model_registry import model_registry
+from src.services.prompt_service import prompt_builder
+from src.services.rerank_service import rerank_service
+from src.services.session_service import session_store
@@ -0,0 +1,225 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.config import settings
+from src.db.shared_store import SharedStore, shared_store
+
+# Trailing punctuation that doesn't change the meaning of a question
+TRAILING_PUNCTUATION = "?!. "
+
+class CacheEntry:
+    """A cached answer plus the bookkeeping needed for TTL, LRU and semantic lookups"""
+    __slots__ = ("value", "embedding", "size", "expires_at", "generation")
+
+    def __init__(self, value: Dict[str, Any], embedding: Optional[np.ndarray], size: int, expires_at: float,
+                 generation: int = 0):
+        self.value = value
+        self.embedding = embedding
+        self.size = size
+        self.expires_at = expires_at
+        self.generation = generation
+
+class AnswerCache:
+    """
+    LRU + TTL cache of agent answers keyed on (collection, model, options, normalized query)
+
+    When the semantic tier is enabled, a miss on the exact key falls back to the
+    closest cached query for the same collection, model and options, and reuses its answer
+    if the cosine distance between the two query embeddings is within
+    `semantic_max_distance`.
+
+    With a shared store, collection generations live there, so invalidating
+    a collection in one worker process also retires the answers the other
+    workers cached for it.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 3600, semantic: bool = False, semantic_max_distance: float = 0.05,
+                 embed_fn: Optional[Callable[[str], List[float]]] = None,
+                 shared: Optional[SharedStore] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.semantic = semantic
+        self.semantic_max_distance = semantic_max_distance
+        self._embed_fn = embed_fn
+        self.shared = shared
+        self._entries: "OrderedDict[Tuple[str, str, str], CacheEntry]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Normalize a query so trivially different phrasings share a key"""
+        return re.sub(r"\s+", " ", query).strip().rstrip(TRAILING_PUNCTUATION).lower()
+
+    def generation(self, collection_name: str) -> int:
+        """Current generation of a collection, bumped every time it is invalidated"""
+        if self.shared is not None:
+            # Clearing the cache bumps the generation of every collection
+            return self.shared.counter("answer_generation", collection_name) + self.shared.counter("answer_generation", "")
+        with self._lock:
+            return self._generations.get(collection_name, 0)
+
+    def _embed(self, normalized_query: str) -> Optional[np.ndarray]:
+        """Embed a normalized query as a unit-length float32 vector"""
+        if self._embed_fn is None:
+            from src.services.embedding_service import embedding_service
+            self._embed_fn = embedding_service.embed_query
+        vector = np.asarray(self._embed_fn(normalized_query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, key: Tuple[str, str, str, str]):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get(self, collection_name: str, model_name: str, query: str, options: str = "") -> Optional[Dict[str, Any]]:
+        """Look up a cached answer, first by exact key and then semantically"""
+        normalized = self.normalize_query(query)
+        key = (collection_name, model_name, options, normalized)
+        now = time.monotonic()
+        generation = self.generation(collection_name)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now and entry.generation == generation:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return entry.value
+                # Expired, or the collection was invalidated by another worker
+                self._remove(key)
+                if entry.expires_at <= now:
+                    self._counters["expirations"] += 1
+
+            if not self.semantic:
+                self._counters["misses"] += 1
+                return None
+
+        # Embedding happens outside the lock, it is by far the slowest step
+        try:
+            embedding = self._embed(normalized)
+        except Exception as e:
+            print(f"Warning: Could not embed query for the semantic cache: {e}")
+            with self._lock:
+                self._counters["misses"] += 1
+            return None
+
+        with self._lock:
+            best_key, best_distance = None, None
+            for other_key, other in self._entries.items():
+                if (other_key[:3] != key[:3] or other.embedding is None or other.expires_at <= now
+                        or other.generation != generation):
+                    continue
+                distance = 1.0 - float(np.dot(embedding, other.embedding))
+                if best_distance is None or distance < best_distance:
+                    best_key, best_distance = other_key, distance
+
+            if best_key is not None and best_distance <= self.semantic_max_distance:
+                self._entries.move_to_end(best_key)
+                self._counters["semantic_hits"] += 1
+                return self._entries[best_key].value
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, collection_name: str, model_name: str, query: str, value: Dict[str, Any],
+            generation: Optional[int] = None, options: str = ""):
+        """
+        Cache an answer
+
+        If `generation` is given and the collection has been invalidated since
+        it was read, the answer may be stale and is not cached. `options` holds
+        any other request parameters the answer depends on.
+        """
+        normalized = self.normalize_query(query)
+        key = (collection_name, model_name, options, normalized)
+
+        embedding = None
+        if self.semantic:
+            try:
+                embedding = self._embed(normalized)
+            except Exception as e:
+                print(f"Warning: Could not embed query for the semantic cache: {e}")
+
+        size = len(json.dumps(value, default=str)) + len(normalized)
+        if embedding is not None:
+            size += embedding.nbytes
+        if size > self.max_bytes:
+            return
+
+        current = self.generation(collection_name)
+        with self._lock:
+            if generation is not None and generation != current:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CacheEntry(value, embedding, size, time.monotonic() + self.ttl, current)
+            self._bytes += size
+
+            # Evict least recently used entries until both budgets are met
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._counters["evictions"] += 1
+
+    def invalidate(self, collection_name: str):
+        """Drop every cached answer for a collection"""
+        if self.shared is not None:
+            self.shared.incr("answer_generation", collection_name)
+        with self._lock:
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            for key in [key for key in self._entries if key[0] == collection_name]:
+                self._remove(key)
+            self._counters["invalidations"] += 1
+
+    def clear(self):
+        """Drop every cached answer"""
+        if self.shared is not None:
+            self.shared.incr("answer_generation", "")
+        with self._lock:
+            for collection_name in {key[0] for key in self._entries}:
+                self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size of the cache"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["semantic_hits"] + self._counters["misses"]
+            hits = self._counters["hits"] + self._counters["semantic_hits"]
+            return {
+                **self._counters,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "semantic": self.semantic,
+            }
+
+# Create a singleton instance
+answer_cache = AnswerCache(
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    max_bytes=settings.ANSWER_CACHE_MAX_BYTES,
+    ttl=settings.ANSWER_CACHE_TTL,
+    semantic=settings.ANSWER_CACHE_SEMANTIC,
+    semantic_max_distance=settings.ANSWER_CACHE_SEMANTIC_MAX_DISTANCE,
+    shared=shared_store
+)
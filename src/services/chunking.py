@@ -0,0 +1,176 @@
+import codecs
+import io
+import re
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+# Bytes read from an upload at a time
+READ_BLOCK_SIZE = 64 * 1024
+
+# Size units accepted by the chunker
+SIZE_UNITS = ("chars", "tokens")
+
+# Approximates an LLM tokenizer: words and individual punctuation marks
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+PARAGRAPH_SEPARATOR = "\n\n"
+
+class CharSizer:
+    """Measures text in characters"""
+
+    separator_length = len(PARAGRAPH_SEPARATOR)
+
+    def length(self, text: str) -> int:
+        return len(text)
+
+    def prefix_end(self, text: str, size: int) -> int:
+        """Offset at which the first `size` units of `text` end"""
+        return min(size, len(text))
+
+    def tail(self, text: str, size: int) -> str:
+        """The last `size` units of `text`"""
+        return text[-size:] if size else ""
+
+class TokenSizer:
+    """Measures text in approximate tokens"""
+
+    separator_length = 0
+
+    def length(self, text: str) -> int:
+        return sum(1 for _ in TOKEN_PATTERN.finditer(text))
+
+    def prefix_end(self, text: str, size: int) -> int:
+        end = 0
+        for count, match in enumerate(TOKEN_PATTERN.finditer(text), start=1):
+            end = match.end()
+            if count == size:
+                return end
+        return len(text)
+
+    def tail(self, text: str, size: int) -> str:
+        if not size:
+            return ""
+        starts = [match.start() for match in TOKEN_PATTERN.finditer(text)]
+        return text[starts[-size]:] if len(starts) >= size else text
+
+def get_sizer(size_unit: str):
+    """Get the sizer for a size unit"""
+    if size_unit == "chars":
+        return CharSizer()
+    if size_unit == "tokens":
+        return TokenSizer()
+    raise ValueError(f"Unsupported size unit '{size_unit}', expected one of {SIZE_UNITS}")
+
+def check_chunking(chunk_size: int, chunk_overlap: int, size_unit: str):
+    """
+    Get the sizer for chunking with these parameters
+
+    Raises:
+        ValueError: If the parameters are invalid
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if chunk_overlap < 0 or chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be at least 0 and smaller than chunk_size")
+    return get_sizer(size_unit)
+
+def iter_text_blocks(stream: BinaryIO, tee: Optional[BinaryIO] = None,
+                     block_size: int = READ_BLOCK_SIZE) -> Iterator[str]:
+    """
+    Incrementally decode a UTF-8 byte stream into text blocks
+
+    Line endings are normalized to "\\n". If `tee` is given, every byte read is
+    also written to it, so an upload can be kept on disk while it is chunked.
+    """
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder("utf-8")(), translate=True)
+    while True:
+        data = stream.read(block_size)
+        if tee is not None and data:
+            tee.write(data)
+        text = decoder.decode(data or b"", final=not data)
+        if text:
+            yield text
+        if not data:
+            return
+
+def _split_point(text: str, end: int) -> int:
+    """Move a cut back to the last whitespace before `end`, if there is one in its second half"""
+    if end >= len(text):
+        return end
+    cut = max(text.rfind(" ", 0, end), text.rfind("\n", 0, end))
+    return cut + 1 if cut > end // 2 else end
+
+def iter_paragraphs(blocks: Iterable[str], max_chars: int = READ_BLOCK_SIZE) -> Iterator[str]:
+    """
+    Split a stream of text blocks into paragraphs
+
+    A paragraph longer than `max_chars` is yielded in pieces, so memory stays
+    bounded even for input without any blank lines.
+    """
+    buffer = ""
+    for block in blocks:
+        buffer += block
+        parts = buffer.split(PARAGRAPH_SEPARATOR)
+        buffer = parts.pop()
+        yield from parts
+        while len(buffer) > max_chars:
+            cut = _split_point(buffer, max_chars)
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
+def iter_chunks(blocks: Iterable[str], chunk_size: int = 1000, chunk_overlap: int = 0,
+                size_unit: str = "chars") -> Iterator[str]:
+    """
+    Chunk a stream of text blocks, yielding each chunk as soon as it is complete
+
+    Paragraphs are packed into chunks of at most `chunk_size` units; a paragraph
+    that is larger on its own is split, preferably on whitespace. Each chunk
+    after the first starts with the last `chunk_overlap` units of the previous one.
+    """
+    sizer = check_chunking(chunk_size, chunk_overlap, size_unit)
+
+    parts: List[str] = []
+    length = 0
+    has_content = False
+
+    def flush() -> str:
+        nonlocal parts, length, has_content
+        chunk = PARAGRAPH_SEPARATOR.join(parts).strip()
+        overlap = sizer.tail(chunk, chunk_overlap).lstrip() if chunk_overlap else ""
+        parts = [overlap] if overlap else []
+        length = sizer.length(overlap) if overlap else 0
+        has_content = False
+        return chunk
+
+    for paragraph in iter_paragraphs(blocks):
+        if not paragraph.strip():
+            continue
+        paragraph_length = sizer.length(paragraph)
+
+        # Split paragraphs that can't fit in a chunk, leaving room for the overlap
+        pieces = [(paragraph, paragraph_length)]
+        if paragraph_length > chunk_size:
+            pieces = []
+            piece_size = max(1, chunk_size - chunk_overlap - (sizer.separator_length if chunk_overlap else 0))
+            rest = paragraph
+            while rest:
+                cut = _split_point(rest, sizer.prefix_end(rest, piece_size))
+                piece, rest = rest[:cut], rest[cut:]
+                if piece.strip():
+                    pieces.append((piece, sizer.length(piece)))
+
+        for piece, piece_length in pieces:
+            # If adding this piece would exceed chunk size, save current chunk and start a new one
+            if has_content and length + sizer.separator_length + piece_length > chunk_size:
+                yield flush()
+            if parts:
+                length += sizer.separator_length
+            parts.append(piece)
+            length += piece_length
+            has_content = True
+
+    if has_content:
+        chunk = flush()
+        if chunk:
+            yield chunk
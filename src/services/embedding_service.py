@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import logging
+import queue
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.config import settings
+from src.db.lexical_index import tokenize
+from src.db.shared_store import SharedStore, shared_store
+
+logger = logging.getLogger(__name__)
+
+# Embedding backends; "chroma" is the ONNX MiniLM model Chroma uses by default,
+# "hash" is a model-free encoder for tests and benchmarks
+EMBEDDING_BACKENDS = ("sentence-transformers", "chroma", "hash")
+
+# Dimension of the "hash" backend's vectors, the same as MiniLM's
+HASH_EMBEDDING_DIM = 384
+
+Encoder = Callable[[List[str]], np.ndarray]
+
+def hash_encoder(dim: int = HASH_EMBEDDING_DIM) -> Encoder:
+    """
+    Feature-hashing encoder that needs no model download
+
+    Each term adds +1 or -1 to a bucket chosen by its hash, so texts that
+    share terms get similar vectors. Retrieval quality is far below a real
+    model; it exists so ingestion and retrieval can run offline.
+    """
+    def encode(texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                digest = zlib.crc32(term.encode("utf-8"))
+                vectors[row, digest % dim] += 1.0 if digest & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+    return encode
+
+class EmbeddingService:
+    """
+    Computes embeddings for ingestion and retrieval
+
+    The model is loaded once. Concurrent embed requests that arrive within a
+    small time window are merged into one batch, batches run on a dedicated
+    thread pool, and query embeddings are kept in an LRU cache keyed by a hash
+    of the text. With a shared store, that cache is backed by one shared with
+    the other worker processes, so a query is embedded once per host rather
+    than once per worker.
+    """
+
+    def __init__(self, backend: str = "sentence-transformers", model_name: str = "all-MiniLM-L6-v2",
+                 batch_window_ms: float = 5, max_batch_size: int = 64, threads: int = 2,
+                 cache_size: int = 4096, encoder: Optional[Encoder] = None,
+                 shared: Optional[SharedStore] = None):
+        self.backend = backend
+        self.model_name = model_name
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.threads = threads
+        self.cache_size = cache_size
+        self._encoder = encoder
+        self.shared = shared
+        self._load_lock = threading.Lock()
+        self._requests: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._batcher: Optional[threading.Thread] = None
+        self._cache: "OrderedDict[bytes, List[float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._counters = {"cache_hits": 0, "shared_cache_hits": 0, "cache_misses": 0, "batches": 0, "texts": 0}
+
+    def _load_encoder(self) -> Encoder:
+        if self.backend == "sentence-transformers":
+            try:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(self.model_name, device="cpu")
+                return lambda texts: model.encode(
+                    texts,
+                    batch_size=self.max_batch_size,
+                    normalize_embeddings=True,
+                    convert_to_numpy=True
+                )
+            except ImportError:
+                logger.warning("sentence-transformers is not installed, falling back to Chroma's default embedding model")
+        elif self.backend == "hash":
+            return hash_encoder()
+        elif self.backend != "chroma":
+            raise ValueError(f"Unsupported embedding backend '{self.backend}', expected one of {EMBEDDING_BACKENDS}")
+
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+        embedding_function = DefaultEmbeddingFunction()
+        return lambda texts: np.asarray(embedding_function(texts), dtype=np.float32)
+
+    def load(self):
+        """Load the model, warm it up and start the batcher; safe to call more than once"""
+        with self._load_lock:
+            if self._batcher is not None:
+                return
+            started = time.perf_counter()
+            if self._encoder is None:
+                self._encoder = self._load_encoder()
+            # The first call allocates the inference buffers, keep it off the request path
+            self._encoder(["warm up"])
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="embedding")
+            self._batcher = threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True)
+            self._batcher.start()
+            logger.info(f"Loaded embedding model {self.model_name} in {time.perf_counter() - started:.2f}s")
+
+    def _batch_loop(self):
+        while True:
+            requests = [self._requests.get()]
+            size = len(requests[0][0])
+            deadline = time.monotonic() + self.batch_window
+            # Collect whatever else arrives within the window
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                size += len(request[0])
+            self._executor.submit(self._run_batch, requests)
+
+    def _run_batch(self, requests: List[Tuple[List[str], Future]]):
+        texts = [text for request_texts, _ in requests for text in request_texts]
+        try:
+            vectors = np.asarray(self._encoder(texts), dtype=np.float32)
+        except Exception as e:
+            for _, future in requests:
+                future.set_exception(e)
+            return
+        with self._cache_lock:
+            self._counters["batches"] += 1
+            self._counters["texts"] += len(texts)
+        offset = 0
+        for request_texts, future in requests:
+            future.set_result(vectors[offset:offset + len(request_texts)].tolist())
+            offset += len(request_texts)
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue texts for embedding and return a future of their vectors"""
+        self.load()
+        future: Future = Future()
+        if not texts:
+            future.set_result([])
+        else:
+            self._requests.put((list(texts), future))
+        return future
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents for ingestion"""
+        return self.submit(texts).result()
+
+    @staticmethod
+    def _cache_key(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def _shared_key(self, key: bytes) -> str:
+        # Vectors of different models must not be mixed up
+        return f"embedding:{self.backend}:{self.model_name}:{key.hex()}"
+
+    def _cache_get(self, key: bytes) -> Optional[List[float]]:
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self._counters["cache_hits"] += 1
+                return vector
+        if self.shared is not None:
+            value = self.shared.get(self._shared_key(key))
+            if value is not None:
+                vector = np.frombuffer(value, dtype=np.float32).tolist()
+                self._cache_put(key, vector, share=False)
+                with self._cache_lock:
+                    self._counters["shared_cache_hits"] += 1
+                return vector
+        with self._cache_lock:
+            self._counters["cache_misses"] += 1
+        return None
+
+    def _cache_put(self, key: bytes, vector: List[float], share: bool = True):
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        if share and self.shared is not None:
+            self.shared.put(self._shared_key(key), np.asarray(vector, dtype=np.float32).tobytes())
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, using the query embedding cache"""
+        key = self._cache_key(text)
+        vector = self._cache_get(key)
+        if vector is None:
+            vector = self.submit([text]).result()[0]
+            self._cache_put(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries, computing all cache misses as one batch"""
+        keys = [self._cache_key(text) for text in texts]
+        vectors = [self._cache_get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self.submit([texts[i] for i in missing]).result()
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+                self._cache_put(keys[i], vector)
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embed a query without blocking the event loop"""
+        key = self._cache_key(text)
+        vector = self._cache_get(key)
+        if vector is None:
+            if self._batcher is None:
+                await asyncio.to_thread(self.load)
+            vector = (await asyncio.wrap_future(self.submit([text])))[0]
+            self._cache_put(key, vector)
+        return vector
+
+    def stats(self):
+        """Batching and cache counters"""
+        with self._cache_lock:
+            return {**self._counters, "cache_entries": len(self._cache), "loaded": self._batcher is not None}
+
+# Create a singleton instance
+embedding_service = EmbeddingService(
+    backend=settings.EMBEDDING_BACKEND,
+    model_name=settings.EMBEDDING_MODEL,
+    batch_window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+    max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+    threads=settings.EMBEDDING_THREADS,
+    cache_size=settings.EMBEDDING_CACHE_SIZE,
+    shared=shared_store
+)
@@ -1,106 +1,250 @@
+import hashlib
 import os
-import shutil
-import uuid
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, BinaryIO, Tuple
 from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from src.core import metrics
 from src.core.config import settings
 from src.db.chroma_client import chroma_client
+from src.db.manifest_store import manifest_store
+from src.services.cache_service import answer_cache
+from src.services.chunking import iter_chunks, iter_text_blocks
+
+# File types that can be ingested
+SUPPORTED_EXTENSIONS = (".txt", ".md")
+
+# How a chunk compares with the source's manifest
+CHUNK_NEW = "new"
+CHUNK_MOVED = "moved"
+CHUNK_UNCHANGED = "unchanged"
+
+def make_chunk_id(source: str, content: str, occurrence: int = 0) -> str:
+    """
+    Deterministic chunk id derived from the chunk's content hash
+
+    `occurrence` distinguishes repeats of the same content within one source.
+    """
+    digest = hashlib.sha256()
+    digest.update(source.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(str(occurrence).encode("ascii"))
+    digest.update(b"\0")
+    digest.update(content.encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+class SourceDiff:
+    """Compares the chunks of a new version of a source with the source's manifest"""
+    
+    def __init__(self, collection_name: str, source: str):
+        self.source = source
+        self.existing = manifest_store.get(collection_name, source)
+        self.seen: Dict[str, int] = {}
+        self.moved = 0
+        self._occurrences: Dict[str, int] = {}
+    
+    def classify(self, chunk: str, index: int) -> Tuple[str, str]:
+        """Get a chunk's id and whether it is new, moved or unchanged"""
+        content_hash = hashlib.sha256(chunk.encode("utf-8")).digest()
+        occurrence = self._occurrences.get(content_hash, 0)
+        self._occurrences[content_hash] = occurrence + 1
+        
+        chunk_id = make_chunk_id(self.source, chunk, occurrence)
+        self.seen[chunk_id] = index
+        if chunk_id not in self.existing:
+            return chunk_id, CHUNK_NEW
+        if self.existing[chunk_id] != index:
+            self.moved += 1
+            return chunk_id, CHUNK_MOVED
+        return chunk_id, CHUNK_UNCHANGED
+    
+    def stale_ids(self) -> List[str]:
+        """Ids in the manifest that the new version no longer has"""
+        return [chunk_id for chunk_id in self.existing if chunk_id not in self.seen]
 
 class FileService:
     def __init__(self):
         # Create upload directory if it doesn't exist
         os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
     
-    def chunk_text(self, text: str, chunk_size: Optional[int] = 1000) -> List[str]:
-        """Split text into chunks of approximately equal size"""
-        # Simple chunking by character count
-        chunks = []
+    def chunk_text(self, text: str, chunk_size: Optional[int] = 1000, chunk_overlap: int = 0,
+                   size_unit: str = "chars") -> List[str]:
+        """
+        Split text into chunks of approximately equal size
         
+        Chunks exactly as ingest_stream does, so ids derived from them match.
+        """
         # Ensure chunk_size is an integer
         if chunk_size is None:
             chunk_size = 1000
         
-        # If text is shorter than chunk_size, return it as a single chunk
-        if len(text) <= chunk_size:
-            return [text]
+        with metrics.track_stage("chunk"):
+            return list(iter_chunks([text], chunk_size, chunk_overlap, size_unit))
+    
+    def ingest_stream(self, stream: BinaryIO, source: str, collection_name: str, chunk_size: int = 1000,
+                      chunk_overlap: Optional[int] = None, size_unit: Optional[str] = None,
+                      progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                      tee: Optional[BinaryIO] = None) -> Dict[str, int]:
+        """
+        Chunk a byte stream incrementally and sync the chunks into a collection in batches
+        
+        Only one block of input and one batch of chunks are held in memory at a
+        time, and each batch is sent to Chroma as soon as it is full. Chunks whose
+        content hash is already in the source's manifest are not embedded again,
+        and chunks of a previous version that are gone are deleted.
+        
+        Args:
+            stream: Binary stream with the UTF-8 document
+            source: The source name recorded in the chunk metadata
+            collection_name: The name of the collection to add the document to
+            chunk_size: The size of chunks to split the document into
+            chunk_overlap: How much of each chunk is repeated at the start of the next
+            size_unit: Whether chunk_size and chunk_overlap count "chars" or "tokens"
+            progress: Optional callback called with (chunks_done, chunks_total) after each
+                batch; chunks_total is None until the whole stream has been read
+            tee: Optional binary file that receives a copy of the stream
+            
+        Returns:
+            Counts of chunks added, unchanged and removed, and the total
+        """
+        chunk_overlap = settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+        size_unit = size_unit or settings.CHUNK_SIZE_UNIT
+        batch_size = settings.INGEST_BATCH_SIZE
+        # Chunks are produced lazily, so time only the pulls from the chunker
+        chunks = metrics.timed_iter(
+            iter_chunks(iter_text_blocks(stream, tee=tee), chunk_size, chunk_overlap, size_unit),
+            "chunk"
+        )
+        
+        diff = SourceDiff(collection_name, source)
+        counts = {"chunks_added": 0, "chunks_unchanged": 0, "chunks_removed": 0, "chunks_total": 0}
+        new_batch: List[Tuple[str, int, str]] = []
+        moved_batch: List[Tuple[str, int]] = []
         
-        # Split by paragraphs first
-        paragraphs = text.split('\n\n')
-        current_chunk = ""
+        def flush():
+            if new_batch:
+                chroma_client.add_documents(
+                    collection_name=collection_name,
+                    documents=[chunk for _, _, chunk in new_batch],
+                    ids=[chunk_id for chunk_id, _, _ in new_batch],
+                    metadatas=[{"source": source, "chunk": index} for _, index, _ in new_batch]
+                )
+                manifest_store.add(collection_name, source, [(chunk_id, index) for chunk_id, index, _ in new_batch])
+                counts["chunks_added"] += len(new_batch)
+                new_batch.clear()
+            if moved_batch:
+                # Unchanged content at a new position only needs its metadata fixed
+                chroma_client.update_metadatas(
+                    collection_name=collection_name,
+                    ids=[chunk_id for chunk_id, _ in moved_batch],
+                    metadatas=[{"source": source, "chunk": index} for _, index in moved_batch]
+                )
+                manifest_store.add(collection_name, source, moved_batch)
+                moved_batch.clear()
         
-        for paragraph in paragraphs:
-            # If adding this paragraph would exceed chunk size, save current chunk and start a new one
-            if len(current_chunk) + len(paragraph) > chunk_size and current_chunk:
-                chunks.append(current_chunk.strip())
-                current_chunk = paragraph
-            else:
-                if current_chunk:
-                    current_chunk += "\n\n" + paragraph
+        try:
+            for index, chunk in enumerate(chunks):
+                chunk_id, status = diff.classify(chunk, index)
+                counts["chunks_total"] += 1
+                if status == CHUNK_NEW:
+                    new_batch.append((chunk_id, index, chunk))
+                elif status == CHUNK_MOVED:
+                    moved_batch.append((chunk_id, index))
+                    counts["chunks_unchanged"] += 1
                 else:
-                    current_chunk = paragraph
+                    counts["chunks_unchanged"] += 1
+                if len(new_batch) >= batch_size or len(moved_batch) >= batch_size:
+                    flush()
+                    if progress:
+                        progress(counts["chunks_total"], None)
+            flush()
+            
+            # Delete the chunks of the previous version that no longer exist
+            stale_ids = diff.stale_ids()
+            for start in range(0, len(stale_ids), batch_size):
+                batch = stale_ids[start:start + batch_size]
+                chroma_client.delete_documents(collection_name=collection_name, ids=batch)
+                manifest_store.remove(collection_name, source, batch)
+                counts["chunks_removed"] += len(batch)
+            
+            if progress:
+                progress(counts["chunks_total"], counts["chunks_total"])
+        finally:
+            # Cached answers for this collection may now be incomplete
+            if counts["chunks_added"] or counts["chunks_removed"] or diff.moved:
+                answer_cache.invalidate(collection_name)
         
-        # Add the last chunk if it's not empty
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        return counts
+    
+    def process_path(self, file_path: str, source: str, collection_name: str, chunk_size: int = 1000,
+                     chunk_overlap: Optional[int] = None, size_unit: Optional[str] = None,
+                     progress: Optional[Callable[[int, Optional[int]], None]] = None) -> Dict[str, int]:
+        """
+        Chunk a file on disk and add it to the specified collection in batches
         
-        return chunks
+        Args:
+            file_path: Path of the file to ingest
+            source: The source name recorded in the chunk metadata
+            collection_name: The name of the collection to add the document to
+            chunk_size: The size of chunks to split the document into
+            chunk_overlap: How much of each chunk is repeated at the start of the next
+            size_unit: Whether chunk_size and chunk_overlap count "chars" or "tokens"
+            progress: Optional callback called with (chunks_done, chunks_total) after each batch
+            
+        Returns:
+            Counts of chunks added, unchanged and removed, and the total
+        """
+        with open(file_path, "rb") as f:
+            return self.ingest_stream(f, source, collection_name, chunk_size, chunk_overlap, size_unit,
+                                      progress=progress)
     
-    async def process_file(self, file: UploadFile, collection_name: str, chunk_size: int = 1000, keep_file: bool = False) -> Dict[str, Any]:
+    async def process_file(self, file: UploadFile, collection_name: str, chunk_size: int = 1000, keep_file: bool = False,
+                           chunk_overlap: Optional[int] = None, size_unit: Optional[str] = None) -> Dict[str, Any]:
         """
         Process an uploaded file and add its content to the specified collection
         
+        The upload is read straight from its spooled temporary file and chunked
+        as it is read; it is only written to the uploads directory if kept.
+        
         Args:
             file: The uploaded file
             collection_name: The name of the collection to add the document to
             chunk_size: The size of chunks to split the document into
             keep_file: Whether to keep the uploaded file
+            chunk_overlap: How much of each chunk is repeated at the start of the next
+            size_unit: Whether chunk_size and chunk_overlap count "chars" or "tokens"
             
         Returns:
             A dictionary with information about the processed file
         """
         # Validate file extension
-        if not file.filename or not (file.filename.endswith('.txt') or file.filename.endswith('.md')):
+        if not file.filename or not file.filename.endswith(SUPPORTED_EXTENSIONS):
             raise ValueError("Only .txt and .md files are supported")
         
-        file_path = ""
-        try:
-            # Save the file temporarily
-            file_path = os.path.join(settings.UPLOAD_DIR, file.filename)
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            # Read file content
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            # Split content into chunks
-            chunks = self.chunk_text(content, chunk_size)
-            
-            # Generate IDs for chunks
-            chunk_ids = [str(uuid.uuid4()) for _ in chunks]
-            
-            # Add chunks to collection with metadata
-            chroma_client.add_documents(
-                collection_name=collection_name,
-                documents=chunks,
-                ids=chunk_ids,
-                metadatas=[{"source": file.filename, "chunk": i} for i in range(len(chunks))]
-            )
-            
-            # Clean up if not keeping the file
+        file_path = os.path.join(settings.UPLOAD_DIR, os.path.basename(file.filename))
+        
+        def ingest() -> Dict[str, int]:
             if not keep_file:
-                os.remove(file_path)
+                return self.ingest_stream(file.file, file.filename, collection_name, chunk_size,
+                                          chunk_overlap, size_unit)
+            with open(file_path, "wb") as kept:
+                return self.ingest_stream(file.file, file.filename, collection_name, chunk_size,
+                                          chunk_overlap, size_unit, tee=kept)
+        
+        try:
+            counts = await run_in_threadpool(ingest)
             
             return {
                 "message": f"File '{file.filename}' processed successfully",
                 "collection": collection_name,
-                "chunks_added": len(chunks),
+                "chunks_added": counts["chunks_added"],
+                "chunks_unchanged": counts["chunks_unchanged"],
+                "chunks_removed": counts["chunks_removed"],
                 "file_kept": keep_file
             }
             
         except Exception as e:
             # Clean up in case of error
-            if os.path.exists(file_path):
+            if keep_file and os.path.exists(file_path):
                 os.remove(file_path)
             raise e
 
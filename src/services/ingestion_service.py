@@ -0,0 +1,361 @@
+import io
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from src.core.config import settings
+from src.db.chroma_client import chroma_client
+from src.db.manifest_store import manifest_store
+from src.services.cache_service import answer_cache
+from src.services.chunking import iter_chunks, iter_text_blocks
+from src.services.file_service import CHUNK_MOVED, CHUNK_NEW, SUPPORTED_EXTENSIONS, SourceDiff
+
+logger = logging.getLogger(__name__)
+
+# Archive formats accepted by bulk ingestion
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+
+# Maximum number of per-batch errors kept in the job report
+MAX_REPORTED_ERRORS = 20
+
+# A document to ingest: its source name and either its raw bytes or a path to read
+Document = Tuple[str, Union[bytes, str]]
+
+def is_archive(filename: str) -> bool:
+    """Check whether a filename looks like a supported archive"""
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def iter_archive(filename: str, fileobj: BinaryIO) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    Yield (member name, content stream) for every .txt/.md member of a zip or tar archive
+
+    Each stream is only readable until the next member is yielded.
+    """
+    if filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.endswith(SUPPORTED_EXTENSIONS):
+                    with archive.open(info) as member:
+                        yield info.filename, member
+    else:
+        with tarfile.open(fileobj=fileobj, mode="r:*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.endswith(SUPPORTED_EXTENSIONS):
+                    extracted = archive.extractfile(member)
+                    if extracted is not None:
+                        yield member.name, extracted
+
+def spool_documents(filename: str, fileobj: BinaryIO, directory: str) -> Iterator[Document]:
+    """
+    Copy a file, or each .txt/.md member of an archive, to its own file under a directory
+
+    Contents are streamed to disk rather than read into memory, and the
+    documents are yielded as (source, path) for the chunking processes to read.
+    """
+    def spool(source: str, stream: BinaryIO) -> Document:
+        # Member names are not trusted as paths
+        path = os.path.join(directory, uuid.uuid4().hex + os.path.splitext(source)[1])
+        with open(path, "wb") as f:
+            shutil.copyfileobj(stream, f)
+        return source, path
+
+    if is_archive(filename):
+        for member, stream in iter_archive(filename, fileobj):
+            yield spool(member, stream)
+    elif filename.endswith(SUPPORTED_EXTENSIONS):
+        yield spool(filename, fileobj)
+    else:
+        raise ValueError(f"Unsupported file '{filename}': only .txt, .md and .zip/.tar archives are supported")
+
+def _chunk_document(source: str, payload: Union[bytes, str], chunk_size: int, chunk_overlap: int,
+                    size_unit: str) -> Tuple[str, List[str], Optional[str]]:
+    """
+    Decode and chunk one document; runs in a worker process
+
+    Uses the same streaming chunker as single uploads, so a file gets the
+    same chunk ids whichever endpoint ingested it.
+    """
+    try:
+        with (open(payload, "rb") if isinstance(payload, str) else io.BytesIO(payload)) as f:
+            return source, list(iter_chunks(iter_text_blocks(f), chunk_size, chunk_overlap, size_unit)), None
+    except Exception as e:
+        return source, [], str(e)
+
+class BulkIngestionService:
+    """
+    Ingest many documents at once
+
+    Documents are chunked in a process pool and the chunks are fed to Chroma in
+    fixed-size batches through a bounded queue, so chunking and embedding overlap
+    and memory stays bounded however large the corpus is. Only chunks missing
+    from a document's manifest are embedded. A failed batch is recorded in the
+    report instead of failing the whole job.
+
+    A document's stale chunks are deleted only once all of its new chunks
+    were added, so if one of its batches fails it keeps its old content.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_workers = 0
+        self._lock = threading.Lock()
+
+    def get_executor(self, workers: int) -> ProcessPoolExecutor:
+        """Get the chunking process pool, creating it on first use"""
+        with self._lock:
+            if self._executor is None or self._executor_workers != workers:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                # Spawn rather than fork: the server process runs threads of its own
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                self._executor_workers = workers
+            return self._executor
+
+    def shutdown(self):
+        """Stop the chunking process pool"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _chunk_all(self, documents: Iterable[Document], chunk_size: int, chunk_overlap: int, size_unit: str,
+                   workers: int) -> Iterator[Tuple[str, List[str], Optional[str]]]:
+        """Chunk documents, yielding results as they complete"""
+        if workers <= 1:
+            for source, payload in documents:
+                yield _chunk_document(source, payload, chunk_size, chunk_overlap, size_unit)
+            return
+
+        # Keep a bounded number of documents in flight so large corpora
+        # are not all read into the pool's queues at once
+        executor = self.get_executor(workers)
+        max_in_flight = workers * 4
+        pending = set()
+        for source, payload in documents:
+            pending.add(executor.submit(_chunk_document, source, payload, chunk_size, chunk_overlap, size_unit))
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+    def _sync_source(self, collection_name: str, source: str,
+                     chunks: List[str]) -> Tuple[List[Tuple[str, int, str, str]], int, List[str]]:
+        """
+        Diff a document's chunks against its manifest
+
+        Moved chunks get their metadata fixed right away; the new chunks are
+        returned as (source, index, id, content) for the writers to embed.
+
+        Returns:
+            The new chunks, the number of unchanged chunks and the ids of the
+            stale chunks, to remove once the new ones are added
+        """
+        diff = SourceDiff(collection_name, source)
+        new_chunks, moved = [], []
+        for index, chunk in enumerate(chunks):
+            chunk_id, status = diff.classify(chunk, index)
+            if status == CHUNK_NEW:
+                new_chunks.append((source, index, chunk_id, chunk))
+            elif status == CHUNK_MOVED:
+                moved.append((chunk_id, index))
+
+        if moved:
+            chroma_client.update_metadatas(
+                collection_name=collection_name,
+                ids=[chunk_id for chunk_id, _ in moved],
+                metadatas=[{"source": source, "chunk": index} for _, index in moved]
+            )
+            manifest_store.add(collection_name, source, moved)
+
+        return new_chunks, len(chunks) - len(new_chunks), diff.stale_ids()
+
+    def _remove_stale(self, collection_name: str, source: str, stale_ids: List[str]):
+        """Delete a document's stale chunks from the collection and its manifest"""
+        chroma_client.delete_documents(collection_name=collection_name, ids=stale_ids)
+        manifest_store.remove(collection_name, source, stale_ids)
+
+    def ingest(self, documents: Iterable[Document], collection_name: str, chunk_size: int = 1000,
+               batch_size: Optional[int] = None, workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Chunk and add many documents to a collection
+
+        Args:
+            documents: (source, content bytes or file path) pairs
+            collection_name: The name of the collection to add the documents to
+            chunk_size: The size of chunks to split the documents into
+            batch_size: Number of chunks sent to Chroma per add call
+            workers: Number of chunking processes
+
+        Returns:
+            A report with counts, throughput and any errors
+        """
+        batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        workers = workers or settings.INGEST_WORKERS
+        # Resolved here so the worker processes chunk with the server's settings
+        chunk_overlap = settings.CHUNK_OVERLAP
+        size_unit = settings.CHUNK_SIZE_UNIT
+        started = time.perf_counter()
+
+        batches: "queue.Queue[Optional[List[Tuple[str, int, str, str]]]]" = queue.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+        report = {
+            "files_processed": 0,
+            "files_failed": 0,
+            "chunks_added": 0,
+            "chunks_unchanged": 0,
+            "chunks_removed": 0,
+            "chunks_failed": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "errors": [],
+        }
+        report_lock = threading.Lock()
+        # Documents with stale chunks, to remove once their new chunks are all added
+        pending: Dict[str, Dict[str, Any]] = {}
+
+        def record_error(error: Dict[str, Any]):
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append(error)
+
+        def remove_stale(source: str, stale_ids: List[str]):
+            try:
+                self._remove_stale(collection_name, source, stale_ids)
+                with report_lock:
+                    report["chunks_removed"] += len(stale_ids)
+            except Exception as e:
+                logger.warning(f"Failed to remove stale chunks of {source} from {collection_name}: {e}")
+                with report_lock:
+                    record_error({"sources": [source], "error": str(e)})
+
+        def writer():
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    return
+                try:
+                    chroma_client.add_documents(
+                        collection_name=collection_name,
+                        documents=[chunk for _, _, _, chunk in batch],
+                        ids=[chunk_id for _, _, chunk_id, _ in batch],
+                        metadatas=[{"source": source, "chunk": index} for source, index, _, _ in batch]
+                    )
+                    entries_by_source: Dict[str, List[Tuple[str, int]]] = {}
+                    for source, index, chunk_id, _ in batch:
+                        entries_by_source.setdefault(source, []).append((chunk_id, index))
+                    for source, entries in entries_by_source.items():
+                        manifest_store.add(collection_name, source, entries)
+                    completed = []
+                    with report_lock:
+                        report["batches"] += 1
+                        report["chunks_added"] += len(batch)
+                        for source, entries in entries_by_source.items():
+                            state = pending.get(source)
+                            if state is None:
+                                continue
+                            state["remaining"] -= len(entries)
+                            if state["remaining"] == 0 and not state["failed"]:
+                                completed.append((source, pending.pop(source)["stale_ids"]))
+                    for source, stale_ids in completed:
+                        remove_stale(source, stale_ids)
+                except Exception as e:
+                    logger.warning(f"Failed to add a batch of {len(batch)} chunks to {collection_name}: {e}")
+                    with report_lock:
+                        report["batches"] += 1
+                        report["failed_batches"] += 1
+                        report["chunks_failed"] += len(batch)
+                        # Keep the old chunks of the documents this batch was part of
+                        for source in {source for source, _, _, _ in batch}:
+                            if source in pending:
+                                pending[source]["failed"] = True
+                        record_error({
+                            "sources": sorted({source for source, _, _, _ in batch}),
+                            "error": str(e)
+                        })
+
+        writers = [threading.Thread(target=writer, daemon=True) for _ in range(max(1, settings.INGEST_WRITERS))]
+        for thread in writers:
+            thread.start()
+
+        try:
+            current: List[Tuple[str, int, str, str]] = []
+            for source, chunks, error in self._chunk_all(documents, chunk_size, chunk_overlap, size_unit, workers):
+                if error is None:
+                    try:
+                        new_chunks, unchanged, stale_ids = self._sync_source(collection_name, source, chunks)
+                    except Exception as e:
+                        error = str(e)
+                if error is not None:
+                    with report_lock:
+                        report["files_failed"] += 1
+                        record_error({"sources": [source], "error": error})
+                    continue
+                with report_lock:
+                    report["files_processed"] += 1
+                    report["chunks_unchanged"] += unchanged
+                    if stale_ids and new_chunks:
+                        pending[source] = {"stale_ids": stale_ids, "remaining": len(new_chunks), "failed": False}
+                if stale_ids and not new_chunks:
+                    remove_stale(source, stale_ids)
+                for chunk in new_chunks:
+                    current.append(chunk)
+                    if len(current) >= batch_size:
+                        # Blocks while the writers are behind, bounding memory
+                        batches.put(current)
+                        current = []
+            if current:
+                batches.put(current)
+        finally:
+            for _ in writers:
+                batches.put(None)
+            for thread in writers:
+                thread.join()
+            if report["chunks_added"] or report["chunks_removed"]:
+                answer_cache.invalidate(collection_name)
+
+        elapsed = time.perf_counter() - started
+        report.update({
+            "collection": collection_name,
+            "elapsed_seconds": round(elapsed, 3),
+            "files_per_second": round(report["files_processed"] / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_second": round(report["chunks_added"] / elapsed, 2) if elapsed else 0.0,
+        })
+        logger.info(f"Bulk ingestion into {collection_name} finished: {report['files_processed']} files, "
+                    f"{report['chunks_added']} chunks in {elapsed:.2f}s")
+        return report
+
+def collect_paths(paths: Iterable[str], directory: str) -> Iterator[Document]:
+    """
+    Expand files, directories and archives on disk into documents to ingest
+
+    Archive members are extracted under `directory`, which must outlive the ingestion.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, filenames in os.walk(path):
+                for filename in sorted(filenames):
+                    if filename.endswith(SUPPORTED_EXTENSIONS):
+                        full_path = os.path.join(root, filename)
+                        yield os.path.relpath(full_path, path), full_path
+        elif is_archive(path):
+            with open(path, "rb") as f:
+                yield from spool_documents(path, f, directory)
+        elif path.endswith(SUPPORTED_EXTENSIONS):
+            yield os.path.basename(path), path
+
+# Create a singleton instance
+bulk_ingestion_service = BulkIngestionService()
@@ -0,0 +1,194 @@
+import logging
+import os
+import queue
+import shutil
+import threading
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from src.core.config import settings
+from src.db.job_store import JobStore, job_store, JOB_RUNNING, JOB_COMPLETED, JOB_FAILED
+from src.services.chunking import check_chunking
+from src.services.file_service import FileService, SUPPORTED_EXTENSIONS, file_service
+
+logger = logging.getLogger(__name__)
+
+def pid_alive(pid: int) -> bool:
+    """Whether a process with this PID exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class JobService:
+    """
+    Background ingestion jobs
+
+    Uploads are spooled to disk and recorded in the job store, then processed by
+    a pool of worker threads. Jobs that were queued or running when the process
+    stopped are picked up again by `start`.
+
+    Each job is claimed atomically in the store, recording the PID of the
+    process running it, so with several worker processes only one runs it.
+    Every process sends heartbeats for its running jobs and requeues those
+    whose owner died or stopped sending them, whenever that happened.
+    """
+
+    def __init__(self, store: JobStore, files: FileService, workers: int = 2):
+        self.store = store
+        self.files = files
+        self.workers = workers
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the worker pool and requeue unfinished jobs"""
+        if self._threads:
+            return
+        os.makedirs(settings.JOB_DIR, exist_ok=True)
+        # Nothing runs in this process yet, so jobs under its PID were left by an earlier one
+        pid = os.getpid()
+        requeued = self.store.requeue_abandoned(lambda owner: owner != pid and pid_alive(owner),
+                                                settings.JOB_STALE_AFTER)
+        if requeued:
+            logger.info(f"Requeued {len(requeued)} interrupted ingestion jobs")
+        for job_id in self.store.queued():
+            self._queue.put(job_id)
+
+        self._stopping.clear()
+        for i in range(max(1, self.workers)):
+            thread = threading.Thread(target=self._worker, name=f"ingestion-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._monitor = threading.Thread(target=self._watch, name="ingestion-job-monitor", daemon=True)
+        self._monitor.start()
+
+    def _watch(self):
+        """Send heartbeats for this process's jobs and requeue the abandoned jobs of others"""
+        pid = os.getpid()
+        while not self._stopping.wait(settings.JOB_HEARTBEAT_INTERVAL):
+            try:
+                self.store.heartbeat(pid)
+                requeued = self.store.requeue_abandoned(pid_alive, settings.JOB_STALE_AFTER)
+            except Exception as e:
+                logger.warning(f"Ingestion job heartbeat failed: {e}")
+                continue
+            if requeued:
+                logger.info(f"Requeued {len(requeued)} abandoned ingestion jobs")
+            for job_id in requeued:
+                self._queue.put(job_id)
+
+    def stop(self, wait: bool = True):
+        """
+        Stop the worker pool
+
+        With `wait=False` the jobs in progress are abandoned; they are still
+        marked running in the store and get requeued on the next start.
+        """
+        # Without a heartbeat, abandoned jobs go stale and other processes requeue them
+        self._stopping.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+            if self._monitor is not None:
+                self._monitor.join()
+        self._threads = []
+        self._monitor = None
+
+    async def submit(self, file: UploadFile, collection_name: str, chunk_size: int = 1000,
+                     keep_file: bool = False, chunk_overlap: Optional[int] = None,
+                     size_unit: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Spool an upload to disk and queue it for ingestion
+
+        The chunking options are resolved and checked now, so a job resumed
+        after a restart is chunked as it was submitted.
+
+        Returns:
+            The queued job
+        """
+        if not file.filename or not file.filename.endswith(SUPPORTED_EXTENSIONS):
+            raise ValueError("Only .txt and .md files are supported")
+        chunk_overlap = settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+        size_unit = size_unit or settings.CHUNK_SIZE_UNIT
+        check_chunking(chunk_size, chunk_overlap, size_unit)
+
+        job_id = str(uuid.uuid4())
+        job_dir = os.path.join(settings.JOB_DIR, job_id)
+        file_path = os.path.join(job_dir, os.path.basename(file.filename))
+
+        def spool():
+            os.makedirs(job_dir, exist_ok=True)
+            with open(file_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
+
+        await run_in_threadpool(spool)
+        job = self.store.create(job_id, file.filename, collection_name, chunk_size, keep_file, file_path,
+                                chunk_overlap, size_unit)
+        self._queue.put(job_id)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by id"""
+        return self.store.get(job_id)
+
+    def list_jobs(self, state: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """List the most recent jobs"""
+        return self.store.list(state=state, limit=limit)
+
+    def _worker(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            # A job can be queued twice if it was submitted before start() recovered it,
+            # or by several worker processes
+            if not self.store.claim(job_id):
+                continue
+            self.run_job(self.store.get(job_id))
+
+    def run_job(self, job: Dict[str, Any]):
+        """Ingest a spooled upload and record its progress"""
+        job_id = job["id"]
+        if job["state"] != JOB_RUNNING:
+            self.store.update(job_id, state=JOB_RUNNING, chunks_done=0, error=None)
+
+        def progress(chunks_done: int, chunks_total: Optional[int]):
+            # The total is only known once the whole file has been chunked
+            if chunks_total is None:
+                self.store.update(job_id, chunks_done=chunks_done)
+            else:
+                self.store.update(job_id, chunks_done=chunks_done, chunks_total=chunks_total)
+
+        try:
+            self.files.process_path(
+                job["file_path"],
+                job["filename"],
+                job["collection_name"],
+                job["chunk_size"],
+                chunk_overlap=job["chunk_overlap"],
+                size_unit=job["size_unit"],
+                progress=progress
+            )
+            if job["keep_file"]:
+                os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+                shutil.move(job["file_path"], os.path.join(settings.UPLOAD_DIR, os.path.basename(job["filename"])))
+            self.store.update(job_id, state=JOB_COMPLETED)
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {e}")
+            self.store.update(job_id, state=JOB_FAILED, error=str(e))
+        finally:
+            shutil.rmtree(os.path.dirname(job["file_path"]), ignore_errors=True)
+
+# Create a singleton instance
+job_service = JobService(job_store, file_service, workers=settings.JOB_WORKERS)
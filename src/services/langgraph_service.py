@@ -1,74 +1,182 @@
-from typing import Dict, List, TypedDict, Any
-from langchain_core.messages import HumanMessage, AIMessage
-from langgraph.graph import StateGraph, END
+import asyncio
+import time
+from functools import cached_property
+from typing import Dict, List, TypedDict, Any, AsyncIterator, Optional, Sequence, Tuple, Union
 
+from src.core import metrics, tracing
+from src.core.config import settings
 from src.db.chroma_client import chroma_client
 from src.services.ollama_service import ollama_service
+from src.services.cache_service import answer_cache
+from src.services.prompt_service import prompt_builder
+from src.services.rerank_service import RerankService, rerank_service
+from src.services.scheduler import PRIORITY_BATCH
+from src.services.session_service import SessionStore, session_store
+
+# Usage counters forwarded from Ollama's final stream chunk
+STREAM_STAT_FIELDS = (
+    "eval_count",
+    "eval_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "total_duration",
+)
+
+# Per-request generation options passed through to OllamaService
+GENERATION_OPTIONS = ("max_tokens", "temperature", "top_p")
+
+# State carried from one turn of a session to the next, so not part of a turn's input
+SESSION_STATE = ("context", "history", "summary", "retrieval_key")
+
+# Prompt for folding turns that fall out of the history window into the summary
+SUMMARY_PROMPT = (
+    "Summarize this conversation in a few sentences, keeping names, facts and open questions.\n\n"
+    "{conversation}\n\nSummary:"
+)
+
+def join_collections(collection_name: Union[str, Sequence[str]]) -> str:
+    """One collection name, or several joined by commas, which collection names cannot contain"""
+    if isinstance(collection_name, str):
+        return collection_name
+    return ",".join(dict.fromkeys(collection_name))
 
 # Define the state for our agent
 class AgentState(TypedDict):
     query: str
+    collection_name: str
+    model_name: str
+    generation: Dict[str, Any]
+    n_results: int
+    vector_weight: float
+    lexical_weight: float
     context: List[Dict[str, Any]]
+    prompt: str
     answer: str
     messages: List[Any]
+    history: List[Dict[str, str]]
+    summary: str
+    retrieval_key: str
 
 class LangGraphService:
-    def __init__(self):
-        self.agent = self.build_agent_graph()
+    def __init__(self, reranker: Optional[RerankService] = None, sessions: Optional[SessionStore] = None):
+        # Rerank with the cross-encoder if enabled, or if a reranker is given
+        self.reranker = reranker or (rerank_service if settings.RERANK_ENABLED else None)
+        self.sessions = sessions or session_store
+    
+    # The graphs are compiled on first use, so importing the service stays cheap
+    @cached_property
+    def agent(self):
+        return self.build_agent_graph()
+    
+    @cached_property
+    def session_agent(self):
+        # Conversations resume from a checkpoint and add each turn to their history
+        return self.build_agent_graph(checkpointer=self.sessions.saver)
+    
+    def retrieval_count(self, n_results: int) -> int:
+        """Documents to retrieve for n_results, more when they will be reranked"""
+        return max(n_results, settings.RERANK_CANDIDATES) if self.reranker else n_results
+    
+    # Search one collection, or several concurrently
+    def search(self, collection_name: str, query_text: str, n_results: int,
+               vector_weight: Optional[float], lexical_weight: Optional[float]) -> List[Dict[str, Any]]:
+        """Search the comma-separated collections of a state, merging their results"""
+        collections = collection_name.split(",")
+        if len(collections) > 1:
+            return chroma_client.query_collections(collections, query_text, n_results, vector_weight, lexical_weight)
+        return chroma_client.query_collection(
+            collection_name=collection_name,
+            query_text=query_text,
+            n_results=n_results,
+            vector_weight=vector_weight,
+            lexical_weight=lexical_weight
+        )
     
     # Create a function to retrieve context from Chroma
+    @tracing.traced("node.retrieve")
     def retrieve(self, state: AgentState) -> AgentState:
         """Retrieve relevant documents from Chroma"""
+        from langchain_core.messages import AIMessage
+        
         query = state["query"]
         collection_name = state.get("collection_name", "documents")
+        generations = ",".join(str(answer_cache.generation(name)) for name in collection_name.split(","))
+        n_results = self.retrieval_count(state.get("n_results") or settings.RETRIEVAL_N_RESULTS)
+        history = state.get("history") or []
+        previous_context = state.get("context") or []
+        
+        # The key changes when the collection does, as answer cache entries are invalidated
+        retrieval_key = (f"{collection_name}:{generations}:{n_results}:"
+                         f"{state.get('vector_weight')}:{state.get('lexical_weight')}:{query}")
         
         try:
-            # Search for relevant documents using our chroma client
-            context = chroma_client.query_collection(
-                collection_name=collection_name,
-                query_text=query,
-                n_results=3
-            )
+            if history and retrieval_key == state.get("retrieval_key"):
+                # The last turn's question again, such as a retry
+                context = previous_context
+            else:
+                # A follow-up such as "and why?" finds little on its own, so
+                # search with the previous question as well
+                previous_questions = [turn["content"] for turn in history if turn["role"] == "user"]
+                retrieval_query = " ".join(previous_questions[-1:] + [query])
+                # Search for relevant documents using our chroma client
+                with metrics.track_stage("retrieve"):
+                    context = self.search(collection_name, retrieval_query, n_results,
+                                          state.get("vector_weight"), state.get("lexical_weight"))
+                if history:
+                    # Keep the documents the last answer was based on within reach
+                    ids = {document.get("id") for document in context}
+                    context = context + [document for document in previous_context
+                                         if document.get("id") not in ids][:settings.SESSION_CARRY_DOCS]
             
             # Add a message about retrieval
             messages = state.get("messages", [])
             messages.append(AIMessage(content=f"I've retrieved {len(context)} relevant documents."))
             
             # Return updated state
-            return {**state, "context": context, "messages": messages}
+            return {**state, "context": context, "retrieval_key": retrieval_key, "messages": messages}
         except Exception as e:
             print(f"Error retrieving context: {e}")
             messages = state.get("messages", [])
             messages.append(AIMessage(content=f"Error retrieving documents: {str(e)}"))
-            return {**state, "context": [], "messages": messages}
+            return {**state, "context": [], "retrieval_key": "", "messages": messages}
 
-    # Generate a response based on the retrieved context
-    def generate_response(self, state: AgentState) -> AgentState:
-        """Generate a response based on the retrieved context"""
-        query = state["query"]
-        context = state["context"]
-        
-        # Format the context for the prompt
-        context_str = "\n\n".join([f"Document {i+1}:\n{doc['content']}\nSource: {doc['metadata']['source']}" 
-                                for i, doc in enumerate(context)])
-        
-        # Create a system message with instructions
-        system_message = """You are a helpful assistant. Answer the user's question based on the provided context.
-    Be concise and accurate. If the context doesn't contain the information needed, say so."""
-        
-        # Create a prompt with the query and context
-        prompt = f"""Question: {query}
+    # Rerank the retrieved context with the cross-encoder
+    @tracing.traced("node.rerank")
+    def rerank(self, state: AgentState) -> AgentState:
+        """Keep the n_results retrieved documents the cross-encoder scores highest"""
+        with metrics.track_stage("rerank"):
+            context = self.reranker.rerank(state["query"], state["context"], state["n_results"])
+        return {**state, "context": context}
 
-    Context:
-    {context_str if context else 'No context available.'}
+    # Pack the retrieved context into the model's prompt budget
+    @tracing.traced("node.assemble")
+    def assemble_prompt(self, state: AgentState) -> AgentState:
+        """Build the prompt, keeping only the documents that fit the model's context window"""
+        with metrics.track_stage("assemble"):
+            packed = prompt_builder.build(
+                state["query"],
+                state["context"],
+                model_name=state["model_name"],
+                max_tokens=state["generation"].get("max_tokens"),
+                history=state.get("history"),
+                summary=state.get("summary", "")
+            )
+        return {**state, "context": packed.context, "prompt": packed.prompt}
 
-    Based on the context, please provide a direct and helpful answer to the question."""
+    # Generate a response based on the retrieved context
+    @tracing.traced("node.generate")
+    async def generate_response(self, state: AgentState) -> AgentState:
+        """Generate a response based on the retrieved context"""
+        from langchain_core.messages import AIMessage
         
         # Generate a response
-        answer = ollama_service.generate_response(
-            query=prompt,
-            context=system_message
-        )
+        with metrics.track_stage("generate"):
+            answer = await ollama_service.generate_response(
+                query=state["prompt"],
+                system=prompt_builder.system_prompt,
+                model_name=state["model_name"],
+                **state["generation"]
+            )
         
         # Add the answer to the messages
         messages = state.get("messages", [])
@@ -77,40 +185,176 @@ class LangGraphService:
         # Return the updated state
         return {**state, "answer": answer, "messages": messages}
 
+    # Add the turn to the conversation history, keeping the history bounded
+    @tracing.traced("node.compact")
+    async def compact(self, state: AgentState) -> AgentState:
+        """Append the turn to the history, keeping the last SESSION_HISTORY_TURNS turns"""
+        history = (state.get("history") or []) + [
+            {"role": "user", "content": state["query"]},
+            {"role": "assistant", "content": state["answer"]}
+        ]
+        split = max(0, len(history) - 2 * settings.SESSION_HISTORY_TURNS)
+        overflow, history = history[:split], history[split:]
+        summary = state.get("summary", "")
+        
+        if overflow and settings.SESSION_SUMMARIZE:
+            # Fold the turns that fell out of the window into the summary
+            conversation = prompt_builder.format_conversation(overflow, summary)
+            try:
+                with metrics.track_stage("compact"):
+                    summary = (await ollama_service.generate_response(
+                        query=SUMMARY_PROMPT.format(conversation=conversation),
+                        system=prompt_builder.system_prompt,
+                        model_name=state["model_name"],
+                        max_tokens=128,
+                        priority=PRIORITY_BATCH
+                    )).strip()
+            except Exception as e:
+                # The window alone still bounds the prompt
+                print(f"Error summarizing conversation: {e}")
+        
+        return {**state, "history": history, "summary": summary}
+
     # Build the LangGraph agent
-    def build_agent_graph(self):
-        """Build the LangGraph agent graph"""
+    def build_agent_graph(self, checkpointer=None):
+        """Build the LangGraph agent graph, with a compaction step when it checkpoints sessions"""
+        from langgraph.graph import StateGraph, END
+        
         # Create a new graph
         graph = StateGraph(AgentState)
         
         # Add nodes for each step
         graph.add_node("retrieve", self.retrieve)
+        graph.add_node("assemble", self.assemble_prompt)
         graph.add_node("generate", self.generate_response)
         
         # Define the edges
-        graph.add_edge("retrieve", "generate")
-        graph.add_edge("generate", END)
+        if self.reranker:
+            graph.add_node("rerank", self.rerank)
+            graph.add_edge("retrieve", "rerank")
+            graph.add_edge("rerank", "assemble")
+        else:
+            graph.add_edge("retrieve", "assemble")
+        graph.add_edge("assemble", "generate")
+        if checkpointer is not None:
+            graph.add_node("compact", self.compact)
+            graph.add_edge("generate", "compact")
+            graph.add_edge("compact", END)
+        else:
+            graph.add_edge("generate", END)
         
         # Set the entry point
         graph.set_entry_point("retrieve")
         
         # Compile the graph
-        return graph.compile()
+        return graph.compile(checkpointer=checkpointer)
 
-    # Function to run the agent
-    def run_agent(self, query: str, collection_name: str):
-        """Run the LangGraph agent"""
-        # Create the initial state
-        initial_state = {
+    # Build the initial agent state for a query
+    def initial_state(self, query: str, collection_name: Union[str, Sequence[str]], model_name: Optional[str] = None,
+                      generation: Optional[Dict[str, Any]] = None, n_results: Optional[int] = None,
+                      vector_weight: Optional[float] = None, lexical_weight: Optional[float] = None) -> Dict[str, Any]:
+        """Build the initial agent state, filling in the model and retrieval defaults"""
+        from langchain_core.messages import HumanMessage
+        
+        return {
             "query": query,
-            "collection_name": collection_name,
+            "collection_name": join_collections(collection_name),
+            "model_name": model_name or ollama_service.model_name,
+            "generation": {key: value for key, value in (generation or {}).items()
+                           if key in GENERATION_OPTIONS and value is not None},
+            "n_results": n_results or settings.RETRIEVAL_N_RESULTS,
+            "vector_weight": settings.HYBRID_VECTOR_WEIGHT if vector_weight is None else vector_weight,
+            "lexical_weight": settings.HYBRID_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight,
             "context": [],
+            "prompt": "",
             "answer": "",
-            "messages": [HumanMessage(content=query)]
+            "messages": [HumanMessage(content=query)],
+            "history": [],
+            "summary": "",
+            "retrieval_key": ""
         }
+
+    # The part of a state that starts a new turn of a session
+    def turn_input(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Drop the keys a session carries over, so its checkpointed values are kept"""
+        return {key: value for key, value in state.items() if key not in SESSION_STATE}
+
+    # Retrieval parameters an answer depends on, as an answer cache key part
+    def cache_options(self, state: Dict[str, Any]) -> str:
+        """Answer cache options for a state's retrieval parameters"""
+        generation = ",".join(f"{key}={value}" for key, value in sorted(state["generation"].items()))
+        return f"n={state['n_results']},v={state['vector_weight']},l={state['lexical_weight']},{generation}"
+
+    # Function to run the agent
+    async def run_agent(self, query: str, collection_name: Union[str, Sequence[str]], model_name: Optional[str] = None,
+                        generation: Optional[Dict[str, Any]] = None, n_results: Optional[int] = None,
+                        vector_weight: Optional[float] = None, lexical_weight: Optional[float] = None,
+                        session_id: Optional[str] = None):
+        """
+        Run the LangGraph agent
+        
+        Args:
+            query: The question
+            collection_name: The collection to retrieve from, or a list of collections
+                to search concurrently and merge
+            model_name: The Ollama model to answer with (default: DEFAULT_MODEL)
+            generation: Generation options (max_tokens, temperature, top_p)
+            n_results: Number of documents to retrieve
+            vector_weight: Weight of dense search in the rank fusion
+            lexical_weight: Weight of BM25 search in the rank fusion
+            session_id: Conversation to continue; its earlier turns are part of the prompt
+        """
+        from langchain_core.messages import HumanMessage, AIMessage
+        
+        # Create the initial state
+        initial_state = self.initial_state(query, collection_name, model_name, generation,
+                                           n_results, vector_weight, lexical_weight)
+        collection_name = initial_state["collection_name"]
+        model_name = initial_state["model_name"]
+        options = self.cache_options(initial_state)
+        # Uploads invalidate cached answers one collection at a time, so
+        # answers merged from several collections are not cached
+        use_cache = settings.ANSWER_CACHE_ENABLED and "," not in collection_name
+        
+        if session_id:
+            # Answers depend on the conversation, so they bypass the answer cache.
+            # Only the final state is checkpointed, and the saver keeps just that one.
+            async with self.sessions.touch(session_id):
+                result = await self.session_agent.ainvoke(
+                    self.turn_input(initial_state),
+                    self.sessions.config(session_id),
+                    durability="exit"
+                )
+            return {
+                "answer": result["answer"],
+                "sources": result["context"],
+                "messages": result["messages"]
+            }
+        
+        # Serve repeated questions from the answer cache
+        if use_cache:
+            generation = answer_cache.generation(collection_name)
+            cached = await asyncio.to_thread(answer_cache.get, collection_name, model_name, query, options)
+            if cached is not None:
+                return {
+                    "answer": cached["answer"],
+                    "sources": cached["sources"],
+                    "messages": [HumanMessage(content=query), AIMessage(content=cached["answer"])]
+                }
         
         # Run the agent
-        result = self.agent.invoke(initial_state)
+        result = await self.agent.ainvoke(initial_state)
+        
+        if use_cache:
+            await asyncio.to_thread(
+                answer_cache.put,
+                collection_name,
+                model_name,
+                query,
+                {"answer": result["answer"], "sources": result["context"]},
+                generation,
+                options
+            )
         
         # Return the result
         return {
@@ -119,5 +363,195 @@ class LangGraphService:
             "messages": result["messages"]
         }
 
+    # Function to answer many queries at once
+    async def run_batch(self, items: List[Dict[str, Any]], concurrency: Optional[int] = None,
+                        priority: int = PRIORITY_BATCH) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer a batch of queries, yielding each result as soon as it is ready
+        
+        Queries that miss the answer cache and share a collection and retrieval
+        parameters are retrieved with one batched vector store query. Queries
+        over several collections search them concurrently, one query at a time.
+        Generation then runs with at most `concurrency` Ollama requests in flight.
+        
+        Args:
+            items: Dicts with "query" and "collection_name" (a name or a list of
+                names), and optionally
+                "model_name", the generation options, "n_results",
+                "vector_weight" and "lexical_weight"
+            concurrency: Maximum concurrent generations (default: BATCH_CONCURRENCY)
+            priority: Scheduling priority class of the generations
+            
+        Yields:
+            {"index", "query", "answer", "sources"} for each query, or
+            {"index", "query", "error"} if it failed
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.BATCH_CONCURRENCY)
+        states = [
+            self.initial_state(
+                item["query"],
+                item["collection_name"],
+                item.get("model_name"),
+                {key: item.get(key) for key in GENERATION_OPTIONS},
+                item.get("n_results"),
+                item.get("vector_weight"),
+                item.get("lexical_weight")
+            )
+            for item in items
+        ]
+        models = [state["model_name"] for state in states]
+        
+        # Serve repeated questions from the answer cache, except multi-collection ones
+        cacheable = [settings.ANSWER_CACHE_ENABLED and "," not in state["collection_name"] for state in states]
+        generations = [answer_cache.generation(state["collection_name"]) for state in states]
+        
+        async def lookup(i: int) -> Optional[Dict[str, Any]]:
+            if not cacheable[i]:
+                return None
+            return await asyncio.to_thread(answer_cache.get, states[i]["collection_name"], models[i],
+                                           states[i]["query"], self.cache_options(states[i]))
+        
+        cached: List[Optional[Dict[str, Any]]] = await asyncio.gather(*(lookup(i) for i in range(len(states))))
+        
+        # One retrieval per collection and set of retrieval parameters
+        groups: Dict[Tuple[str, int, float, float], List[int]] = {}
+        for i, state in enumerate(states):
+            if cached[i] is None:
+                key = (state["collection_name"], state["n_results"], state["vector_weight"], state["lexical_weight"])
+                groups.setdefault(key, []).append(i)
+        
+        async def retrieve_group(key: Tuple[str, int, float, float], indexes: List[int]):
+            collection_name, n_results, vector_weight, lexical_weight = key
+            collections = collection_name.split(",")
+            with metrics.track_stage("retrieve"):
+                if len(collections) > 1:
+                    # Each query fans out over the collections on its own
+                    contexts = await asyncio.gather(*(
+                        asyncio.to_thread(chroma_client.query_collections, collections, states[i]["query"],
+                                          self.retrieval_count(n_results), vector_weight, lexical_weight)
+                        for i in indexes
+                    ))
+                else:
+                    contexts = await asyncio.to_thread(
+                        chroma_client.query_collection_batch,
+                        collection_name,
+                        [states[i]["query"] for i in indexes],
+                        self.retrieval_count(n_results),
+                        vector_weight,
+                        lexical_weight
+                    )
+            for i, context in zip(indexes, contexts):
+                states[i]["context"] = context
+        
+        retrievals: Dict[int, asyncio.Task] = {}
+        for key, indexes in groups.items():
+            task = asyncio.create_task(retrieve_group(key, indexes))
+            for i in indexes:
+                retrievals[i] = task
+        
+        async def answer(i: int) -> Dict[str, Any]:
+            state = states[i]
+            try:
+                if cached[i] is not None:
+                    return {"index": i, "query": state["query"], **cached[i]}
+                await retrievals[i]
+                if self.reranker:
+                    state = await asyncio.to_thread(self.rerank, state)
+                state = states[i] = self.assemble_prompt(state)
+                async with semaphore:
+                    with metrics.track_stage("generate"):
+                        response = await ollama_service.generate_response(
+                            query=state["prompt"],
+                            system=prompt_builder.system_prompt,
+                            model_name=models[i],
+                            priority=priority,
+                            **state["generation"]
+                        )
+                result = {"answer": response, "sources": state["context"]}
+                if cacheable[i]:
+                    await asyncio.to_thread(
+                        answer_cache.put,
+                        state["collection_name"],
+                        models[i],
+                        state["query"],
+                        result,
+                        generations[i],
+                        self.cache_options(state)
+                    )
+                return {"index": i, "query": state["query"], **result}
+            except Exception as e:
+                print(f"Error answering batch query {i}: {e}")
+                return {"index": i, "query": state["query"], "error": str(e)}
+        
+        tasks = [asyncio.create_task(answer(i)) for i in range(len(states))]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # Stop outstanding work if the consumer goes away
+            for task in tasks:
+                task.cancel()
+            for task in set(retrievals.values()):
+                task.cancel()
+
+    # Function to stream the agent's answer
+    async def stream_agent(self, query: str, collection_name: Union[str, Sequence[str]], model_name: Optional[str] = None,
+                           generation: Optional[Dict[str, Any]] = None, n_results: Optional[int] = None,
+                           vector_weight: Optional[float] = None,
+                           lexical_weight: Optional[float] = None,
+                           session_id: Optional[str] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Run retrieval, then stream the generated answer token by token
+        
+        Yields (event, data) pairs: one "sources" event with the retrieved
+        context, a "token" event per generated token and a final "stats"
+        event with Ollama's usage counters. With a session_id, the turn
+        continues that conversation and is saved to it once fully streamed.
+        """
+        initial_state = self.initial_state(query, collection_name, model_name, generation,
+                                           n_results, vector_weight, lexical_weight)
+        if not session_id:
+            async for event in self._stream_turn(initial_state):
+                if event[0] != "answer":
+                    yield event
+            return
+        
+        config = self.sessions.config(session_id)
+        async with self.sessions.touch(session_id):
+            saved = await self.session_agent.aget_state(config)
+            state = {**initial_state, **saved.values, **self.turn_input(initial_state)}
+            async for event in self._stream_turn(state):
+                if event[0] == "answer":
+                    state = await self.compact(event[1])
+                    await self.session_agent.aupdate_state(config, state, as_node="compact")
+                else:
+                    yield event
+
+    async def _stream_turn(self, initial_state: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """The steps of stream_agent, ending with an "answer" event holding the final state"""
+        # Retrieval is a blocking Chroma call, so keep it off the event loop
+        state = await asyncio.to_thread(self.retrieve, initial_state)
+        if self.reranker:
+            state = await asyncio.to_thread(self.rerank, state)
+        state = self.assemble_prompt(state)
+        yield "sources", {"sources": state["context"]}
+        
+        started = time.perf_counter()
+        tokens = []
+        async for chunk in ollama_service.stream_response(
+            query=state["prompt"],
+            system=prompt_builder.system_prompt,
+            model_name=initial_state["model_name"],
+            **initial_state["generation"]
+        ):
+            if chunk.get("response"):
+                tokens.append(chunk["response"])
+                yield "token", {"token": chunk["response"]}
+            if chunk.get("done"):
+                metrics.STAGE_SECONDS.labels(stage="generate").observe(time.perf_counter() - started)
+                yield "stats", {key: chunk[key] for key in STREAM_STAT_FIELDS if key in chunk}
+        yield "answer", {**state, "answer": "".join(tokens)}
+
+
 # Create a singleton instance
-langgraph_service = LangGraphService() 
\ No newline at end of file
+langgraph_service = LangGraphService()
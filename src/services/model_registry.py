@@ -0,0 +1,144 @@
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def parse_model_specs(spec: str, default: int) -> Dict[str, int]:
+    """
+    Parse a per-model setting such as "tinyllama:latest=8,llama3:8b=2"
+
+    Returns:
+        Model names mapped to their value, `default` for names without one
+    """
+    models = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, value = item.partition("=")
+        models[name.strip()] = int(value) if value.strip() else default
+    return models
+
+class ModelState:
+    """Configuration and usage counters of one model"""
+
+    def __init__(self, name: str, max_concurrency: int, preload: bool, context_window: int = 2048):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.preload = preload
+        self.context_window = context_window
+        self.loaded = False
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_used: Optional[float] = None
+
+class ModelRegistry:
+    """
+    The Ollama models this deployment serves
+
+    Configured models, and the default model, are preloaded at startup and
+    pinned in Ollama's memory by sending keep_alive=-1 with every request for
+    them. Other models are registered on first use with the default
+    concurrency limit and unloaded `keep_alive` after their last request.
+    Model names come from clients, so at most `max_unconfigured` of these
+    other models are tracked; the least recently used idle one is forgotten
+    to make room for a new one.
+    Every model has its own concurrency limit, enforced by the LLM scheduler,
+    so a slow large model cannot take all of Ollama's capacity from a small one.
+    Every model also has a context window, sent to Ollama as num_ctx and used
+    as the token budget of its prompts.
+    """
+
+    def __init__(self, models: Dict[str, int], default_model: str, default_concurrency: int = 4,
+                 keep_alive: str = "30m", context_windows: Optional[Dict[str, int]] = None,
+                 default_context_window: int = 2048, max_unconfigured: int = 8):
+        self.default_model = default_model
+        self.default_concurrency = default_concurrency
+        self.keep_alive = keep_alive
+        self.context_windows = context_windows or {}
+        self.default_context_window = default_context_window
+        self.max_unconfigured = max_unconfigured
+        self._models: Dict[str, ModelState] = {
+            name: self._new_state(name, limit, preload=True) for name, limit in models.items()
+        }
+        if default_model not in self._models:
+            self._models[default_model] = self._new_state(default_model, default_concurrency, preload=True)
+        # Models registered on first use, least recently used first
+        self._unconfigured: "OrderedDict[str, ModelState]" = OrderedDict()
+
+    def _new_state(self, name: str, max_concurrency: int, preload: bool) -> ModelState:
+        context_window = self.context_windows.get(name, self.default_context_window)
+        return ModelState(name, max_concurrency, preload, context_window)
+
+    def __contains__(self, model_name: str) -> bool:
+        return self.find(model_name) is not None
+
+    def find(self, model_name: str) -> Optional[ModelState]:
+        """Get a model's state if it is tracked, without registering it"""
+        return self._models.get(model_name) or self._unconfigured.get(model_name)
+
+    def get(self, model_name: Optional[str] = None) -> ModelState:
+        """Get a model's state, registering it if it is new"""
+        name = model_name or self.default_model
+        state = self._models.get(name)
+        if state is not None:
+            return state
+        state = self._unconfigured.get(name)
+        if state is not None:
+            self._unconfigured.move_to_end(name)
+            return state
+        self._forget_idle(self.max_unconfigured - 1)
+        state = self._unconfigured[name] = self._new_state(name, self.default_concurrency, preload=False)
+        return state
+
+    def _forget_idle(self, keep: int):
+        """Forget the least recently used idle unconfigured models until at most `keep` are left"""
+        excess = len(self._unconfigured) - keep
+        if excess <= 0:
+            return
+        # Busy models keep their state so their concurrency limit still holds
+        idle = [name for name, state in self._unconfigured.items() if state.in_flight == 0]
+        for name in idle[:excess]:
+            logger.info(f"Forgetting unconfigured model {name}")
+            del self._unconfigured[name]
+
+    def keep_alive_for(self, model_name: Optional[str] = None) -> Union[str, int]:
+        """The keep_alive to send to Ollama with a request for a model"""
+        return -1 if self.get(model_name).preload else self.keep_alive
+
+    def preloaded(self) -> List[str]:
+        """Names of the models to load at startup"""
+        return list(self._models)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Configuration and counters of every known model"""
+        return [
+            {
+                "name": state.name,
+                "default": state.name == self.default_model,
+                "preload": state.preload,
+                "loaded": state.loaded,
+                "max_concurrency": state.max_concurrency,
+                "context_window": state.context_window,
+                "in_flight": state.in_flight,
+                "requests": state.requests,
+                "failures": state.failures,
+                "last_used": state.last_used,
+            }
+            for state in [*self._models.values(), *self._unconfigured.values()]
+        ]
+
+# Create a singleton instance
+model_registry = ModelRegistry(
+    models=parse_model_specs(settings.OLLAMA_MODELS, settings.OLLAMA_MODEL_CONCURRENCY),
+    default_model=settings.DEFAULT_MODEL,
+    default_concurrency=settings.OLLAMA_MODEL_CONCURRENCY,
+    keep_alive=settings.OLLAMA_KEEP_ALIVE,
+    context_windows=parse_model_specs(settings.OLLAMA_CONTEXT_WINDOWS, settings.DEFAULT_CONTEXT_WINDOW),
+    default_context_window=settings.DEFAULT_CONTEXT_WINDOW,
+    max_unconfigured=settings.OLLAMA_MAX_UNCONFIGURED_MODELS
+)
@@ -1,19 +1,84 @@
-import requests
-from typing import List, Optional, Dict, Any
+import json
+import time
+import httpx
+from typing import List, Optional, Dict, Any, AsyncIterator
+from src.core import metrics, tracing
 from src.core.config import settings
+from src.core.resilience import BackendUnavailable, CircuitBreaker, acall_with_retry
+from src.services.model_registry import ModelRegistry, model_registry
+from src.services.scheduler import PRIORITY_INTERACTIVE, LLMScheduler, llm_scheduler
+
+# Ollama's usage stats attached to the spans of its calls
+SPAN_COUNT_FIELDS = ("prompt_eval_count", "eval_count")
+SPAN_DURATION_FIELDS = ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration")
+
+def usage_attributes(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Span attributes for Ollama's usage stats, with its nanosecond durations in milliseconds"""
+    attributes = {field: result[field] for field in SPAN_COUNT_FIELDS if field in result}
+    attributes.update({f"{field}_ms": result[field] / 1e6 for field in SPAN_DURATION_FIELDS if field in result})
+    return attributes
 
 class OllamaService:
-    def __init__(self):
+    def __init__(self, registry: Optional[ModelRegistry] = None, scheduler: Optional[LLMScheduler] = None):
         self.host = f"http://{settings.OLLAMA_HOST}:{settings.OLLAMA_PORT}"
-        self.model_name = settings.DEFAULT_MODEL
+        self.registry = registry or model_registry
+        if scheduler is None:
+            scheduler = llm_scheduler if registry is None else LLMScheduler(
+                self.registry,
+                max_queue=settings.SCHEDULER_MAX_QUEUE,
+                queue_timeout=settings.SCHEDULER_QUEUE_TIMEOUT
+            )
+        self.scheduler = scheduler
+        # Default model; requests pick their own model with the model_name argument
+        self.model_name = self.registry.default_model
         self.generate_endpoint = f"{self.host}/api/generate"
         self.chat_endpoint = f"{self.host}/api/chat"
         self.is_connected = False
+        self._client: Optional[httpx.AsyncClient] = None
+        # Fails calls fast while Ollama is unreachable instead of each waiting for a timeout
+        self.breaker = CircuitBreaker(
+            "ollama",
+            failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.CIRCUIT_RESET_TIMEOUT
+        )
+    
+    def get_client(self) -> httpx.AsyncClient:
+        """Get the pooled async HTTP client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    settings.OLLAMA_REQUEST_TIMEOUT,
+                    connect=settings.OLLAMA_CONNECT_TIMEOUT
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.OLLAMA_KEEPALIVE_EXPIRY
+                )
+            )
+        return self._client
+    
+    async def close(self):
+        """Close the pooled HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
-    def connect(self):
+    async def _send(self, request: httpx.Request, stream: bool = False) -> httpx.Response:
+        """Send a request through the circuit breaker, retrying with jittered backoff while it cannot connect"""
+        with tracing.span("ollama.http", method=request.method, path=request.url.path) as span:
+            response = await acall_with_retry(lambda: self.get_client().send(request, stream=stream), self.breaker)
+            span.set(status=response.status_code)
+            return response
+    
+    async def connect(self):
         """Test connection to Ollama"""
         try:
-            response = requests.get(f"{self.host}/api/tags")
+            response = await self._send(self.get_client().build_request(
+                "GET",
+                f"{self.host}/api/tags",
+                timeout=settings.OLLAMA_CONNECT_TIMEOUT
+            ))
             if response.status_code == 200:
                 models = response.json().get("models", [])
                 model_names = [model["name"] for model in models]
@@ -32,58 +97,216 @@ class OllamaService:
             print("Make sure Ollama is running.")
             return False
     
-    def generate_response(self, query: str, context: Optional[str] = None, 
-                         max_tokens: int = 512, temperature: float = 0.7, 
-                         top_p: float = 0.95) -> str:
+    async def preload_models(self) -> Dict[str, bool]:
         """
-        Generate a response from the model
+        Load the registry's preloaded models into Ollama and keep them resident
         
-        Args:
-            query: The user query
-            context: Optional context from vector database retrieval
-            max_tokens: Maximum number of tokens to generate
-            temperature: Temperature for sampling
-            top_p: Top-p for nucleus sampling
-            
         Returns:
-            The generated response text
+            Each model mapped to whether it was loaded
         """
-        # Construct the prompt with context if provided
-        if context:
+        loaded = {}
+        for name in self.registry.preloaded():
+            try:
+                # A generate request without a prompt only loads the model
+                await self._post(self.generate_endpoint, {
+                    "model": name,
+                    "keep_alive": self.registry.keep_alive_for(name),
+                    # Load with the num_ctx requests will use, so the first one doesn't reload the model
+                    "options": {"num_ctx": self.registry.get(name).context_window}
+                })
+                self.registry.get(name).loaded = True
+                loaded[name] = True
+            except Exception as e:
+                print(f"Warning: Could not preload model '{name}': {e}")
+                loaded[name] = False
+        return loaded
+    
+    async def ping(self):
+        """Health probe: raise unless Ollama answers, bypassing the circuit breaker"""
+        try:
+            response = await self.get_client().get(f"{self.host}/api/tags", timeout=settings.HEALTH_PROBE_TIMEOUT)
+            if response.status_code >= 500:
+                raise ConnectionError(f"Ollama returned status code {response.status_code}")
+        except BaseException:
+            self.is_connected = False
+            raise
+        self.is_connected = True
+    
+    async def list_models(self) -> List[str]:
+        """List the models available in Ollama"""
+        response = await self._send(self.get_client().build_request("GET", f"{self.host}/api/tags"))
+        response.raise_for_status()
+        return [model["name"] for model in response.json().get("models", [])]
+    
+    async def _post(self, endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST a payload to Ollama and return the decoded JSON body"""
+        response = await self._send(self.get_client().build_request("POST", endpoint, json=payload))
+        if response.status_code == 200:
+            return response.json()
+        error_msg = f"Error: Ollama API returned status code {response.status_code}"
+        try:
+            error_details = response.json()
+            error_msg += f", {error_details.get('error', '')}"
+        except ValueError:
+            pass
+        raise Exception(error_msg)
+    
+    def _build_generate_payload(self, query: str, context: Optional[str], max_tokens: int,
+                                temperature: float, top_p: float, stream: bool = False,
+                                model_name: Optional[str] = None,
+                                options: Optional[Dict[str, Any]] = None,
+                                system: Optional[str] = None) -> Dict[str, Any]:
+        """Build the /api/generate payload for a query and optional context"""
+        # Construct the prompt with context if provided; a query with a system
+        # prompt is already a complete prompt
+        if system is not None:
+            prompt = query
+        elif context:
             prompt = f"Context information:\n{context}\n\nQuestion: {query}\n\nAnswer:"
         else:
             prompt = f"Question: {query}\n\nAnswer:"
         
-        # Prepare the request payload
+        model_name = model_name or self.model_name
         payload = {
-            "model": self.model_name,
+            "model": model_name,
             "prompt": prompt,
-            "stream": False,
+            "stream": stream,
+            "keep_alive": self.registry.keep_alive_for(model_name),
             "options": {
                 "temperature": temperature,
                 "top_p": top_p,
-                "num_predict": max_tokens
+                "num_predict": max_tokens,
+                "num_ctx": self.registry.get(model_name).context_window,
+                **(options or {})
             }
         }
+        if system is not None:
+            payload["system"] = system
+        return payload
+    
+    async def generate_response(self, query: str, context: Optional[str] = None, 
+                               max_tokens: int = 512, temperature: float = 0.7, 
+                               top_p: float = 0.95, model_name: Optional[str] = None,
+                               options: Optional[Dict[str, Any]] = None,
+                               priority: int = PRIORITY_INTERACTIVE,
+                               system: Optional[str] = None) -> str:
+        """
+        Generate a response from the model
+        
+        Args:
+            query: The user query
+            context: Optional context from vector database retrieval
+            max_tokens: Maximum number of tokens to generate
+            temperature: Temperature for sampling
+            top_p: Top-p for nucleus sampling
+            model_name: Model to use instead of the default model
+            options: Extra Ollama options, such as num_ctx, seed or stop
+            priority: Scheduling priority class (PRIORITY_INTERACTIVE or PRIORITY_BATCH)
+            system: System prompt; when given, `query` is sent as the complete
+                prompt instead of being wrapped in the context template
+            
+        Returns:
+            The generated response text
+            
+        Raises:
+            SchedulerRejected: If the model is overloaded
+            BackendUnavailable: If Ollama is down
+        """
+        payload = self._build_generate_payload(query, context, max_tokens, temperature, top_p,
+                                               model_name=model_name, options=options, system=system)
+        
+        # Don't queue for a slot when the call would fail anyway
+        self.breaker.check()
+        queued = time.perf_counter()
+        with tracing.span("ollama.generate", model=payload["model"]) as span:
+            async with self.scheduler.slot(payload["model"], priority):
+                span.set(queue_ms=(time.perf_counter() - queued) * 1000)
+                try:
+                    started = time.perf_counter()
+                    result = await self._post(self.generate_endpoint, payload)
+                    metrics.observe_ollama(payload["model"], time.perf_counter() - started, result)
+                    span.set(**usage_attributes(result))
+                    return result.get("response", "").strip()
+                except BackendUnavailable:
+                    raise
+                except Exception as e:
+                    raise Exception(f"Failed to generate response: {str(e)}")
+    
+    async def stream_response(self, query: str, context: Optional[str] = None,
+                              max_tokens: int = 512, temperature: float = 0.7,
+                              top_p: float = 0.95, model_name: Optional[str] = None,
+                              options: Optional[Dict[str, Any]] = None,
+                              priority: int = PRIORITY_INTERACTIVE,
+                              system: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a response from the model as it is generated
+        
+        Args:
+            query: The user query
+            context: Optional context from vector database retrieval
+            max_tokens: Maximum number of tokens to generate
+            temperature: Temperature for sampling
+            top_p: Top-p for nucleus sampling
+            model_name: Model to use instead of the default model
+            options: Extra Ollama options, such as num_ctx, seed or stop
+            priority: Scheduling priority class (PRIORITY_INTERACTIVE or PRIORITY_BATCH)
+            system: System prompt; when given, `query` is sent as the complete
+                prompt instead of being wrapped in the context template
+            
+        Yields:
+            The decoded NDJSON objects from Ollama. Intermediate objects carry a
+            `response` token; the last one has `done` set and the usage stats.
+        """
+        payload = self._build_generate_payload(query, context, max_tokens, temperature, top_p, stream=True,
+                                               model_name=model_name, options=options, system=system)
         
+        self.breaker.check()
+        queued = time.perf_counter()
+        # Not made the current span, as an async generator runs in its consumer's context
+        span = tracing.start_span("ollama.stream", model=payload["model"])
         try:
-            response = requests.post(self.generate_endpoint, json=payload)
-            if response.status_code == 200:
-                result = response.json()
-                return result.get("response", "").strip()
-            else:
-                error_msg = f"Error: Ollama API returned status code {response.status_code}"
+            async with self.scheduler.slot(payload["model"], priority):
+                span.set(queue_ms=(time.perf_counter() - queued) * 1000)
+                started = time.perf_counter()
+                request = self.get_client().build_request("POST", self.generate_endpoint, json=payload)
+                with tracing.use_span(span):
+                    response = await self._send(request, stream=True)
                 try:
-                    error_details = response.json()
-                    error_msg += f", {error_details.get('error', '')}"
-                except:
-                    pass
-                raise Exception(error_msg)
+                    if response.status_code != 200:
+                        body = await response.aread()
+                        error_msg = f"Error: Ollama API returned status code {response.status_code}"
+                        try:
+                            error_msg += f", {json.loads(body).get('error', '')}"
+                        except ValueError:
+                            pass
+                        raise Exception(f"Failed to stream response: {error_msg}")
+                    
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise Exception(f"Failed to stream response: {chunk['error']}")
+                        if chunk.get("done"):
+                            metrics.observe_ollama(payload["model"], time.perf_counter() - started, chunk)
+                            span.set(**usage_attributes(chunk))
+                            yield chunk
+                            break
+                        yield chunk
+                except httpx.TransportError:
+                    # The connection broke or hung mid-stream
+                    self.breaker.record_failure()
+                    raise
+                finally:
+                    await response.aclose()
         except Exception as e:
-            raise Exception(f"Failed to generate response: {str(e)}")
+            span.end(e)
+            raise
+        finally:
+            span.end()
     
-    def generate_rag_response(self, query: str, documents: List[str], 
-                             max_tokens: int = 512, temperature: float = 0.7) -> str:
+    async def generate_rag_response(self, query: str, documents: List[str], 
+                                   max_tokens: int = 512, temperature: float = 0.7) -> str:
         """
         Generate a response using retrieved documents as context
         
@@ -99,12 +322,13 @@ class OllamaService:
         # Format the context from retrieved documents
         if documents and len(documents) > 0:
             context = "\n\n".join([doc for doc in documents])
-            return self.generate_response(query, context, max_tokens, temperature)
+            return await self.generate_response(query, context, max_tokens, temperature)
         else:
-            return self.generate_response(query, None, max_tokens, temperature)
+            return await self.generate_response(query, None, max_tokens, temperature)
             
-    def chat(self, messages: List[Dict[str, str]], 
-            max_tokens: int = 512, temperature: float = 0.7) -> str:
+    async def chat(self, messages: List[Dict[str, str]], 
+                  max_tokens: int = 512, temperature: float = 0.7,
+                  model_name: Optional[str] = None) -> str:
         """
         Generate a chat response using Ollama's chat API
         
@@ -112,36 +336,40 @@ class OllamaService:
             messages: List of message dictionaries with 'role' and 'content' keys
             max_tokens: Maximum number of tokens to generate
             temperature: Temperature for sampling
+            model_name: Model to use instead of the default model
             
         Returns:
             The generated response text
         """
         # Prepare the request payload
+        model_name = model_name or self.model_name
         payload = {
-            "model": self.model_name,
+            "model": model_name,
             "messages": messages,
             "stream": False,
+            "keep_alive": self.registry.keep_alive_for(model_name),
             "options": {
                 "temperature": temperature,
-                "num_predict": max_tokens
+                "num_predict": max_tokens,
+                "num_ctx": self.registry.get(model_name).context_window
             }
         }
         
-        try:
-            response = requests.post(self.chat_endpoint, json=payload)
-            if response.status_code == 200:
-                result = response.json()
-                return result.get("message", {}).get("content", "").strip()
-            else:
-                error_msg = f"Error: Ollama API returned status code {response.status_code}"
+        self.breaker.check()
+        queued = time.perf_counter()
+        with tracing.span("ollama.chat", model=payload["model"]) as span:
+            async with self.scheduler.slot(payload["model"]):
+                span.set(queue_ms=(time.perf_counter() - queued) * 1000)
                 try:
-                    error_details = response.json()
-                    error_msg += f", {error_details.get('error', '')}"
-                except:
-                    pass
-                raise Exception(error_msg)
-        except Exception as e:
-            raise Exception(f"Failed to generate chat response: {str(e)}")
+                    started = time.perf_counter()
+                    result = await self._post(self.chat_endpoint, payload)
+                    metrics.observe_ollama(payload["model"], time.perf_counter() - started, result)
+                    span.set(**usage_attributes(result))
+                    return result.get("message", {}).get("content", "").strip()
+                except BackendUnavailable:
+                    raise
+                except Exception as e:
+                    raise Exception(f"Failed to generate chat response: {str(e)}")
 
 # Create a singleton instance
-ollama_service = OllamaService() 
\ No newline at end of file
+ollama_service = OllamaService()
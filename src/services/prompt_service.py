@@ -0,0 +1,161 @@
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from src.core.config import settings
+from src.services.chunking import TOKEN_PATTERN
+from src.services.model_registry import ModelRegistry, model_registry
+
+logger = logging.getLogger(__name__)
+
+# Sent as Ollama's system prompt, identical on every call so the model's
+# KV cache for it can be reused
+SYSTEM_PROMPT = (
+    "You are a helpful assistant. Answer the user's question based on the provided context. "
+    "Be concise and accurate. If the context doesn't contain the information needed, say so."
+)
+
+# Tokens generated when a request sets no max_tokens, as in OllamaService
+DEFAULT_MAX_TOKENS = 512
+
+# Words per shingle when comparing chunks for near-duplicates
+SHINGLE_SIZE = 8
+
+# A chunk that does not fit is only truncated into an empty prompt if this many tokens fit
+MIN_TRUNCATED_TOKENS = 32
+
+def count_tokens(text: str) -> int:
+    """Approximate token count, the same estimate the chunker uses"""
+    return sum(1 for _ in TOKEN_PATTERN.finditer(text))
+
+def shingles(text: str) -> Set[int]:
+    """Hashes of the overlapping word windows of a text"""
+    words = TOKEN_PATTERN.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+class PackedPrompt:
+    """A prompt with the context documents that made it in"""
+
+    def __init__(self, prompt: str, context: List[Dict[str, Any]], tokens: int, budget: int,
+                 duplicates: int, dropped: int):
+        self.prompt = prompt
+        self.context = context
+        self.tokens = tokens
+        self.budget = budget
+        self.duplicates = duplicates
+        self.dropped = dropped
+
+class PromptBuilder:
+    """
+    Assembles the prompt for a question and its retrieved documents
+
+    The system prompt is sent separately and never changes, and the prompt
+    puts the documents before the question, so consecutive calls share the
+    longest possible token prefix and Ollama can reuse its cached evaluation
+    of it. Documents are packed in rank order into the model's context
+    window, less the system prompt, the question, the tokens to generate and
+    a safety margin. Near-duplicates of documents already packed, such as
+    the same passage ingested twice, are skipped. A document that does not
+    fit is skipped in favour of smaller lower-ranked ones, unless nothing has
+    been packed yet, in which case it is truncated. In a conversation, the
+    summary and the newest turns that fit half the budget go first.
+    """
+
+    def __init__(self, registry: ModelRegistry, reserved_tokens: int = 128, dedup_threshold: float = 0.8,
+                 system_prompt: str = SYSTEM_PROMPT):
+        self.registry = registry
+        self.reserved_tokens = reserved_tokens
+        self.dedup_threshold = dedup_threshold
+        self.system_prompt = system_prompt
+        self.system_tokens = count_tokens(system_prompt)
+
+    def budget(self, model_name: Optional[str] = None, max_tokens: Optional[int] = None) -> int:
+        """Tokens available to the prompt of a model"""
+        window = self.registry.get(model_name).context_window
+        return window - self.system_tokens - (max_tokens or DEFAULT_MAX_TOKENS) - self.reserved_tokens
+
+    @staticmethod
+    def format_document(number: int, document: Dict[str, Any]) -> str:
+        source = (document.get("metadata") or {}).get("source", "unknown")
+        return f"[{number}] Source: {source}\n{document['content']}"
+
+    @staticmethod
+    def format_conversation(history: List[Dict[str, str]], summary: str = "") -> str:
+        lines = [f"Summary: {summary}"] if summary else []
+        lines += [f"{turn['role'].capitalize()}: {turn['content']}" for turn in history]
+        return "Conversation so far:\n" + "\n".join(lines)
+
+    def build(self, query: str, context: List[Dict[str, Any]], model_name: Optional[str] = None,
+              max_tokens: Optional[int] = None, history: Optional[List[Dict[str, str]]] = None,
+              summary: str = "") -> PackedPrompt:
+        """
+        Pack retrieved documents and a question into a prompt
+
+        Args:
+            query: The question
+            context: Retrieved {"content", "metadata"} documents, best first
+            model_name: The model the prompt is for
+            max_tokens: Tokens the model may generate
+            history: Earlier {"role", "content"} turns of the conversation, oldest first
+            summary: Summary of turns older than the history
+
+        Returns:
+            The prompt, and the documents it contains in the order they appear
+        """
+        question = f"Question: {query}\n\nAnswer:"
+        budget = self.budget(model_name, max_tokens)
+        remaining = budget - count_tokens(question) - count_tokens("Context:")
+
+        conversation = ""
+        if history or summary:
+            # Drop the oldest turns until the conversation fits half the budget
+            history = list(history or [])
+            conversation = self.format_conversation(history, summary)
+            while history and count_tokens(conversation) > remaining // 2:
+                history.pop(0)
+                conversation = self.format_conversation(history, summary)
+            if count_tokens(conversation) > remaining // 2:
+                conversation = ""
+            remaining -= count_tokens(conversation)
+
+        packed, blocks = [], []
+        seen: Set[int] = set()
+        duplicates = dropped = 0
+        for document in context:
+            document_shingles = shingles(document["content"])
+            if document_shingles and len(document_shingles & seen) >= self.dedup_threshold * len(document_shingles):
+                duplicates += 1
+                continue
+            block = self.format_document(len(packed) + 1, document)
+            tokens = count_tokens(block)
+            if tokens > remaining:
+                if packed or remaining < MIN_TRUNCATED_TOKENS:
+                    dropped += 1
+                    continue
+                # Keep as much of the best document as fits rather than nothing
+                header = count_tokens(self.format_document(1, {**document, "content": ""}))
+                words = list(TOKEN_PATTERN.finditer(document["content"]))
+                end = words[max(0, remaining - header) - 1].end() if remaining > header else 0
+                document = {**document, "content": document["content"][:end]}
+                block = self.format_document(1, document)
+                tokens = count_tokens(block)
+            packed.append(document)
+            blocks.append(block)
+            seen |= document_shingles
+            remaining -= tokens
+
+        if dropped:
+            logger.debug(f"Dropped {dropped} documents that did not fit the {budget} token prompt budget")
+        body = "\n\n".join(blocks) if blocks else "No context available."
+        prompt = f"Context:\n{body}\n\n{question}"
+        if conversation:
+            prompt = f"{conversation}\n\n{prompt}"
+        return PackedPrompt(prompt, packed, count_tokens(prompt), budget, duplicates, dropped)
+
+# Create a singleton instance
+prompt_builder = PromptBuilder(
+    model_registry,
+    reserved_tokens=settings.PROMPT_RESERVED_TOKENS,
+    dedup_threshold=settings.PROMPT_DEDUP_THRESHOLD
+)
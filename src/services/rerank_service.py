@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Scorer = Callable[[List[Tuple[str, str]]], np.ndarray]
+
+class RerankService:
+    """
+    Reorders retrieved documents by cross-encoder relevance
+
+    The cross-encoder reads the query and a document together, which ranks
+    far better than comparing separately computed embeddings but costs one
+    model call per pair. Pairs are scored in batches on the CPU, one batch at
+    a time, and scores are kept in an LRU cache keyed by (query hash,
+    document id). Reranking is skipped, keeping the retrieval order, when the
+    pairs still to score would not finish within the latency budget, judged
+    from the measured time per pair, or when the budget runs out part way.
+    """
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size: int = 32,
+                 cache_size: int = 16384, latency_budget_ms: float = 300, scorer: Optional[Scorer] = None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.latency_budget = latency_budget_ms / 1000
+        self._scorer = scorer
+        self._load_lock = threading.Lock()
+        # One batch at a time; the model already uses every core
+        self._score_lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[bytes, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._seconds_per_pair: Optional[float] = None
+        self._counters = {"reranked": 0, "skipped": 0, "pairs_scored": 0, "cache_hits": 0}
+        self.available = True
+
+    def load(self) -> bool:
+        """Load the cross-encoder; returns whether reranking is available"""
+        with self._load_lock:
+            if self._scorer is None and self.available:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    model = CrossEncoder(self.model_name, device="cpu")
+                    self._scorer = lambda pairs: np.asarray(
+                        model.predict(pairs, batch_size=self.batch_size, convert_to_numpy=True),
+                        dtype=np.float32
+                    )
+                    logger.info(f"Loaded rerank model {self.model_name}")
+                except Exception as e:
+                    logger.warning(f"Reranking is disabled, could not load {self.model_name}: {e}")
+                    self.available = False
+            return self.available
+
+    @staticmethod
+    def _document_key(document: Dict[str, Any]) -> str:
+        return document.get("id") or hashlib.sha256(document["content"].encode("utf-8")).hexdigest()
+
+    def _skip(self, documents: Sequence[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        with self._cache_lock:
+            self._counters["skipped"] += 1
+        return list(documents[:top_k])
+
+    def rerank(self, query: str, documents: Sequence[Dict[str, Any]], top_k: int,
+               latency_budget: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Get the top_k documents by cross-encoder score
+
+        Args:
+            query: The query
+            documents: Retrieved documents, best first, with an "id" and "content"
+            top_k: Number of documents to return
+            latency_budget: Seconds allowed for scoring (default: the service's budget)
+
+        Returns:
+            The top_k documents, reranked if it could be done within the budget,
+            otherwise in their original order
+        """
+        if len(documents) <= 1 or not self.load():
+            return list(documents[:top_k])
+        started = time.monotonic()
+        deadline = started + (self.latency_budget if latency_budget is None else latency_budget)
+        query_key = hashlib.sha256(query.encode("utf-8")).digest()
+        keys = [(query_key, self._document_key(document)) for document in documents]
+
+        scores: List[Optional[float]] = []
+        with self._cache_lock:
+            for key in keys:
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                    self._counters["cache_hits"] += 1
+                scores.append(score)
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        if missing and self._seconds_per_pair is not None \
+                and started + len(missing) * self._seconds_per_pair > deadline:
+            return self._skip(documents, top_k)
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            with self._score_lock:
+                if time.monotonic() > deadline:
+                    return self._skip(documents, top_k)
+                batch_started = time.monotonic()
+                batch_scores = self._scorer([(query, documents[i]["content"]) for i in batch])
+                per_pair = (time.monotonic() - batch_started) / len(batch)
+            self._seconds_per_pair = per_pair if self._seconds_per_pair is None \
+                else 0.8 * self._seconds_per_pair + 0.2 * per_pair
+            with self._cache_lock:
+                self._counters["pairs_scored"] += len(batch)
+                for i, score in zip(batch, batch_scores):
+                    scores[i] = float(score)
+                    self._cache[keys[i]] = scores[i]
+                    self._cache.move_to_end(keys[i])
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        with self._cache_lock:
+            self._counters["reranked"] += 1
+        # Stable sort, so ties keep their retrieval order
+        order = sorted(range(len(documents)), key=lambda i: -scores[i])
+        return [documents[i] for i in order[:top_k]]
+
+    def stats(self) -> Dict[str, Any]:
+        """Rerank, skip and cache counters"""
+        with self._cache_lock:
+            return {
+                **self._counters,
+                "cache_entries": len(self._cache),
+                "seconds_per_pair": self._seconds_per_pair,
+                "available": self.available,
+            }
+
+# Create a singleton instance
+rerank_service = RerankService(
+    model_name=settings.RERANK_MODEL,
+    batch_size=settings.RERANK_BATCH_SIZE,
+    cache_size=settings.RERANK_CACHE_SIZE,
+    latency_budget_ms=settings.RERANK_LATENCY_BUDGET_MS
+)
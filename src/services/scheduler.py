@@ -0,0 +1,180 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from src.core.config import settings
+from src.services.model_registry import ModelRegistry, ModelState, model_registry
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "batch": PRIORITY_BATCH}
+
+class SchedulerRejected(Exception):
+    """Raised when a request is shed because a model's queue is full or its wait deadline passed"""
+
+    def __init__(self, model_name: str, reason: str, retry_after: int):
+        super().__init__(f"Model '{model_name}' is overloaded ({reason}), retry after {retry_after}s")
+        self.model_name = model_name
+        self.reason = reason
+        self.retry_after = retry_after
+
+class ModelQueue:
+    """Waiting requests and admission counters of one model"""
+
+    def __init__(self, state: ModelState):
+        self.state = state
+        # Heap of [priority, sequence, future]
+        self.waiters: List[List[Any]] = []
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.service_seconds: Optional[float] = None
+
+class LLMScheduler:
+    """
+    Admission control in front of Ollama
+
+    Each model runs at most its registry concurrency limit of requests at
+    once. Further requests wait in a bounded per-model queue, served by
+    priority class and then arrival order. A request is rejected right away
+    when the queue is full, and rejected if it has not started before its
+    deadline, so overload turns into fast 429s instead of unbounded latency.
+    Queues exist only for models the registry tracks; once the registry
+    forgets an unconfigured model, its idle queue is dropped too.
+    """
+
+    def __init__(self, registry: ModelRegistry, max_queue: int = 64, queue_timeout: float = 30):
+        self.registry = registry
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._queues: Dict[str, ModelQueue] = {}
+        self._sequence = itertools.count()
+
+    def _queue(self, model_name: Optional[str]) -> ModelQueue:
+        state = self.registry.get(model_name)
+        queue = self._queues.get(state.name)
+        if queue is None or queue.state is not state:
+            self._forget_idle()
+            queue = self._queues[state.name] = ModelQueue(state)
+        return queue
+
+    def _forget_idle(self):
+        """Drop the idle queues of models the registry has forgotten"""
+        for name, queue in list(self._queues.items()):
+            if queue.state.in_flight == 0 and not queue.waiters and self.registry.find(name) is not queue.state:
+                del self._queues[name]
+
+    def retry_after(self, queue: ModelQueue) -> int:
+        """Seconds until a slot is likely to free up, estimated from recent service times"""
+        service_seconds = queue.service_seconds or 1.0
+        backlog = len(queue.waiters) + 1
+        return max(1, math.ceil(service_seconds * backlog / queue.state.max_concurrency))
+
+    def _reject(self, queue: ModelQueue, reason: str) -> SchedulerRejected:
+        logger.warning(f"Rejected a request for {queue.state.name}: {reason}")
+        return SchedulerRejected(queue.state.name, reason, self.retry_after(queue))
+
+    async def acquire(self, model_name: Optional[str] = None, priority: int = PRIORITY_INTERACTIVE,
+                      timeout: Optional[float] = None) -> ModelQueue:
+        """
+        Wait for a slot of a model
+
+        Raises:
+            SchedulerRejected: If the queue is full or the deadline passes first
+        """
+        queue = self._queue(model_name)
+        state = queue.state
+        if state.in_flight < state.max_concurrency and not queue.waiters:
+            state.in_flight += 1
+            queue.admitted += 1
+            return queue
+        if len(queue.waiters) >= self.max_queue:
+            queue.rejected += 1
+            raise self._reject(queue, "queue full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._sequence), future]
+        heapq.heappush(queue.waiters, entry)
+        started = time.monotonic()
+        try:
+            await asyncio.wait({future}, timeout=self.queue_timeout if timeout is None else timeout)
+        except asyncio.CancelledError:
+            if future.done():
+                # The slot was handed over just as the caller went away
+                self.release(queue)
+            else:
+                self._forget(queue, entry)
+            raise
+        queue.wait_seconds += time.monotonic() - started
+        if not future.done():
+            self._forget(queue, entry)
+            queue.timeouts += 1
+            raise self._reject(queue, "queue timeout")
+        queue.admitted += 1
+        return queue
+
+    def _forget(self, queue: ModelQueue, entry: List[Any]):
+        queue.waiters.remove(entry)
+        heapq.heapify(queue.waiters)
+        entry[2].cancel()
+
+    def release(self, queue: ModelQueue, held_for: Optional[float] = None):
+        """Give a slot back, handing it straight to the next waiter if there is one"""
+        if held_for is not None:
+            if queue.service_seconds is None:
+                queue.service_seconds = held_for
+            else:
+                queue.service_seconds = 0.8 * queue.service_seconds + 0.2 * held_for
+        while queue.waiters:
+            _, _, future = heapq.heappop(queue.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        queue.state.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, model_name: Optional[str] = None, priority: int = PRIORITY_INTERACTIVE,
+                   timeout: Optional[float] = None) -> AsyncIterator[ModelState]:
+        """Hold one of a model's slots for the duration of the block"""
+        queue = await self.acquire(model_name, priority, timeout)
+        state = queue.state
+        state.requests += 1
+        started = time.monotonic()
+        try:
+            yield state
+        except Exception:
+            state.failures += 1
+            raise
+        finally:
+            state.last_used = time.time()
+            self.release(queue, time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth, wait time and rejection counters per model"""
+        return {
+            name: {
+                "queue_depth": len(queue.waiters),
+                "admitted": queue.admitted,
+                "rejected": queue.rejected,
+                "timeouts": queue.timeouts,
+                "wait_seconds_total": round(queue.wait_seconds, 6),
+                "avg_service_seconds": round(queue.service_seconds, 6) if queue.service_seconds is not None else None,
+            }
+            for name, queue in self._queues.items()
+        }
+
+# Create a singleton instance
+llm_scheduler = LLMScheduler(
+    model_registry,
+    max_queue=settings.SCHEDULER_MAX_QUEUE,
+    queue_timeout=settings.SCHEDULER_QUEUE_TIMEOUT
+)
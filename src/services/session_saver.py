@@ -0,0 +1,266 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP, BaseCheckpointSaver, CheckpointTuple, get_checkpoint_id, get_checkpoint_metadata, writes_sort_key
+)
+from langgraph.checkpoint.memory import InMemorySaver
+
+# Expire idle sessions once every this many checkpoints rather than on every one
+EXPIRE_EVERY = 64
+
+class SessionSaver(InMemorySaver):
+    """
+    In-memory LangGraph checkpointer that keeps only each session's latest checkpoint
+
+    A conversation only ever resumes from its latest state, so older
+    checkpoints, their pending writes and superseded channel values are
+    dropped as soon as a newer checkpoint is saved. The keys of every session
+    are indexed, so deleting a session does not scan the others.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # Thread id -> (checkpoint namespace, channel) -> version of its stored value
+        self._versions: Dict[str, Dict[Tuple[str, str], Any]] = defaultdict(dict)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        for checkpoint_id in [key for key in checkpoints if key != checkpoint["id"]]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        versions = self._versions[thread_id]
+        for channel, version in new_versions.items():
+            previous = versions.get((checkpoint_ns, channel))
+            if previous is not None and previous != version:
+                self.blobs.pop((thread_id, checkpoint_ns, channel, previous), None)
+            versions[(checkpoint_ns, channel)] = version
+        return saved
+
+    def has_thread(self, thread_id: str) -> bool:
+        return thread_id in self.storage
+
+    def evict_thread(self, thread_id: str) -> None:
+        """Drop a session this process no longer tracks"""
+        self.delete_thread(thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        for checkpoint_ns, checkpoints in self.storage.pop(thread_id, {}).items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        for (checkpoint_ns, channel), version in self._versions.pop(thread_id, {}).items():
+            self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+
+class SqliteSessionSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer keeping each session's latest checkpoint in SQLite
+
+    Used when several worker processes serve the API, so that any of them can
+    continue a conversation. Like SessionSaver it keeps only the latest
+    checkpoint of a session and its pending writes. Sessions expire here
+    rather than in the processes tracking them: a session not saved for ttl
+    seconds is no longer returned, and every EXPIRE_EVERY saves the idle ones
+    are deleted, along with the least recently saved ones beyond max_sessions.
+    """
+
+    def __init__(self, db_path: str, ttl: float = 1800, max_sessions: int = 10000):
+        super().__init__()
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Get this process's SQLite connection, creating the tables on first use"""
+        # A connection must not be used by a forked child, open a new one there
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS session_checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    checkpoint_id TEXT NOT NULL,
+                    parent_id TEXT,
+                    type TEXT NOT NULL,
+                    checkpoint BLOB NOT NULL,
+                    metadata_type TEXT NOT NULL,
+                    metadata BLOB NOT NULL,
+                    saved_at REAL NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns)
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS session_checkpoints_lru ON session_checkpoints (saved_at)")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS session_writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    task_path TEXT NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                )"""
+            )
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get_tuple(self, config) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            conn = self.get_connection()
+            row = conn.execute(
+                "SELECT checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata FROM session_checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND saved_at > ?",
+                (thread_id, checkpoint_ns, time.time() - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+            wanted = get_checkpoint_id(config)
+            if wanted and wanted != checkpoint_id:
+                return None
+            writes = conn.execute(
+                "SELECT task_id, channel, type, value, task_path, idx FROM session_writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id)
+            ).fetchall()
+
+        writes.sort(key=lambda write: writes_sort_key(write[4], write[0], write[5]))
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=self.serde.loads_typed((checkpoint_type, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((value_type, value)))
+                            for task_id, channel, value_type, value, _, _ in writes],
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+        )
+
+    def list(self, config, *, filter=None, before=None, limit=None) -> Iterator[CheckpointTuple]:
+        """Only the latest checkpoint is kept, so at most one is listed"""
+        if config is None or limit == 0:
+            return
+        latest = self.get_tuple(config)
+        if latest is None:
+            return
+        if before is not None and get_checkpoint_id(before) and latest.config["configurable"]["checkpoint_id"] >= get_checkpoint_id(before):
+            return
+        if filter and any(latest.metadata.get(key) != value for key, value in filter.items()):
+            return
+        yield latest
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        now = time.time()
+        with self._lock:
+            conn = self.get_connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO session_checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 checkpoint_type, sqlite3.Binary(checkpoint_blob), metadata_type, sqlite3.Binary(metadata_blob), now)
+            )
+            # Writes pending on older checkpoints are never replayed
+            conn.execute(
+                "DELETE FROM session_writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                (thread_id, checkpoint_ns, checkpoint["id"])
+            )
+            self._puts += 1
+            if self._puts % EXPIRE_EVERY == 0:
+                self._expire(conn, now)
+            conn.commit()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for index, (channel, value) in enumerate(writes):
+            value_type, value_blob = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, index),
+                         channel, value_type, sqlite3.Binary(value_blob), task_path))
+        # Like InMemorySaver, special writes (negative index) overwrite and regular ones are kept
+        with self._lock:
+            conn = self.get_connection()
+            conn.executemany("INSERT OR REPLACE INTO session_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             [row for row in rows if row[4] < 0])
+            conn.executemany("INSERT OR IGNORE INTO session_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             [row for row in rows if row[4] >= 0])
+            conn.commit()
+
+    def _expire(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM session_checkpoints WHERE saved_at <= ?", (now - self.ttl,))
+        (count,) = conn.execute("SELECT COUNT(DISTINCT thread_id) FROM session_checkpoints").fetchone()
+        if count > self.max_sessions:
+            conn.execute(
+                "DELETE FROM session_checkpoints WHERE thread_id IN "
+                "(SELECT thread_id FROM session_checkpoints GROUP BY thread_id ORDER BY MAX(saved_at) LIMIT ?)",
+                (count - self.max_sessions,)
+            )
+        conn.execute(
+            "DELETE FROM session_writes WHERE NOT EXISTS (SELECT 1 FROM session_checkpoints c "
+            "WHERE c.thread_id = session_writes.thread_id AND c.checkpoint_ns = session_writes.checkpoint_ns)"
+        )
+
+    def has_thread(self, thread_id: str) -> bool:
+        with self._lock:
+            row = self.get_connection().execute(
+                "SELECT 1 FROM session_checkpoints WHERE thread_id = ? AND saved_at > ?",
+                (thread_id, time.time() - self.ttl)
+            ).fetchone()
+        return row is not None
+
+    def evict_thread(self, thread_id: str) -> None:
+        """Other processes may still be using the session, so it is left to expire here"""
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            conn = self.get_connection()
+            conn.execute("DELETE FROM session_checkpoints WHERE thread_id = ?", (thread_id,))
+            conn.execute("DELETE FROM session_writes WHERE thread_id = ?", (thread_id,))
+            conn.commit()
+
+    # SQLite calls block, so the async API runs them in a worker thread
+    async def aget_tuple(self, config) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id: str, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
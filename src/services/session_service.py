@@ -0,0 +1,121 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+
+from src.core.config import settings
+
+if TYPE_CHECKING:
+    from src.services.session_saver import SessionSaver, SqliteSessionSaver
+
+class SessionStore:
+    """
+    Conversation sessions and their LangGraph checkpoints
+
+    Sessions are kept in last-use order. A session idle for longer than the
+    TTL, or the least recently used one once there are more than
+    max_sessions, is deleted along with its checkpoint. Expired sessions are
+    evicted whenever a session is used, so eviction costs O(1) amortized and
+    needs no background task. Turns of the same session are serialized with a
+    per-session lock so concurrent requests cannot interleave its history.
+
+    When several worker processes serve the API, checkpoints are kept in the
+    shared-state database so any worker can continue a session. Each worker
+    then only tracks the sessions it served; expiring one there leaves its
+    checkpoint to expire in the database, where the last use of all workers
+    counts.
+    """
+
+    def __init__(self, ttl: float = 1800, max_sessions: int = 10000, saver: Optional[Union["SessionSaver", "SqliteSessionSaver"]] = None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._saver = saver
+        self._last_used: "OrderedDict[str, float]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._counters = {"created": 0, "expired": 0, "evicted": 0}
+
+    @property
+    def saver(self) -> Union["SessionSaver", "SqliteSessionSaver"]:
+        """The checkpointer, created on first use since LangGraph is slow to import"""
+        if self._saver is None:
+            if settings.SHARED_STATE_ENABLED:
+                from src.services.session_saver import SqliteSessionSaver
+                self._saver = SqliteSessionSaver(settings.SHARED_STATE_DB_PATH, self.ttl, self.max_sessions)
+            else:
+                from src.services.session_saver import SessionSaver
+                self._saver = SessionSaver()
+        return self._saver
+
+    @staticmethod
+    def config(session_id: str) -> Dict[str, Any]:
+        """LangGraph config that selects a session's checkpoint"""
+        return {"configurable": {"thread_id": session_id}}
+
+    def _evict(self, session_id: str, delete: bool = False):
+        self._last_used.pop(session_id, None)
+        self._locks.pop(session_id, None)
+        if self._saver is not None:
+            if delete:
+                self._saver.delete_thread(session_id)
+            else:
+                self._saver.evict_thread(session_id)
+
+    def touch(self, session_id: str) -> asyncio.Lock:
+        """
+        Mark a session as used, evicting idle sessions
+
+        Returns:
+            The session's lock; hold it for the whole turn
+        """
+        now = time.monotonic()
+        if session_id in self._last_used:
+            if now - self._last_used[session_id] > self.ttl:
+                # Too late to resume, or ended mid-turn: start over
+                self._evict(session_id, delete=self._last_used[session_id] == float("-inf"))
+                self._counters["expired"] += 1
+            else:
+                self._last_used.move_to_end(session_id)
+        if session_id not in self._last_used:
+            self._counters["created"] += 1
+        self._last_used[session_id] = now
+
+        for _ in range(len(self._last_used)):
+            oldest, last_used = next(iter(self._last_used.items()))
+            if oldest == session_id:
+                break
+            expired = now - last_used > self.ttl
+            if not expired and len(self._last_used) <= self.max_sessions:
+                break
+            if oldest in self._locks and self._locks[oldest].locked():
+                # Mid-turn; look at it again once the others are done
+                self._last_used.move_to_end(oldest)
+                continue
+            self._counters["expired" if expired else "evicted"] += 1
+            # Sessions ended mid-turn are deleted, not just evicted
+            self._evict(oldest, delete=last_used == float("-inf"))
+        return self._locks.setdefault(session_id, asyncio.Lock())
+
+    def exists(self, session_id: str) -> bool:
+        """Whether a session is live"""
+        last_used = self._last_used.get(session_id)
+        return last_used is not None and time.monotonic() - last_used <= self.ttl
+
+    def delete(self, session_id: str) -> bool:
+        """End a session; returns whether it existed"""
+        # Another worker may have served it
+        existed = self.exists(session_id) or self.saver.has_thread(session_id)
+        lock = self._locks.get(session_id)
+        if lock is not None and lock.locked():
+            # Its turn would save it again; expire it instead, to be evicted after the turn
+            self._last_used[session_id] = float("-inf")
+            self._last_used.move_to_end(session_id, last=False)
+        else:
+            self._evict(session_id, delete=True)
+        return existed
+
+    def stats(self) -> Dict[str, Any]:
+        """Live session count and eviction counters"""
+        return {**self._counters, "sessions": len(self._last_used), "ttl": self.ttl, "max_sessions": self.max_sessions}
+
+# Create a singleton instance
+session_store = SessionStore(ttl=settings.SESSION_TTL, max_sessions=settings.SESSION_MAX)
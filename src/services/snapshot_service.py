@@ -0,0 +1,180 @@
+import json
+import logging
+import time
+import zipfile
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.config import settings
+from src.db.chroma_client import ChromaDBClient, chroma_client
+from src.db.manifest_store import ManifestStore, manifest_store
+from src.services.cache_service import AnswerCache, answer_cache
+
+logger = logging.getLogger(__name__)
+
+# Version of the snapshot layout, bumped on incompatible changes
+SNAPSHOT_FORMAT = 1
+
+# Precisions vectors can be stored in
+SNAPSHOT_DTYPES = ("float16", "float32")
+
+MANIFEST_MEMBER = "snapshot.json"
+
+def embedding_model_name(client: ChromaDBClient) -> str:
+    """Name of the model that embeds a collection's documents, which decides whether vectors can be reused"""
+    if client.needs_embeddings:
+        return f"{settings.EMBEDDING_BACKEND}:{settings.EMBEDDING_MODEL}"
+    return "chroma:default"
+
+class SnapshotService:
+    """
+    Exports collections to snapshot files and loads them back without re-embedding
+
+    A snapshot is an .npz archive holding, for each page of documents, an
+    (n, dim) float16 or float32 `embeddings_NNNNNN` array and a
+    `records_NNNNNN.json` member with the page's ids, documents and metadata,
+    plus a `snapshot.json` manifest. The embedding arrays can be read with
+    numpy.load. Only one page is held in memory at a time, both ways.
+    """
+
+    def __init__(self, client: ChromaDBClient, manifests: ManifestStore, cache: AnswerCache):
+        self.client = client
+        self.manifests = manifests
+        self.cache = cache
+
+    def export_collection(self, collection_name: str, path: str, dtype: Optional[str] = None,
+                          page_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Write a collection's ids, documents, metadata and embeddings to a snapshot file
+
+        Args:
+            collection_name: The collection to export
+            path: Path of the snapshot file to write
+            dtype: "float16" or "float32" (default: SNAPSHOT_DTYPE)
+            page_size: Documents read from the vector store at a time (default: SNAPSHOT_PAGE_SIZE)
+
+        Returns:
+            The snapshot's manifest, with the export time
+        """
+        dtype = dtype or settings.SNAPSHOT_DTYPE
+        if dtype not in SNAPSHOT_DTYPES:
+            raise ValueError(f"Unsupported snapshot dtype '{dtype}', expected one of {SNAPSHOT_DTYPES}")
+        page_size = page_size or settings.SNAPSHOT_PAGE_SIZE
+
+        started = time.perf_counter()
+        count, pages, dim = 0, 0, None
+        with zipfile.ZipFile(path, "w", allowZip64=True) as archive:
+            for page in self.client.iter_records(collection_name, page_size):
+                embeddings = np.asarray(page["embeddings"], dtype=dtype)
+                if embeddings.ndim != 2 or len(embeddings) != len(page["ids"]):
+                    raise ValueError(f"Collection '{collection_name}' has documents without embeddings")
+                dim = embeddings.shape[1]
+                # Vectors barely compress, so only the records are deflated
+                with archive.open(f"embeddings_{pages:06d}.npy", "w", force_zip64=True) as member:
+                    np.save(member, embeddings)
+                archive.writestr(
+                    f"records_{pages:06d}.json",
+                    json.dumps({"ids": page["ids"], "documents": page["documents"], "metadatas": page["metadatas"]}),
+                    compress_type=zipfile.ZIP_DEFLATED
+                )
+                count += len(page["ids"])
+                pages += 1
+
+            manifest = {
+                "format": SNAPSHOT_FORMAT,
+                "collection": collection_name,
+                "count": count,
+                "pages": pages,
+                "dim": dim,
+                "dtype": dtype,
+                "embedding_model": embedding_model_name(self.client),
+                "created_at": time.time(),
+            }
+            archive.writestr(MANIFEST_MEMBER, json.dumps(manifest, indent=2))
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Exported {count} documents of {collection_name} to {path} in {elapsed:.2f}s")
+        return {**manifest, "elapsed_seconds": round(elapsed, 3)}
+
+    @staticmethod
+    def read_manifest(archive: zipfile.ZipFile) -> Dict[str, Any]:
+        """Read and check the manifest of an open snapshot"""
+        try:
+            manifest = json.loads(archive.read(MANIFEST_MEMBER))
+        except KeyError:
+            raise ValueError("Not a collection snapshot: it has no manifest")
+        if manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {manifest.get('format')}, expected {SNAPSHOT_FORMAT}")
+        return manifest
+
+    @staticmethod
+    def iter_pages(archive: zipfile.ZipFile, manifest: Dict[str, Any]) -> Iterator[Tuple[Dict[str, List[Any]], np.ndarray]]:
+        """Yield the (records, float32 embeddings) of every page of an open snapshot"""
+        for page in range(manifest["pages"]):
+            records = json.loads(archive.read(f"records_{page:06d}.json"))
+            with archive.open(f"embeddings_{page:06d}.npy") as member:
+                embeddings = np.load(member).astype(np.float32)
+            yield records, embeddings
+
+    def import_collection(self, path: str, collection_name: Optional[str] = None,
+                          force: bool = False) -> Dict[str, Any]:
+        """
+        Add the documents of a snapshot file to a collection, reusing their embeddings
+
+        The chunk manifest is updated as well, so uploading a file the
+        snapshot already holds finds its chunks unchanged.
+
+        Args:
+            path: Path of the snapshot file
+            collection_name: The collection to load into (default: the exported collection)
+            force: Load even if the snapshot was embedded with another model than the current one
+
+        Returns:
+            Counts of documents and pages loaded, and the import time
+        """
+        started = time.perf_counter()
+        with zipfile.ZipFile(path) as archive:
+            manifest = self.read_manifest(archive)
+            collection_name = collection_name or manifest["collection"]
+            model = embedding_model_name(self.client)
+            if manifest["embedding_model"] != model and not force:
+                raise ValueError(f"The snapshot was embedded with {manifest['embedding_model']}, but queries are "
+                                 f"embedded with {model}; its vectors would not match them")
+
+            count = 0
+            try:
+                for records, embeddings in self.iter_pages(archive, manifest):
+                    metadatas = records["metadatas"]
+                    self.client.add_documents(
+                        collection_name=collection_name,
+                        documents=records["documents"],
+                        ids=records["ids"],
+                        metadatas=metadatas,
+                        embeddings=embeddings.tolist()
+                    )
+                    # Record the chunks the way ingestion does, by source and chunk index
+                    chunks = defaultdict(list)
+                    for chunk_id, metadata in zip(records["ids"], metadatas):
+                        if metadata and "source" in metadata and "chunk" in metadata:
+                            chunks[metadata["source"]].append((chunk_id, metadata["chunk"]))
+                    for source, entries in chunks.items():
+                        self.manifests.add(collection_name, source, entries)
+                    count += len(records["ids"])
+            finally:
+                if count:
+                    self.cache.invalidate(collection_name)
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Imported {count} documents from {path} into {collection_name} in {elapsed:.2f}s")
+        return {
+            "collection": collection_name,
+            "documents_added": count,
+            "pages": manifest["pages"],
+            "dtype": manifest["dtype"],
+            "elapsed_seconds": round(elapsed, 3),
+        }
+
+# Create a singleton instance
+snapshot_service = SnapshotService(chroma_client, manifest_store, answer_cache)
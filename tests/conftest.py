@@ -9,4 +9,11 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 os.environ["CHROMA_HOST"] = "localhost"
 os.environ["CHROMA_PORT"] = "8000"
 os.environ["OLLAMA_HOST"] = "localhost"
-os.environ["OLLAMA_PORT"] = "11434" 
\ No newline at end of file
+os.environ["OLLAMA_PORT"] = "11434" 
+
+@pytest.fixture(autouse=True)
+def isolated_manifest(tmp_path, monkeypatch):
+    """Keep the chunk manifest of each test in its own temporary database"""
+    from src.db.manifest_store import manifest_store
+    monkeypatch.setattr(manifest_store, "db_path", str(tmp_path / "manifests.db"))
+    monkeypatch.setattr(manifest_store, "_conn", None)
@@ -0,0 +1,85 @@
+import sys
+import os
+import time
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.cache_service import AnswerCache
+
+ANSWER = {"answer": "Vector databases store embeddings.", "sources": []}
+
+def fake_embed(text):
+    """Tiny bag-of-letters embedding so the semantic tier can be tested offline"""
+    return [text.count(letter) for letter in "abcdefghijklmnopqrstuvwxyz"]
+
+def test_exact_hit_uses_normalized_query():
+    cache = AnswerCache()
+    cache.put("docs", "tinyllama:latest", "What are vector databases?", ANSWER)
+    assert cache.get("docs", "tinyllama:latest", "  what are   VECTOR databases ") == ANSWER
+    assert cache.get("docs", "llama3:latest", "What are vector databases?") is None
+    assert cache.get("other", "tinyllama:latest", "What are vector databases?") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+def test_ttl_expiry():
+    cache = AnswerCache(ttl=0.01)
+    cache.put("docs", "m", "q", ANSWER)
+    time.sleep(0.02)
+    assert cache.get("docs", "m", "q") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_lru_and_memory_budget():
+    cache = AnswerCache(max_entries=2)
+    cache.put("docs", "m", "first", ANSWER)
+    cache.put("docs", "m", "second", ANSWER)
+    cache.get("docs", "m", "first")
+    cache.put("docs", "m", "third", ANSWER)
+    assert cache.get("docs", "m", "second") is None
+    assert cache.get("docs", "m", "first") == ANSWER
+    assert cache.stats()["evictions"] == 1
+
+    small = AnswerCache(max_bytes=200)
+    for i in range(10):
+        small.put("docs", "m", f"question {i}", ANSWER)
+    assert small.stats()["bytes"] <= 200
+    assert small.stats()["entries"] < 10
+
+def test_invalidation_drops_collection_and_stale_puts():
+    cache = AnswerCache()
+    cache.put("docs", "m", "q", ANSWER)
+    cache.put("other", "m", "q", ANSWER)
+    generation = cache.generation("docs")
+    cache.invalidate("docs")
+    assert cache.get("docs", "m", "q") is None
+    assert cache.get("other", "m", "q") == ANSWER
+
+    # An answer computed before the invalidation must not be cached
+    cache.put("docs", "m", "q", ANSWER, generation=generation)
+    assert cache.get("docs", "m", "q") is None
+
+def test_semantic_tier():
+    cache = AnswerCache(semantic=True, semantic_max_distance=0.01, embed_fn=fake_embed)
+    cache.put("docs", "m", "what are vector databases", ANSWER)
+    assert cache.get("docs", "m", "what are databases vector") == ANSWER
+    assert cache.get("docs", "m", "how do I install ollama") is None
+    assert cache.stats()["semantic_hits"] == 1
+
+def test_invalidation_reaches_other_workers_through_the_shared_store(tmp_path):
+    from src.db.shared_store import SharedStore
+    path = str(tmp_path / "shared.db")
+    first = AnswerCache(shared=SharedStore(path))
+    second = AnswerCache(shared=SharedStore(path))
+    first.put("docs", "m", "q", ANSWER)
+    second.put("docs", "m", "q", ANSWER)
+    generation = second.generation("docs")
+
+    first.invalidate("docs")
+    assert second.generation("docs") == generation + 1
+    assert second.get("docs", "m", "q") is None
+    second.put("docs", "m", "q", ANSWER, generation=generation)
+    assert second.get("docs", "m", "q") is None
+
+    second.clear()
+    assert first.generation("docs") == generation + 2
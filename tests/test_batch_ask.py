@@ -0,0 +1,48 @@
+import sys
+import os
+import asyncio
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.config import settings
+from src.db.chroma_client import chroma_client
+from src.services.langgraph_service import LangGraphService
+from src.services.ollama_service import ollama_service
+
+def test_run_batch_groups_retrieval_and_bounds_generation(monkeypatch):
+    retrievals = []
+    in_flight = {"now": 0, "max": 0}
+
+    def fake_query_collection_batch(collection_name, query_texts, n_results, vector_weight, lexical_weight):
+        retrievals.append((collection_name, list(query_texts)))
+        return [[{"content": f"about {text}", "metadata": {"source": collection_name}}] for text in query_texts]
+
+    async def fake_generate_response(query, context=None, model_name=None, **kwargs):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        if "broken" in query:
+            raise Exception("model failed")
+        return f"{model_name} answer"
+
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(chroma_client, "query_collection_batch", fake_query_collection_batch)
+    monkeypatch.setattr(ollama_service, "generate_response", fake_generate_response)
+
+    items = [{"query": f"question {i}", "collection_name": "docs", "model_name": "small"} for i in range(6)]
+    items.append({"query": "broken question", "collection_name": "other", "model_name": "large"})
+
+    async def run():
+        return [result async for result in LangGraphService().run_batch(items, concurrency=2)]
+
+    results = asyncio.run(run())
+
+    assert sorted(result["index"] for result in results) == list(range(7))
+    assert sorted(retrievals) == [("docs", [f"question {i}" for i in range(6)]), ("other", ["broken question"])]
+    assert in_flight["max"] == 2
+    by_index = {result["index"]: result for result in results}
+    assert by_index[0]["answer"] == "small answer"
+    assert by_index[0]["sources"] == [{"content": "about question 0", "metadata": {"source": "docs"}}]
+    assert by_index[6]["error"] == "model failed"
@@ -0,0 +1,33 @@
+import sys
+import os
+
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import the src and scripts modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+from benchmark import compare, summarize
+from fake_ollama import create_app
+
+def test_fake_ollama_reports_ollama_timings():
+    client = TestClient(create_app(prompt_latency_ms=1, token_latency_ms=1, answer_tokens=8))
+    result = client.post("/api/generate", json={
+        "model": "m", "prompt": "question", "stream": False, "options": {"num_predict": 5}
+    }).json()
+
+    assert result["done"] and result["eval_count"] == 5
+    assert len(result["response"].split()) == 5
+    assert result["eval_duration"] == 5_000_000
+
+    lines = client.post("/api/generate", json={"model": "m", "prompt": "question"}).text.splitlines()
+    assert len(lines) == 9
+
+def test_baseline_comparison_is_signed_by_direction():
+    baseline = {"ask": {"requests_per_second": 10, "latency": summarize([1.0, 1.0])}}
+    report = {"ask": {"requests_per_second": 12, "latency": summarize([1.5, 1.5])}}
+
+    comparison = compare(report, baseline)
+    assert comparison["ask.requests_per_second"]["improvement"] == 0.2
+    assert comparison["ask.latency.p50"]["improvement"] == -0.5
+    assert "upload.chunks_per_second" not in comparison
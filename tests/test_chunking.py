@@ -0,0 +1,65 @@
+import sys
+import os
+import io
+
+import pytest
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.chunking import iter_chunks, iter_paragraphs, iter_text_blocks, TokenSizer
+
+def test_paragraphs_are_packed_up_to_chunk_size():
+    text = "\n\n".join(["a" * 40, "b" * 40, "c" * 40])
+    assert list(iter_chunks([text], chunk_size=90)) == ["a" * 40 + "\n\nb" * 1 + "b" * 39, "c" * 40]
+
+def test_streaming_matches_whole_text():
+    text = "\n\n".join(f"Paragraph {i} " + "word " * (i % 7) for i in range(200))
+    whole = list(iter_chunks([text], chunk_size=120))
+    # Feed the same text in awkward small blocks
+    blocks = [text[i:i + 7] for i in range(0, len(text), 7)]
+    assert list(iter_chunks(blocks, chunk_size=120)) == whole
+    assert all(len(chunk) <= 120 for chunk in whole)
+
+def test_oversized_paragraph_is_split_on_whitespace():
+    text = " ".join(["lorem"] * 100)
+    chunks = list(iter_chunks([text], chunk_size=50))
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+def test_chunk_overlap():
+    text = "\n\n".join(f"sentence number {i}" for i in range(20))
+    chunks = list(iter_chunks([text], chunk_size=60, chunk_overlap=10))
+    for previous, current in zip(chunks, chunks[1:]):
+        tail = previous[-10:].lstrip()
+        assert current.startswith(tail)
+
+def test_token_sizing():
+    sizer = TokenSizer()
+    text = "\n\n".join("one two three, four five." for _ in range(10))
+    chunks = list(iter_chunks([text], chunk_size=14, size_unit="tokens"))
+    assert all(sizer.length(chunk) <= 14 for chunk in chunks)
+    assert len(chunks) == 5
+
+def test_invalid_overlap():
+    with pytest.raises(ValueError):
+        list(iter_chunks(["text"], chunk_size=10, chunk_overlap=10))
+
+def test_text_blocks_decode_across_boundaries_and_tee():
+    data = "héllo\r\nwörld\r\n\r\nnext".encode("utf-8")
+    kept = io.BytesIO()
+    blocks = list(iter_text_blocks(io.BytesIO(data), tee=kept, block_size=3))
+    assert "".join(blocks) == "héllo\nwörld\n\nnext"
+    assert kept.getvalue() == data
+
+def test_paragraph_buffer_is_bounded():
+    blocks = ["x" * 10] * 100
+    paragraphs = list(iter_paragraphs(blocks, max_chars=64))
+    assert "".join(paragraphs) == "x" * 1000
+    assert max(len(p) for p in paragraphs) <= 64
+
+def test_chunk_text_matches_the_streaming_chunker():
+    from src.services.file_service import file_service
+    for text in ("hello world\n", "  short  ", "\n\n".join(["a" * 40, "b" * 40])):
+        streamed = list(iter_chunks(iter_text_blocks(io.BytesIO(text.encode())), chunk_size=100))
+        assert file_service.chunk_text(text, chunk_size=100) == streamed
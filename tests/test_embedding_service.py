@@ -0,0 +1,80 @@
+import sys
+import os
+import asyncio
+import threading
+
+import numpy as np
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.embedding_service import EmbeddingService
+
+class CountingEncoder:
+    """Fake model recording the size of every batch it is asked to encode"""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(len(texts))
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+def test_concurrent_requests_are_micro_batched():
+    encoder = CountingEncoder()
+    service = EmbeddingService(batch_window_ms=100, max_batch_size=64, encoder=encoder)
+    service.load()
+    results = {}
+    start = threading.Barrier(8)
+
+    def embed(i):
+        start.wait()
+        results[i] = service.embed_documents(["x" * i])
+
+    threads = [threading.Thread(target=embed, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results[i] == [[float(i), 1.0]] for i in range(8))
+    # One warm-up call, then far fewer batches than requests
+    assert encoder.batches[0] == 1
+    assert len(encoder.batches) - 1 < 8
+    assert sum(encoder.batches[1:]) == 8
+
+def test_query_embeddings_are_cached():
+    encoder = CountingEncoder()
+    service = EmbeddingService(batch_window_ms=0, cache_size=2, encoder=encoder)
+    assert service.embed_query("hello") == [5.0, 1.0]
+    assert service.embed_query("hello") == [5.0, 1.0]
+    assert asyncio.run(service.aembed_query("hello")) == [5.0, 1.0]
+    stats = service.stats()
+    assert stats["cache_hits"] == 2
+    assert stats["cache_misses"] == 1
+
+    service.embed_query("a")
+    service.embed_query("b")
+    assert service.stats()["cache_entries"] == 2
+
+def test_encoder_errors_reach_the_caller():
+    def broken(texts):
+        if texts != ["warm up"]:
+            raise RuntimeError("out of memory")
+        return np.zeros((1, 2), dtype=np.float32)
+
+    service = EmbeddingService(batch_window_ms=0, encoder=broken)
+    try:
+        service.embed_documents(["text"])
+        assert False, "expected an exception"
+    except RuntimeError as e:
+        assert str(e) == "out of memory"
+
+def test_hash_backend_needs_no_model():
+    service = EmbeddingService(backend="hash")
+    service.load()
+    vectors = np.array(service.embed_documents(["alpha beta", "alpha gamma", "delta"]))
+
+    assert vectors.shape == (3, 384)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1, atol=1e-5)
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
@@ -0,0 +1,157 @@
+import sys
+import os
+import importlib
+import io
+import tarfile
+import zipfile
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services import ingestion_service
+from src.services.ingestion_service import BulkIngestionService, iter_archive, spool_documents
+
+def make_documents(count):
+    return [(f"doc{i}.md", ("\n\n".join(f"Paragraph {j} of doc {i}." for j in range(5))).encode()) for i in range(count)]
+
+def test_ingest_batches_and_survives_failed_batch(monkeypatch):
+    calls = []
+
+    def fake_add_documents(collection_name, documents, ids, metadatas):
+        calls.append(len(documents))
+        if len(calls) == 2:
+            raise RuntimeError("chroma unavailable")
+
+    monkeypatch.setattr(ingestion_service.chroma_client, "add_documents", fake_add_documents)
+    service = BulkIngestionService()
+    # Small chunk size so every paragraph becomes its own chunk
+    report = service.ingest(make_documents(10), "docs", chunk_size=25, batch_size=8, workers=1)
+
+    assert report["files_processed"] == 10
+    assert sum(calls) == 50
+    assert max(calls) <= 8
+    assert report["failed_batches"] == 1
+    assert report["chunks_failed"] == calls[1]
+    assert report["chunks_added"] == 50 - calls[1]
+    assert report["errors"][0]["error"] == "chroma unavailable"
+    assert report["chunks_per_second"] > 0
+
+def test_ingest_with_process_pool(monkeypatch):
+    added = []
+    monkeypatch.setattr(
+        ingestion_service.chroma_client,
+        "add_documents",
+        lambda collection_name, documents, ids, metadatas: added.extend(metadatas)
+    )
+    service = BulkIngestionService()
+    try:
+        documents = make_documents(6) + [("broken.txt", b"\xff\xfe\xfa")]
+        report = service.ingest(documents, "docs", chunk_size=25, batch_size=4, workers=2)
+    finally:
+        service.shutdown()
+
+    assert report["files_processed"] == 6
+    assert report["files_failed"] == 1
+    assert len(added) == 30
+    assert {meta["source"] for meta in added} == {f"doc{i}.md" for i in range(6)}
+
+def test_iter_archive_filters_supported_files():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("notes/a.md", "alpha")
+        archive.writestr("notes/b.txt", "beta")
+        archive.writestr("image.png", "not text")
+    members = {name: stream.read() for name, stream in iter_archive("corpus.zip", buffer)}
+    assert members == {"notes/a.md": b"alpha", "notes/b.txt": b"beta"}
+
+def test_uploads_are_spooled_to_disk(tmp_path):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, content in (("../a.md", b"alpha"), ("image.png", b"not text")):
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    buffer.seek(0)
+
+    documents = list(spool_documents("corpus.tgz", buffer, str(tmp_path)))
+    documents += spool_documents("b.txt", io.BytesIO(b"beta"), str(tmp_path))
+    assert [source for source, _ in documents] == ["../a.md", "b.txt"]
+    for (_, path), content in zip(documents, (b"alpha", b"beta")):
+        assert os.path.dirname(path) == str(tmp_path)
+        with open(path, "rb") as f:
+            assert f.read() == content
+
+def test_reingestion_only_embeds_changed_chunks(monkeypatch):
+    added, updated, deleted = [], [], []
+    monkeypatch.setattr(ingestion_service.chroma_client, "add_documents",
+                        lambda collection_name, documents, ids, metadatas: added.extend(ids))
+    monkeypatch.setattr(ingestion_service.chroma_client, "update_metadatas",
+                        lambda collection_name, ids, metadatas: updated.extend(zip(ids, metadatas)))
+    monkeypatch.setattr(ingestion_service.chroma_client, "delete_documents",
+                        lambda collection_name, ids: deleted.extend(ids))
+    service = BulkIngestionService()
+
+    original = [("a.md", b"first\n\nsecond\n\nthird")]
+    report = service.ingest(original, "docs", chunk_size=10, workers=1)
+    assert report["chunks_added"] == 3
+    first_ids = list(added)
+
+    # Unchanged documents are a no-op
+    added.clear()
+    report = service.ingest(original, "docs", chunk_size=10, workers=1)
+    assert (report["chunks_added"], report["chunks_unchanged"], report["chunks_removed"]) == (0, 3, 0)
+    assert added == [] and deleted == [] and updated == []
+
+    # Prepend a chunk and drop one: only the new chunk is embedded
+    report = service.ingest([("a.md", b"zeroth\n\nfirst\n\nsecond")], "docs", chunk_size=10, workers=1)
+    assert (report["chunks_added"], report["chunks_unchanged"], report["chunks_removed"]) == (1, 2, 1)
+    assert len(added) == 1 and added[0] not in first_ids
+    assert deleted == [first_ids[2]]
+    assert [meta["chunk"] for _, meta in updated] == [1, 2]
+
+def test_stale_chunks_are_kept_until_the_new_ones_are_added(monkeypatch):
+    fail, deleted = [True], []
+
+    def fake_add_documents(collection_name, documents, ids, metadatas):
+        if fail[0]:
+            raise RuntimeError("chroma unavailable")
+
+    monkeypatch.setattr(ingestion_service.chroma_client, "add_documents", fake_add_documents)
+    monkeypatch.setattr(ingestion_service.chroma_client, "update_metadatas", lambda collection_name, ids, metadatas: None)
+    monkeypatch.setattr(ingestion_service.chroma_client, "delete_documents",
+                        lambda collection_name, ids: deleted.extend(ids))
+    service = BulkIngestionService()
+    fail[0] = False
+    service.ingest([("b.md", b"first\n\nsecond")], "docs", chunk_size=10, workers=1)
+
+    # The new chunk cannot be added, so the one it replaces stays
+    fail[0] = True
+    report = service.ingest([("b.md", b"first\n\nchanged")], "docs", chunk_size=10, workers=1)
+    assert (report["chunks_failed"], report["chunks_removed"]) == (1, 0)
+    assert deleted == []
+
+    fail[0] = False
+    report = service.ingest([("b.md", b"first\n\nchanged")], "docs", chunk_size=10, workers=1)
+    assert (report["chunks_added"], report["chunks_removed"]) == (1, 1)
+    assert len(deleted) == 1
+
+def test_bulk_and_single_uploads_produce_the_same_chunk_ids(monkeypatch):
+    file_service_module = importlib.import_module("src.services.file_service")
+    added = {}
+
+    def fake_add_documents(collection_name, documents, ids, metadatas):
+        added.setdefault(collection_name, []).extend(ids)
+
+    monkeypatch.setattr(ingestion_service.chroma_client, "add_documents", fake_add_documents)
+    monkeypatch.setattr(file_service_module.chroma_client, "add_documents", fake_add_documents)
+    content = b"hello world\r\n\r\n" + b"More text that spans a second chunk.\n"
+
+    file_service_module.file_service.ingest_stream(io.BytesIO(content), "same.md", "single", chunk_size=20)
+    BulkIngestionService().ingest([("same.md", content)], "bulk", chunk_size=20, workers=1)
+    assert added["single"] and added["bulk"] == added["single"]
+
+    # A document shorter than one chunk is stripped the same way by both paths
+    added.clear()
+    file_service_module.file_service.ingest_stream(io.BytesIO(b"hello world\n"), "small.md", "single", chunk_size=100)
+    BulkIngestionService().ingest([("small.md", b"hello world\n")], "bulk", chunk_size=100, workers=1)
+    assert len(added["single"]) == 1 and added["bulk"] == added["single"]
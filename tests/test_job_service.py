@@ -0,0 +1,129 @@
+import sys
+import os
+import io
+import time
+import asyncio
+
+import pytest
+
+from fastapi import UploadFile
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.config import settings
+from src.db.job_store import JobStore, JOB_COMPLETED, JOB_FAILED, JOB_QUEUED, JOB_RUNNING
+from src.services.job_service import JobService
+
+class FakeFileService:
+    """Stands in for FileService.process_path and reports progress in two batches"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.processed = []
+        self.options = {}
+
+    def process_path(self, file_path, source, collection_name, chunk_size, chunk_overlap=None, size_unit=None,
+                     progress=None):
+        self.options[source] = (chunk_size, chunk_overlap, size_unit)
+        with open(file_path) as f:
+            content = f.read()
+        if source == self.fail_on:
+            raise RuntimeError("embedding failed")
+        progress(0, 4)
+        progress(2, 4)
+        progress(4, 4)
+        self.processed.append((source, collection_name, content))
+        return 4
+
+def wait_for_state(service, job_id, states, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = service.get_job(job_id)
+        if job["state"] in states:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not reach {states}")
+
+def test_jobs_run_in_background_and_report_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_DIR", str(tmp_path / "jobs"))
+    files = FakeFileService(fail_on="bad.txt")
+    service = JobService(JobStore(str(tmp_path / "jobs.db")), files, workers=2)
+    service.start()
+    try:
+        good = asyncio.run(service.submit(UploadFile(io.BytesIO(b"hello"), filename="good.md"), "docs"))
+        bad = asyncio.run(service.submit(UploadFile(io.BytesIO(b"oops"), filename="bad.txt"), "docs"))
+        assert good["state"] == JOB_QUEUED
+
+        good = wait_for_state(service, good["id"], {JOB_COMPLETED})
+        bad = wait_for_state(service, bad["id"], {JOB_FAILED})
+    finally:
+        service.stop()
+
+    assert (good["chunks_done"], good["chunks_total"]) == (4, 4)
+    assert bad["error"] == "embedding failed"
+    assert files.processed == [("good.md", "docs", "hello")]
+    # Spooled uploads are removed once their job is done
+    assert not os.listdir(tmp_path / "jobs")
+
+def test_unfinished_jobs_survive_a_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_DIR", str(tmp_path / "jobs"))
+    db_path = str(tmp_path / "jobs.db")
+    files = FakeFileService()
+
+    # Submit without starting workers, then simulate a crash mid-job
+    service = JobService(JobStore(db_path), files)
+    job = asyncio.run(service.submit(UploadFile(io.BytesIO(b"persisted"), filename="a.txt"), "docs"))
+    service.store.update(job["id"], state=JOB_RUNNING, chunks_done=2)
+
+    restarted = JobService(JobStore(db_path), files)
+    restarted.start()
+    try:
+        job = wait_for_state(restarted, job["id"], {JOB_COMPLETED})
+    finally:
+        restarted.stop()
+    assert files.processed == [("a.txt", "docs", "persisted")]
+
+def test_only_jobs_of_dead_or_silent_workers_are_requeued(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    ids = []
+    for name in ("live.txt", "dead.txt", "silent.txt"):
+        job = store.create(f"job-{name}", name, "docs", 100, False, str(tmp_path / name))
+        assert store.claim(job["id"])
+        ids.append(job["id"])
+    live, dead, silent = ids
+    conn = store.get_connection()
+    conn.execute("UPDATE jobs SET owner_pid = ? WHERE id = ?", (1001, live))
+    conn.execute("UPDATE jobs SET owner_pid = ? WHERE id = ?", (1002, dead))
+    conn.execute("UPDATE jobs SET owner_pid = ?, heartbeat_at = ? WHERE id = ?", (1003, time.time() - 120, silent))
+    conn.commit()
+
+    requeued = store.requeue_abandoned(lambda pid: pid != 1002, stale_after=60)
+    assert sorted(requeued) == sorted([dead, silent])
+    assert store.get(live)["state"] == JOB_RUNNING
+    assert store.queued() == [dead, silent]
+    # A second sweep finds nothing left to requeue
+    assert store.requeue_abandoned(lambda pid: pid != 1002, stale_after=60) == []
+
+def test_jobs_keep_their_chunking_options(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP", 0)
+    files = FakeFileService()
+    service = JobService(JobStore(str(tmp_path / "jobs.db")), files)
+    with pytest.raises(ValueError):
+        asyncio.run(service.submit(UploadFile(io.BytesIO(b"x"), filename="a.md"), "docs", 100, size_unit="bytes"))
+
+    job = asyncio.run(service.submit(UploadFile(io.BytesIO(b"tokens"), filename="a.md"), "docs", 100,
+                                     chunk_overlap=10, size_unit="tokens"))
+    # Options a caller leaves out are resolved from the settings when the job is submitted
+    default = asyncio.run(service.submit(UploadFile(io.BytesIO(b"chars"), filename="b.md"), "docs", 100))
+    assert (job["chunk_overlap"], job["size_unit"]) == (10, "tokens")
+
+    monkeypatch.setattr(settings, "CHUNK_SIZE_UNIT", "tokens")
+    service.start()
+    try:
+        wait_for_state(service, job["id"], {JOB_COMPLETED})
+        wait_for_state(service, default["id"], {JOB_COMPLETED})
+    finally:
+        service.stop()
+    assert files.options == {"a.md": (100, 10, "tokens"), "b.md": (100, 0, "chars")}
@@ -0,0 +1,85 @@
+import sys
+import os
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.db.chroma_client import ChromaDBClient
+from src.db.lexical_index import CollectionIndex, LexicalIndex, reciprocal_rank_fusion, tokenize
+
+DOCUMENTS = {
+    "install": "Install the server with pip and start it with uvicorn.",
+    "errors": "Error ERR-4012 means the upload exceeded the size limit.",
+    "vectors": "Vector databases store embeddings and search them by similarity.",
+}
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("See ERR-4012 in app.config") == ["see", "err-4012", "err", "4012", "in", "app.config", "app", "config"]
+
+def test_bm25_ranks_exact_keyword_matches_first():
+    index = CollectionIndex()
+    index.add(list(DOCUMENTS), list(DOCUMENTS.values()))
+
+    assert index.search("what does err-4012 mean", 3)[0][0] == "errors"
+    assert [doc_id for doc_id, _ in index.search("embeddings similarity", 3)] == ["vectors"]
+    assert index.search("nothing matches", 3) == []
+
+def test_removed_and_replaced_documents():
+    index = CollectionIndex()
+    index.add(list(DOCUMENTS), list(DOCUMENTS.values()))
+    index.remove(["errors"])
+    index.add(["install"], ["Upgrade the server in place."])
+
+    assert index.search("ERR-4012", 3) == []
+    assert index.search("uvicorn", 3) == []
+    assert index.search("upgrade", 3)[0][0] == "install"
+    assert index.count == 2
+
+def test_index_is_built_lazily_from_the_loader():
+    pages = []
+
+    def loader(collection_name):
+        pages.append(collection_name)
+        yield list(DOCUMENTS), list(DOCUMENTS.values())
+
+    lexical_index = LexicalIndex(loader=loader)
+    lexical_index.add("docs", ["ignored"], ["not built yet"])
+    assert lexical_index.search("docs", "uvicorn", 3)[0][0] == "install"
+    lexical_index.add("docs", ["new"], ["uvicorn workers"])
+    assert {doc_id for doc_id, _ in lexical_index.search("docs", "uvicorn", 3)} == {"install", "new"}
+    assert pages == ["docs"]
+
+def test_reciprocal_rank_fusion_weights():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], [1.0, 1.0], k=60)
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "c"]
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], [1.0, 0.0], k=60)
+    assert [doc_id for doc_id, _ in fused] == ["a", "b"]
+
+def test_hybrid_query_finds_keyword_match_missed_by_dense_search(tmp_path, monkeypatch):
+    client = ChromaDBClient(backend="embedded")
+    client.store.directory = str(tmp_path)
+
+    class FakeEmbeddings:
+        """Embeds everything onto the same axis except vector-related text"""
+
+        def embed_documents(self, texts):
+            return [self.embed_query(text) for text in texts]
+
+        embed_queries = embed_documents
+
+        def embed_query(self, text):
+            return [1.0, 0.0] if "vector" in text.lower() else [0.0, 1.0]
+
+    monkeypatch.setattr(sys.modules["src.db.chroma_client"], "get_embedding_service", lambda: FakeEmbeddings())
+    client.add_documents(
+        "docs",
+        documents=list(DOCUMENTS.values()),
+        ids=list(DOCUMENTS),
+        metadatas=[{"source": f"{doc_id}.md", "chunk": 0} for doc_id in DOCUMENTS]
+    )
+
+    dense = client.query_collection("docs", "vector search for ERR-4012", n_results=1, lexical_weight=0)
+    hybrid = client.query_collection("docs", "vector search for ERR-4012", n_results=2, lexical_weight=2.0)
+
+    assert [doc["metadata"]["source"] for doc in dense] == ["vectors.md"]
+    assert [doc["metadata"]["source"] for doc in hybrid] == ["errors.md", "vectors.md"]
@@ -0,0 +1,87 @@
+import sys
+import os
+
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from prometheus_client import REGISTRY
+
+from src.core import metrics
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_observe_ollama_splits_phases_and_computes_throughput():
+    before = sample("rag_ollama_tokens_total", model="metrics-test", kind="completion")
+    metrics.observe_ollama("metrics-test", 1.5, {
+        "load_duration": 100_000_000,
+        "prompt_eval_count": 40,
+        "prompt_eval_duration": 200_000_000,
+        "eval_count": 50,
+        "eval_duration": 1_000_000_000,
+    })
+
+    assert sample("rag_ollama_tokens_total", model="metrics-test", kind="completion") - before == 50
+    assert sample("rag_ollama_tokens_per_second", model="metrics-test", phase="eval") == 50
+    assert sample("rag_ollama_tokens_per_second", model="metrics-test", phase="prompt_eval") == 200
+    assert sample("rag_ollama_duration_seconds_sum", model="metrics-test", phase="prompt_eval") >= 0.2
+    assert sample("rag_ollama_duration_seconds_count", model="metrics-test", phase="http") >= 1
+
+def test_timed_iter_observes_one_stage_sample():
+    before = sample("rag_stage_duration_seconds_count", stage="test_iter")
+    assert list(metrics.timed_iter(iter([1, 2, 3]), "test_iter")) == [1, 2, 3]
+    assert sample("rag_stage_duration_seconds_count", stage="test_iter") - before == 1
+
+def test_requests_are_counted_by_route_collection_and_model(monkeypatch):
+    from src.main import app
+    from src.api.dependencies.dependencies import get_chroma_client, get_ollama_service
+    from src.services.langgraph_service import langgraph_service
+
+    async def answer(**kwargs):
+        return {"answer": "a", "sources": []}
+
+    for known, names in ((metrics.known_collections, {"docs"}), (metrics.known_models, {"m"})):
+        monkeypatch.setattr(known, "loader", lambda names=names: names)
+        monkeypatch.setattr(known, "names", frozenset(names))
+
+    labels = {"route": "/ask", "method": "GET", "status": "200", "collection": "docs", "model": "m"}
+    before = sample("rag_http_requests_total", **labels)
+    # Unknown names and multi-collection requests share a few label values
+    other = {**labels, "collection": "other", "model": "other"}
+    multi = {**labels, "collection": "multi"}
+    before_other, before_multi = sample("rag_http_requests_total", **other), sample("rag_http_requests_total", **multi)
+    monkeypatch.setattr(langgraph_service, "run_agent", answer)
+    app.dependency_overrides[get_chroma_client] = lambda: None
+    app.dependency_overrides[get_ollama_service] = lambda: None
+    try:
+        client = TestClient(app)
+        response = client.get("/ask", params={"query": "q", "collection_name": "docs", "model_name": "m"})
+        client.get("/ask", params={"query": "q", "collection_name": "random-1", "model_name": "random-2"})
+        client.get("/ask", params={"query": "q", "collection_name": "docs,random-3", "model_name": "m"})
+        exposition = client.get("/metrics")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert sample("rag_http_requests_total", **labels) - before == 1
+    assert sample("rag_http_requests_total", **other) - before_other == 1
+    assert sample("rag_http_requests_total", **multi) - before_multi == 1
+    assert "random-" not in exposition.text
+    assert exposition.status_code == 200
+    assert "rag_scheduler_queue_depth" in exposition.text
+    assert "rag_stage_duration_seconds" in exposition.text
+
+def test_known_names_are_only_loaded_outside_lookups():
+    calls = []
+    known = metrics.KnownNames(lambda: calls.append(1) or {"docs"})
+
+    assert "docs" not in known and calls == []
+    known.refresh(max_age=60)
+    known.refresh(max_age=60)
+    assert "docs" in known and len(calls) == 1
+
+    # Names created by this process are known right away
+    known.add("new")
+    assert "new" in known and len(calls) == 1
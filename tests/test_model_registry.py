@@ -0,0 +1,71 @@
+import sys
+import os
+import json
+import asyncio
+
+import httpx
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.model_registry import ModelRegistry, parse_model_specs
+from src.services.ollama_service import OllamaService
+
+def test_parse_model_specs():
+    assert parse_model_specs("tinyllama:latest=8, llama3:8b=2,phi3", 4) == {
+        "tinyllama:latest": 8,
+        "llama3:8b": 2,
+        "phi3": 4,
+    }
+
+def test_per_request_models_with_separate_concurrency_limits():
+    """Two models are served side by side, each within its own limit, without touching the default"""
+    registry = ModelRegistry({"small": 3, "large": 1}, default_model="small", keep_alive="5m")
+    in_flight = {"small": 0, "large": 0, "other": 0}
+    peak = {"small": 0, "large": 0, "other": 0}
+    payloads = []
+
+    async def handler(request):
+        payload = json.loads(request.content)
+        payloads.append(payload)
+        model = payload["model"]
+        in_flight[model] += 1
+        peak[model] = max(peak[model], in_flight[model])
+        await asyncio.sleep(0.01)
+        in_flight[model] -= 1
+        return httpx.Response(200, json={"response": model})
+
+    async def run():
+        service = OllamaService(registry=registry)
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        answers = await asyncio.gather(*(
+            service.generate_response("q", model_name=model, temperature=0.1)
+            for model in ["small", "large"] * 4 + ["other"]
+        ))
+        await service.close()
+        return answers, service.model_name
+
+    answers, default_model = asyncio.run(run())
+
+    assert answers == ["small", "large"] * 4 + ["other"]
+    assert default_model == "small"
+    assert peak == {"small": 3, "large": 1, "other": 1}
+    keep_alive = {payload["model"]: payload["keep_alive"] for payload in payloads}
+    assert keep_alive == {"small": -1, "large": -1, "other": "5m"}
+    assert all(payload["options"]["temperature"] == 0.1 for payload in payloads)
+    stats = {model["name"]: model for model in registry.stats()}
+    assert stats["large"]["requests"] == 4
+    assert stats["other"]["preload"] is False
+
+def test_unconfigured_models_are_bounded():
+    registry = ModelRegistry({"small": 3}, default_model="small", max_unconfigured=2)
+    busy = registry.get("busy")
+    busy.in_flight = 1
+    for i in range(100):
+        registry.get(f"random-{i}")
+
+    # The busy model and the most recent one are kept, configured models always are
+    assert {model["name"] for model in registry.stats()} == {"small", "busy", "random-99"}
+    assert "random-0" not in registry and "busy" in registry
+    assert registry.get("busy") is busy
+    assert registry.preloaded() == ["small"]
@@ -0,0 +1,113 @@
+import sys
+import os
+import threading
+import time
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.config import settings
+from src.db.chroma_client import ChromaDBClient
+from src.services.embedding_service import hash_encoder
+
+class HashEmbeddings:
+    """Deterministic offline embeddings"""
+
+    def __init__(self):
+        self.encode = hash_encoder(dim=64)
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [list(map(float, vector)) for vector in self.encode(texts)]
+
+    embed_queries = embed_documents
+
+def make_client(tmp_path, monkeypatch):
+    client = ChromaDBClient(backend="embedded")
+    client.store.directory = str(tmp_path)
+    embeddings = HashEmbeddings()
+    monkeypatch.setattr(sys.modules["src.db.chroma_client"], "get_embedding_service", lambda: embeddings)
+    return client, embeddings
+
+def add(client, collection_name, documents):
+    client.add_documents(
+        collection_name,
+        documents=list(documents.values()),
+        ids=list(documents),
+        metadatas=[{"source": f"{doc_id}.md"} for doc_id in documents]
+    )
+
+def test_results_of_several_collections_are_merged_by_score(tmp_path, monkeypatch):
+    client, embeddings = make_client(tmp_path, monkeypatch)
+    add(client, "team-a", {"a1": "llama grazing habits in the andes", "shared": "alpaca wool is soft"})
+    add(client, "team-b", {"b1": "quarterly sales figures", "shared": "alpaca wool is soft"})
+    embeddings.calls = 0
+
+    context = client.query_collections(["team-a", "team-b"], "alpaca wool", n_results=3)
+
+    assert embeddings.calls == 1
+    assert context[0]["id"] == "shared" and context[0]["collection"] == "team-a"
+    assert sorted(doc["id"] for doc in context) == ["a1", "b1", "shared"]
+    assert all(0 < doc["score"] <= 1 for doc in context)
+    assert [doc["score"] for doc in context] == sorted((doc["score"] for doc in context), reverse=True)
+
+def test_a_slow_or_failing_collection_is_left_out(tmp_path, monkeypatch):
+    client, _ = make_client(tmp_path, monkeypatch)
+    add(client, "fast", {"f1": "fast answer"})
+    search = client.query_collection_batch
+
+    def slow_search(collection_name, *args):
+        if collection_name == "slow":
+            time.sleep(1)
+        if collection_name == "broken":
+            raise RuntimeError("collection unavailable")
+        return search(collection_name, *args)
+
+    monkeypatch.setattr(client, "query_collection_batch", slow_search)
+    started = time.monotonic()
+    context = client.query_collections(["slow", "broken", "fast"], "answer", n_results=2, timeout=0.2)
+
+    assert time.monotonic() - started < 0.9
+    assert [doc["id"] for doc in context] == ["f1"]
+
+def test_collections_are_merged_on_distance_and_relative_bm25_not_their_own_best_hit(tmp_path, monkeypatch):
+    client, _ = make_client(tmp_path, monkeypatch)
+    add(client, "team-a", {"a1": "alpaca wool is soft", "a2": "alpaca wool sweaters", "a3": "llama grazing habits"})
+    add(client, "team-b", {"b1": "wool prices"})
+
+    # Each collection's best hit scores 1 on its own; b1 must not displace a2
+    context = client.query_collections(["team-b", "team-a"], "alpaca wool", n_results=2, lexical_weight=0)
+    assert sorted(doc["id"] for doc in context) == ["a1", "a2"]
+    assert context[0]["score"] > context[1]["score"]
+
+    # "alpaca" is rare in the large collection, so its raw BM25 scores dwarf the small one's
+    add(client, "small", {"s1": "alpaca wool socks", "s2": "alpaca"})
+    add(client, "large", {**{f"l{i}": f"herd {i}" for i in range(20)}, "w1": "alpaca wool", "w2": "alpaca wool notes"})
+    context = client.query_collections(["large", "small"], "alpaca wool", n_results=2, vector_weight=0)
+    assert [doc["id"] for doc in context] == ["w1", "s1"]
+
+def test_a_collection_still_busy_is_not_searched_again(tmp_path, monkeypatch):
+    client, _ = make_client(tmp_path, monkeypatch)
+    add(client, "fast", {"f1": "fast answer"})
+    monkeypatch.setattr(settings, "RETRIEVAL_COLLECTION_MAX_IN_FLIGHT", 1)
+    search = client.query_collection_batch
+    release, slow_calls = threading.Event(), []
+
+    def slow_search(collection_name, *args):
+        if collection_name == "slow":
+            slow_calls.append(collection_name)
+            release.wait(5)
+        return search(collection_name, *args)
+
+    monkeypatch.setattr(client, "query_collection_batch", slow_search)
+    for _ in range(3):
+        context = client.query_collections(["slow", "fast"], "answer", n_results=2, timeout=0.1)
+        assert [doc["id"] for doc in context] == ["f1"]
+    assert slow_calls == ["slow"]
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while client._in_flight["slow"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client._in_flight == {"slow": 0, "fast": 0}
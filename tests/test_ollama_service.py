@@ -0,0 +1,102 @@
+import sys
+import os
+import json
+import asyncio
+
+import httpx
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.ollama_service import OllamaService
+
+def make_service(handler):
+    """Create an OllamaService whose pooled client talks to a mock transport"""
+    service = OllamaService()
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return service
+
+def test_generate_and_chat():
+    """The async client posts the expected payloads and parses the responses"""
+    seen = []
+
+    def handler(request):
+        payload = json.loads(request.content)
+        seen.append((request.url.path, payload))
+        if request.url.path == "/api/generate":
+            return httpx.Response(200, json={"response": " generated "})
+        return httpx.Response(200, json={"message": {"content": " chatted "}})
+
+    async def run():
+        service = make_service(handler)
+        answer = await service.generate_response("What is RAG?", context="Some context")
+        reply = await service.chat([{"role": "user", "content": "hi"}])
+        rag = await service.generate_rag_response("What is RAG?", ["a", "b"])
+        await service.close()
+        return answer, reply, rag
+
+    answer, reply, rag = asyncio.run(run())
+    assert answer == "generated"
+    assert reply == "chatted"
+    assert rag == "generated"
+    assert seen[0][0] == "/api/generate"
+    assert seen[0][1]["stream"] is False
+    assert "Some context" in seen[0][1]["prompt"]
+    assert seen[1][0] == "/api/chat"
+    assert "a\n\nb" in seen[2][1]["prompt"]
+
+def test_generate_error_status():
+    """Non-200 responses surface the Ollama error message"""
+    def handler(request):
+        return httpx.Response(404, json={"error": "model not found"})
+
+    async def run():
+        service = make_service(handler)
+        try:
+            await service.generate_response("hello")
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(run())
+        assert False, "expected an exception"
+    except Exception as e:
+        assert "404" in str(e)
+        assert "model not found" in str(e)
+
+def test_connect_sets_connected():
+    """connect() lists the models and marks the service connected"""
+    def handler(request):
+        return httpx.Response(200, json={"models": [{"name": "tinyllama:latest"}]})
+
+    async def run():
+        service = make_service(handler)
+        connected = await service.connect()
+        await service.close()
+        return connected, service.is_connected
+
+    assert asyncio.run(run()) == (True, True)
+
+def test_stream_response_yields_tokens_and_stats():
+    """stream_response decodes Ollama's NDJSON stream chunk by chunk"""
+    lines = [
+        {"response": "Hel", "done": False},
+        {"response": "lo", "done": False},
+        {"response": "", "done": True, "eval_count": 2, "eval_duration": 1000},
+    ]
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        body = "\n".join(json.dumps(line) for line in lines) + "\n"
+        return httpx.Response(200, content=body.encode())
+
+    async def run():
+        service = make_service(handler)
+        chunks = [chunk async for chunk in service.stream_response("hello")]
+        await service.close()
+        return chunks
+
+    chunks = asyncio.run(run())
+    assert "".join(chunk["response"] for chunk in chunks) == "Hello"
+    assert chunks[-1]["done"] is True
+    assert chunks[-1]["eval_count"] == 2
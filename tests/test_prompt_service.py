@@ -0,0 +1,64 @@
+import sys
+import os
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.model_registry import ModelRegistry
+from src.services.prompt_service import PromptBuilder, count_tokens
+
+def doc(content, source="a.txt"):
+    return {"content": content, "metadata": {"source": source}}
+
+def make_builder(context_window=1024):
+    registry = ModelRegistry({}, default_model="m", context_windows={"m": context_window})
+    return PromptBuilder(registry, reserved_tokens=16)
+
+def test_documents_are_packed_in_rank_order_within_the_budget():
+    builder = make_builder()
+    budget = builder.budget("m", max_tokens=100)
+    big = doc(" ".join(f"big{i}" for i in range(budget)))
+    context = [doc("alpha facts " * 20), big, doc("gamma facts " * 20, "c.txt")]
+
+    packed = builder.build("what?", context, "m", max_tokens=100)
+
+    assert [d["content"] for d in packed.context] == [context[0]["content"], context[2]["content"]]
+    assert packed.dropped == 1
+    assert packed.tokens <= budget
+    # Documents come first and the question last, after a stable prefix
+    assert packed.prompt.startswith("Context:\n[1] Source: a.txt\nalpha")
+    assert packed.prompt.endswith("Question: what?\n\nAnswer:")
+
+def test_near_duplicates_are_skipped():
+    text = "the quick brown fox jumps over the lazy dog near the river bank " * 3
+    packed = make_builder().build("q", [doc(text), doc(text + " extra", "copy.txt"), doc("something else entirely")], "m")
+
+    assert [d["metadata"]["source"] for d in packed.context] == ["a.txt", "a.txt"]
+    assert packed.duplicates == 1
+
+def test_an_oversized_top_document_is_truncated_to_fit():
+    builder = make_builder(context_window=512)
+    long_text = " ".join(f"word{i}" for i in range(5000))
+
+    packed = builder.build("q", [doc(long_text)], "m", max_tokens=64)
+
+    assert len(packed.context) == 1
+    assert long_text.startswith(packed.context[0]["content"])
+    assert count_tokens(packed.prompt) <= builder.budget("m", 64)
+
+def test_conversation_keeps_the_newest_turns_within_half_the_budget():
+    builder = make_builder(context_window=1024)
+    budget = builder.budget("m")
+    long_answer = " ".join(f"w{i}" for i in range(budget // 3))
+    history = [
+        {"role": "user", "content": "oldest question"},
+        {"role": "assistant", "content": long_answer},
+        {"role": "user", "content": "newer question"},
+        {"role": "assistant", "content": long_answer},
+    ]
+
+    packed = builder.build("follow-up?", [doc("facts")], "m", history=history, summary="talked about llamas")
+
+    assert packed.prompt.startswith("Conversation so far:\nSummary: talked about llamas\nUser: newer question\n")
+    assert "oldest question" not in packed.prompt
+    assert packed.tokens <= budget
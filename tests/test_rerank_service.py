@@ -0,0 +1,79 @@
+import sys
+import os
+import asyncio
+import time
+
+import numpy as np
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.config import settings
+from src.services.rerank_service import RerankService
+
+class OverlapScorer:
+    """Fake cross-encoder scoring a pair by the words the query and document share"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.pairs = 0
+
+    def __call__(self, pairs):
+        self.pairs += len(pairs)
+        time.sleep(self.delay * len(pairs))
+        return np.array([len(set(query.split()) & set(doc.split())) for query, doc in pairs], dtype=np.float32)
+
+def docs(*contents):
+    return [{"id": f"id{i}", "content": content, "metadata": {}} for i, content in enumerate(contents)]
+
+def test_rerank_orders_by_score_and_caches_pairs():
+    scorer = OverlapScorer()
+    service = RerankService(batch_size=2, scorer=scorer)
+    documents = docs("nothing here", "red apple", "red apple pie", "pie")
+
+    top = service.rerank("red apple pie", documents, top_k=2)
+    assert [d["id"] for d in top] == ["id2", "id1"]
+    assert scorer.pairs == 4
+
+    service.rerank("red apple pie", documents, top_k=2)
+    assert scorer.pairs == 4
+    assert service.stats()["cache_hits"] == 4
+
+def test_rerank_is_skipped_when_it_would_exceed_the_budget():
+    scorer = OverlapScorer(delay=0.005)
+    service = RerankService(batch_size=4, latency_budget_ms=50, scorer=scorer)
+    service.rerank("q", docs("a", "q"), top_k=1)
+
+    documents = docs(*[f"doc {i}" for i in range(40)])
+    top = service.rerank("other query", documents, top_k=3)
+
+    assert top == documents[:3]
+    assert scorer.pairs == 2
+    assert service.stats()["skipped"] == 1
+
+def test_agent_over_fetches_and_generates_from_reranked_context(monkeypatch):
+    from src.db.chroma_client import chroma_client
+    from src.services.langgraph_service import LangGraphService
+    from src.services.ollama_service import ollama_service
+
+    fetched = {}
+    prompts = []
+
+    def fake_query_collection(collection_name, query_text, n_results, vector_weight, lexical_weight):
+        fetched["n_results"] = n_results
+        return docs("unrelated", "also unrelated", "the answer about llamas")
+
+    async def fake_generate_response(query, **kwargs):
+        prompts.append(query)
+        return "answer"
+
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(chroma_client, "query_collection", fake_query_collection)
+    monkeypatch.setattr(ollama_service, "generate_response", fake_generate_response)
+
+    service = LangGraphService(reranker=RerankService(scorer=OverlapScorer()))
+    result = asyncio.run(service.run_agent("about llamas", "docs", n_results=1))
+
+    assert fetched["n_results"] == settings.RERANK_CANDIDATES
+    assert [source["id"] for source in result["sources"]] == ["id2"]
+    assert "llamas" in prompts[0] and "also unrelated" not in prompts[0]
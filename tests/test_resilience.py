@@ -0,0 +1,120 @@
+import sys
+import os
+import asyncio
+
+import httpx
+import pytest
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core import resilience
+from src.core.config import settings
+from src.core.resilience import BackendUnavailable, CircuitBreaker, HealthProber, call_with_retry
+from src.services.ollama_service import OllamaService
+
+def test_breaker_opens_fails_fast_and_closes_after_a_trial(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("backend", failure_threshold=2, reset_timeout=10)
+
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            with breaker.guard():
+                raise httpx.ConnectError("refused")
+    assert breaker.state == "open"
+    with pytest.raises(BackendUnavailable) as rejected:
+        breaker.before_call()
+    assert rejected.value.retry_after == 10
+
+    now[0] = 11
+    breaker.before_call()
+    # Only one trial call at a time
+    with pytest.raises(BackendUnavailable):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 0, "opened": 1, "rejected": 2}
+
+def test_only_connection_errors_are_retried(monkeypatch):
+    monkeypatch.setattr(settings, "BACKEND_RETRY_BASE_DELAY", 0)
+    breaker = CircuitBreaker("backend", failure_threshold=10)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise httpx.ConnectError("refused")
+        return "ok"
+
+    assert call_with_retry(flaky, breaker, retries=2) == "ok"
+    assert breaker.stats()["consecutive_failures"] == 0
+
+    def refused_request():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    calls.clear()
+    with pytest.raises(ValueError):
+        call_with_retry(refused_request, breaker, retries=2)
+    assert len(calls) == 1
+
+def test_ollama_fails_fast_once_unreachable(monkeypatch):
+    monkeypatch.setattr(settings, "BACKEND_RETRIES", 0)
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.url.path)
+        raise httpx.ConnectError("connection refused")
+
+    async def run():
+        service = OllamaService()
+        service.breaker = CircuitBreaker("ollama", failure_threshold=2, reset_timeout=30)
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        errors = []
+        for _ in range(4):
+            try:
+                await service.generate_response("hello")
+            except Exception as e:
+                errors.append(type(e).__name__)
+        await service.close()
+        return errors
+
+    assert asyncio.run(run()) == ["Exception", "Exception", "BackendUnavailable", "BackendUnavailable"]
+    assert len(attempts) == 2
+
+def test_prober_trips_and_closes_breakers():
+    breaker = CircuitBreaker("backend")
+    healthy = [False]
+
+    async def probe():
+        if not healthy[0]:
+            raise ConnectionError("down")
+
+    async def run():
+        prober = HealthProber(interval=60, timeout=1)
+        prober.register("backend", probe, breaker)
+        await prober.probe_all()
+        down = (prober.status()["backend"]["healthy"], breaker.state)
+        healthy[0] = True
+        await prober.probe_all()
+        return down, (prober.status()["backend"]["healthy"], breaker.state)
+
+    assert asyncio.run(run()) == ((False, "open"), (True, "closed"))
+
+def test_prober_runs_post_probe_work_only_while_healthy():
+    healthy, refreshed = [False], []
+
+    async def probe():
+        if not healthy[0]:
+            raise ConnectionError("down")
+
+    async def run():
+        prober = HealthProber(interval=60, timeout=1)
+        prober.register("backend", probe, on_healthy=lambda: refreshed.append(1))
+        await prober.probe_all()
+        down = len(refreshed)
+        healthy[0] = True
+        await prober.probe_all()
+        return down, len(refreshed)
+
+    assert asyncio.run(run()) == (0, 1)
@@ -0,0 +1,92 @@
+import sys
+import os
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.model_registry import ModelRegistry
+from src.services.scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, LLMScheduler, SchedulerRejected
+
+def make_scheduler(max_concurrency=1, max_queue=8, queue_timeout=5):
+    registry = ModelRegistry({"m": max_concurrency}, default_model="m")
+    return LLMScheduler(registry, max_queue=max_queue, queue_timeout=queue_timeout)
+
+def test_interactive_requests_run_before_queued_batch_requests():
+    scheduler = make_scheduler()
+    order = []
+
+    async def request(name, priority):
+        async with scheduler.slot("m", priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        first = asyncio.create_task(request("first", PRIORITY_BATCH))
+        await asyncio.sleep(0)
+        queued = [asyncio.create_task(request(f"batch{i}", PRIORITY_BATCH)) for i in range(2)]
+        await asyncio.sleep(0)
+        queued.append(asyncio.create_task(request("interactive", PRIORITY_INTERACTIVE)))
+        await asyncio.gather(first, *queued)
+
+    asyncio.run(run())
+    assert order == ["first", "interactive", "batch0", "batch1"]
+    assert scheduler.registry.get("m").in_flight == 0
+
+def test_full_queue_and_deadline_are_rejected():
+    scheduler = make_scheduler(max_queue=1, queue_timeout=0.05)
+
+    async def run():
+        async with scheduler.slot("m"):
+            waiter = asyncio.create_task(scheduler.acquire("m"))
+            await asyncio.sleep(0)
+            with pytest.raises(SchedulerRejected) as full:
+                await scheduler.acquire("m")
+            with pytest.raises(SchedulerRejected) as expired:
+                await waiter
+        return full.value, expired.value
+
+    full, expired = asyncio.run(run())
+    assert full.reason == "queue full" and full.retry_after >= 1
+    assert expired.reason == "queue timeout"
+    stats = scheduler.stats()["m"]
+    assert stats["rejected"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["queue_depth"] == 0
+    assert scheduler.registry.get("m").in_flight == 0
+
+def test_rejection_is_a_429_with_retry_after(monkeypatch):
+    from src.main import app
+    from src.api.dependencies.dependencies import get_chroma_client, get_ollama_service
+    from src.services.langgraph_service import langgraph_service
+
+    async def overloaded(**kwargs):
+        raise SchedulerRejected("m", "queue full", 7)
+
+    monkeypatch.setattr(langgraph_service, "run_agent", overloaded)
+    app.dependency_overrides[get_chroma_client] = lambda: None
+    app.dependency_overrides[get_ollama_service] = lambda: None
+    try:
+        response = TestClient(app).get("/ask", params={"query": "q", "collection_name": "docs"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+
+def test_queues_of_forgotten_models_are_dropped():
+    registry = ModelRegistry({"m": 1}, default_model="m", max_unconfigured=2)
+    scheduler = LLMScheduler(registry)
+
+    async def run():
+        for i in range(50):
+            async with scheduler.slot(f"random-{i}"):
+                pass
+        async with scheduler.slot("m"):
+            pass
+
+    asyncio.run(run())
+    assert set(scheduler.stats()) == {"m", "random-48", "random-49"}
@@ -0,0 +1,78 @@
+import sys
+import os
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.db.chroma_client import ChromaDBClient
+from src.db.vector_store import matches_where
+from src.services.embedding_service import hash_encoder
+
+class HashEmbeddings:
+    """Deterministic offline embeddings"""
+
+    def __init__(self):
+        self.encode = hash_encoder(dim=64)
+
+    def embed_documents(self, texts):
+        return [list(map(float, vector)) for vector in self.encode(texts)]
+
+    embed_queries = embed_documents
+
+def make_client(tmp_path, monkeypatch):
+    client = ChromaDBClient(backend="embedded")
+    client.store.directory = str(tmp_path)
+    monkeypatch.setattr(sys.modules["src.db.chroma_client"], "get_embedding_service", lambda: HashEmbeddings())
+    chunks = {
+        "guide.md_0": ("alpaca wool is soft and warm", {"source": "guide.md", "chunk": 0}),
+        "guide.md_1": ("alpaca herds graze in the andes", {"source": "guide.md", "chunk": 1}),
+        "guide.md_2": ("shearing alpaca wool in spring", {"source": "guide.md", "chunk": 2}),
+        "notes.md_0": ("alpaca wool sweaters for sale", {"source": "notes.md", "chunk": 0}),
+    }
+    client.add_documents(
+        "docs",
+        documents=[doc for doc, _ in chunks.values()],
+        ids=list(chunks),
+        metadatas=[meta for _, meta in chunks.values()]
+    )
+    return client
+
+def test_where_filters_match_chroma_semantics():
+    metadata = {"source": "guide.md", "chunk": 3}
+    assert matches_where(metadata, {"source": "guide.md"})
+    assert matches_where(metadata, {"source": {"$in": ["guide.md", "notes.md"]}})
+    assert matches_where(metadata, {"$and": [{"chunk": {"$gte": 1}}, {"chunk": {"$lte": 3}}]})
+    assert matches_where(metadata, {"$or": [{"source": "notes.md"}, {"chunk": 3}]})
+    assert not matches_where(metadata, {"chunk": {"$gt": 3}})
+    assert not matches_where(metadata, {"page": {"$gte": 1}})
+    assert not matches_where(None, {"source": "guide.md"})
+
+def test_search_filters_by_source_and_chunk_in_both_rankings(tmp_path, monkeypatch):
+    client = make_client(tmp_path, monkeypatch)
+    where = {"$and": [{"source": {"$in": ["guide.md"]}}, {"chunk": {"$gte": 1}}]}
+
+    for vector_weight, lexical_weight in ((1.0, 0.0), (0.0, 1.0), (1.0, 1.0)):
+        [context] = client.query_collection_batch("docs", ["alpaca wool"], 10, vector_weight, lexical_weight,
+                                                  where=where)
+        assert sorted(doc["id"] for doc in context) == ["guide.md_1", "guide.md_2"]
+
+def test_search_returns_distances_of_vector_hits(tmp_path, monkeypatch):
+    client = make_client(tmp_path, monkeypatch)
+
+    dense, _ = client.query_collection_batch("docs", ["alpaca wool", "sweaters"], 4, 1.0, 0.0)
+    assert [doc["distance"] for doc in dense] == sorted(doc["distance"] for doc in dense)
+    assert all(0 <= doc["distance"] <= 2 for doc in dense)
+
+    [lexical_only] = client.query_collection_batch("docs", ["sweaters"], 4, 0.0, 1.0)
+    assert lexical_only[0]["id"] == "notes.md_0" and lexical_only[0]["distance"] is None
+
+def test_selective_filters_still_fill_the_lexical_page(tmp_path, monkeypatch):
+    client = make_client(tmp_path, monkeypatch)
+    # Many better BM25 matches outside the filter
+    noise = {f"noise.md_{i}": f"alpaca wool alpaca wool {i}" for i in range(50)}
+    client.add_documents("docs", documents=list(noise.values()), ids=list(noise),
+                         metadatas=[{"source": "noise.md", "chunk": i} for i in range(50)])
+
+    [context] = client.query_collection_batch("docs", ["alpaca wool"], 3, 0.0, 1.0, where={"source": "guide.md"})
+    assert sorted(doc["id"] for doc in context) == ["guide.md_0", "guide.md_1", "guide.md_2"]
+    assert all(doc["lexical_score"] > 0 for doc in context)
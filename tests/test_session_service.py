@@ -0,0 +1,140 @@
+import sys
+import os
+import asyncio
+import threading
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.config import settings
+from src.services.session_service import SessionStore
+
+def docs(*contents):
+    return [{"id": content, "content": content, "metadata": {"source": "test.txt"}} for content in contents]
+
+def fake_services(monkeypatch, results):
+    """Patch retrieval and generation, recording the queries and prompts"""
+    from src.db.chroma_client import chroma_client
+    from src.services.ollama_service import ollama_service
+
+    searches, prompts = [], []
+
+    def fake_query_collection(collection_name, query_text, n_results, vector_weight, lexical_weight):
+        searches.append(query_text)
+        return docs(*results.pop(0))
+
+    async def fake_generate_response(query, **kwargs):
+        prompts.append(query)
+        return f"answer {len(prompts)}"
+
+    async def fake_stream_response(query, **kwargs):
+        prompts.append(query)
+        yield {"response": f"answer {len(prompts)}", "done": False}
+        yield {"response": "", "done": True, "eval_count": 1}
+
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(chroma_client, "query_collection", fake_query_collection)
+    monkeypatch.setattr(ollama_service, "generate_response", fake_generate_response)
+    monkeypatch.setattr(ollama_service, "stream_response", fake_stream_response)
+    return searches, prompts
+
+def test_store_expires_idle_and_evicts_least_recently_used(monkeypatch):
+    from src.services import session_service
+
+    now = [0.0]
+    monkeypatch.setattr(session_service.time, "monotonic", lambda: now[0])
+    store = SessionStore(ttl=10, max_sessions=2)
+
+    store.touch("a")
+    store.touch("b")
+    store.touch("a")
+    store.touch("c")
+    assert not store.exists("b") and store.exists("a") and store.exists("c")
+
+    now[0] = 20
+    store.touch("d")
+    assert store.stats() == {"created": 4, "expired": 2, "evicted": 1, "sessions": 1, "ttl": 10, "max_sessions": 2}
+
+def test_session_turns_share_history_and_keep_one_checkpoint(monkeypatch):
+    from src.services.langgraph_service import LangGraphService
+
+    searches, prompts = fake_services(monkeypatch, [["llamas eat grass"], ["llamas live in the andes"]])
+    store = SessionStore()
+    service = LangGraphService(sessions=store)
+
+    asyncio.run(service.run_agent("what do llamas eat?", "docs", session_id="s1"))
+    result = asyncio.run(service.run_agent("where do they live?", "docs", session_id="s1"))
+
+    assert searches[1] == "what do llamas eat? where do they live?"
+    assert "User: what do llamas eat?\nAssistant: answer 1" in prompts[1]
+    # The previous turn's document is carried over to the follow-up
+    assert [source["id"] for source in result["sources"]] == ["llamas live in the andes", "llamas eat grass"]
+    assert len(store.saver.storage["s1"][""]) == 1
+
+    assert store.delete("s1")
+    assert not store.saver.storage and not store.saver.blobs and not store.saver.writes
+
+def test_history_is_windowed_and_streamed_turns_are_saved(monkeypatch):
+    from src.services.langgraph_service import LangGraphService
+
+    searches, prompts = fake_services(monkeypatch, [["a"], ["b"], ["c"]])
+    monkeypatch.setattr(settings, "SESSION_HISTORY_TURNS", 1)
+    service = LangGraphService(sessions=SessionStore())
+
+    async def stream(query):
+        return [event async for event, _ in service.stream_agent(query, "docs", session_id="s1")]
+
+    asyncio.run(service.run_agent("first?", "docs", session_id="s1"))
+    assert asyncio.run(stream("second?")) == ["sources", "token", "stats"]
+    asyncio.run(service.run_agent("third?", "docs", session_id="s1"))
+
+    assert "User: second?\nAssistant: answer 2" in prompts[2]
+    assert "first?" not in prompts[2]
+
+def test_sessions_continue_on_another_worker(tmp_path, monkeypatch):
+    from src.services.langgraph_service import LangGraphService
+    from src.services.session_saver import SqliteSessionSaver
+
+    searches, prompts = fake_services(monkeypatch, [["llamas eat grass"], ["llamas live in the andes"], ["c"]])
+    db_path = str(tmp_path / "shared.db")
+    # Two worker processes, each with its own session store and connection
+    workers = [LangGraphService(sessions=SessionStore(saver=SqliteSessionSaver(db_path))) for _ in range(2)]
+
+    asyncio.run(workers[0].run_agent("what do llamas eat?", "docs", session_id="s1"))
+    asyncio.run(workers[1].run_agent("where do they live?", "docs", session_id="s1"))
+    assert searches[1] == "what do llamas eat? where do they live?"
+    assert "Conversation so far" in prompts[1] and "answer 1" in prompts[1]
+
+    # Ending it in one worker ends it in all
+    assert workers[0].sessions.delete("s1")
+    assert not workers[1].sessions.saver.has_thread("s1")
+    asyncio.run(workers[1].run_agent("and now?", "docs", session_id="s1"))
+    assert "Conversation so far" not in prompts[2]
+
+def test_sqlite_saver_does_not_block_the_event_loop(tmp_path):
+    from src.services.session_saver import SqliteSessionSaver
+
+    saver = SqliteSessionSaver(str(tmp_path / "shared.db"))
+    config = {"configurable": {"thread_id": "s1", "checkpoint_ns": ""}}
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        # Another request holds the database while this one reads
+        saver._lock.acquire()
+        threading.Timer(0.2, saver._lock.release).start()
+        found = await saver.aget_tuple(config)
+        listed = [item async for item in saver.alist(config)]
+        ticker.cancel()
+        return found, listed, ticks
+
+    found, listed, ticks = asyncio.run(run())
+    assert found is None and listed == []
+    assert ticks >= 5
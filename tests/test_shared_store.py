@@ -0,0 +1,97 @@
+import sys
+import os
+import multiprocessing
+import sqlite3
+import time
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.db.shared_store import EVICT_EVERY, SharedStore
+
+def claim_in_child(db_path, results):
+    results.put(SharedStore(db_path).claim("probe:chroma", 60))
+
+def test_values_expire_and_are_evicted_least_recently_used(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"))
+    store.put("short", b"x", ttl=0.01)
+    store.put_json("json", {"ids": ["a"]})
+    time.sleep(0.02)
+    assert store.get("short") is None
+    assert store.get_json("json") == {"ids": ["a"]}
+
+    small = SharedStore(str(tmp_path / "small.db"), max_entries=EVICT_EVERY // 2)
+    for i in range(EVICT_EVERY):
+        small.put(f"key {i}", b"value")
+    assert small.stats()["entries"] == small.max_entries
+    assert small.get(f"key {EVICT_EVERY - 1}") == b"value"
+    assert small.get("key 0") is None
+
+def test_workers_see_each_others_values_and_counters(tmp_path):
+    path = str(tmp_path / "shared.db")
+    first, second = SharedStore(path), SharedStore(path)
+    first.put("embedding", b"\x00\x01")
+    assert second.get("embedding") == b"\x00\x01"
+
+    assert second.counter("collection_generation", "docs") == 0
+    assert first.incr("collection_generation", "docs") == 1
+    assert second.incr("collection_generation", "docs") == 2
+    assert first.counter("collection_generation", "docs") == 2
+    assert first.counter("collection_generation", "other") == 0
+
+def test_lease_is_held_by_one_process_until_it_expires(tmp_path):
+    path = str(tmp_path / "shared.db")
+    store = SharedStore(path)
+    assert store.claim("probe:chroma", 60)
+    # Renewing is allowed for the holder only
+    assert store.claim("probe:chroma", 60)
+
+    results = multiprocessing.Queue()
+    child = multiprocessing.Process(target=claim_in_child, args=(path, results))
+    child.start()
+    child.join()
+    assert results.get(timeout=5) is False
+
+    assert store.claim("probe:chroma", 0)
+    child = multiprocessing.Process(target=claim_in_child, args=(path, results))
+    child.start()
+    child.join()
+    assert results.get(timeout=5) is True
+
+def test_hits_refresh_last_use_only_once_it_is_old(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"), ttl=100)
+    store.put("key", b"value")
+    conn = store.get_connection()
+    conn.execute("UPDATE entries SET accessed_at = ?", (time.time() - 5,))
+    conn.commit()
+    (before,) = conn.execute("SELECT accessed_at FROM entries").fetchone()
+    assert store.get("key") == b"value"
+    assert conn.execute("SELECT accessed_at FROM entries").fetchone()[0] == before
+
+    conn.execute("UPDATE entries SET accessed_at = ?", (time.time() - 50,))
+    conn.commit()
+    assert store.get("key") == b"value"
+    assert conn.execute("SELECT accessed_at FROM entries").fetchone()[0] > time.time() - 1
+
+def test_counters_fall_back_to_this_process_while_the_database_is_locked(tmp_path):
+    path = str(tmp_path / "shared.db")
+    store = SharedStore(path, timeout=0.05)
+    assert store.incr("collection_generation", "docs") == 1
+
+    # Another worker holds the write lock
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    assert store.incr("collection_generation", "docs") == 2
+    assert store.counter("collection_generation", "docs") == 2
+    assert store.stats()["errors"] == 1
+    other.execute("ROLLBACK")
+
+    # The increment made while locked is written with the next one
+    assert store.incr("collection_generation", "docs") == 3
+    assert SharedStore(path).counter("collection_generation", "docs") == 3
+
+    # Reads that fail too keep the last known value
+    broken = SharedStore(str(tmp_path))
+    assert broken.counter("collection_generation", "docs") == 0
+    assert broken.incr("collection_generation", "docs") == 1
+    assert broken.counter("collection_generation", "docs") == 1
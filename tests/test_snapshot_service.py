@@ -0,0 +1,87 @@
+import sys
+import os
+import zipfile
+
+import numpy as np
+import pytest
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.db.chroma_client import ChromaDBClient
+from src.db.manifest_store import ManifestStore
+from src.services.cache_service import AnswerCache
+from src.services.embedding_service import hash_encoder
+from src.services.snapshot_service import SnapshotService
+
+class HashEmbeddings:
+    """Deterministic offline embeddings counting the texts they embed"""
+
+    def __init__(self):
+        self.encode = hash_encoder(dim=64)
+        self.texts = 0
+
+    def embed_documents(self, texts):
+        self.texts += len(texts)
+        return [list(map(float, vector)) for vector in self.encode(texts)]
+
+    embed_queries = embed_documents
+
+def make_service(directory, tmp_path):
+    client = ChromaDBClient(backend="embedded")
+    client.store.directory = str(directory)
+    return SnapshotService(client, ManifestStore(str(tmp_path / f"{directory.name}.db")), AnswerCache())
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    embeddings = HashEmbeddings()
+    monkeypatch.setattr(sys.modules["src.db.chroma_client"], "get_embedding_service", lambda: embeddings)
+    return embeddings
+
+def test_snapshot_round_trip_reuses_embeddings(tmp_path, embeddings):
+    source = make_service(tmp_path / "source", tmp_path)
+    documents = [f"document {i} about alpacas and llamas" for i in range(25)]
+    source.client.add_documents(
+        "docs",
+        documents=documents,
+        ids=[f"id-{i}" for i in range(25)],
+        metadatas=[{"source": "animals.md", "chunk": i} for i in range(25)]
+    )
+    path = str(tmp_path / "docs.npz")
+
+    manifest = source.export_collection("docs", path, dtype="float16", page_size=10)
+    assert (manifest["count"], manifest["pages"], manifest["dim"]) == (25, 3, 64)
+    assert np.load(path)["embeddings_000000"].dtype == np.float16
+
+    target = make_service(tmp_path / "target", tmp_path)
+    embedded = embeddings.texts
+    report = target.import_collection(path, "restored")
+
+    assert embeddings.texts == embedded
+    assert report["documents_added"] == 25
+    page = target.client.store.get("restored", ids=["id-7"], include_embeddings=True)
+    assert page["documents"] == [documents[7]]
+    assert page["metadatas"] == [{"source": "animals.md", "chunk": 7}]
+    original = source.client.store.get("docs", ids=["id-7"], include_embeddings=True)["embeddings"]
+    assert np.allclose(page["embeddings"], original, atol=1e-3)
+    assert target.manifests.get("restored", "animals.md")["id-7"] == 7
+
+    results = target.client.query_collection("restored", documents[7], n_results=1)
+    assert results[0]["id"] == "id-7"
+
+def test_import_refuses_snapshots_of_another_model(tmp_path, embeddings):
+    service = make_service(tmp_path / "source", tmp_path)
+    service.client.add_documents("docs", documents=["text"], ids=["a"], metadatas=[{"source": "a.md", "chunk": 0}])
+    path = str(tmp_path / "docs.npz")
+    service.export_collection("docs", path)
+
+    with zipfile.ZipFile(path) as archive:
+        members = {name: archive.read(name) for name in archive.namelist()}
+    members["snapshot.json"] = members["snapshot.json"].replace(b'"embedding_model": "', b'"embedding_model": "other:')
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+    with pytest.raises(ValueError):
+        service.import_collection(path, "copy")
+    assert service.import_collection(path, "copy", force=True)["documents_added"] == 1
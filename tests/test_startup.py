@@ -0,0 +1,59 @@
+import sys
+import os
+import asyncio
+import subprocess
+
+# Add the parent directory to the path so we can import the src module
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from src.core.startup import Warmup
+
+def test_importing_the_app_leaves_the_heavy_dependencies_unloaded():
+    code = (
+        "import sys, src.main\n"
+        "print(','.join(m for m in ('chromadb', 'langgraph', 'langchain_core') if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+def test_the_app_imports_with_the_chroma_backend_and_shared_state(tmp_path):
+    # Importing resilience first is how the Chroma backend's import of it used to cycle
+    code = "import src.core.resilience, src.main\nprint(src.main.health_prober.shared is not None)"
+    env = {**os.environ, "VECTOR_BACKEND": "chroma", "WORKERS": "4", "SHARED_STATE_DB_PATH": str(tmp_path / "shared.db")}
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, env=env)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "True"
+
+def test_warmup_runs_sequences_concurrently_and_skips_after_a_failure():
+    order = []
+
+    def step(name, ok=True):
+        async def run():
+            order.append(name)
+            await asyncio.sleep(0)
+            if ok is None:
+                raise ConnectionError("refused")
+            return ok
+        return run
+
+    async def scenario():
+        warmup = Warmup()
+        warmup.start([
+            [("connect", step("connect", ok=False)), ("preload", step("preload"))],
+            [("load", step("load", ok=None))],
+            [("other", step("other"))],
+        ])
+        assert not warmup.done
+        await asyncio.sleep(0.05)
+        return warmup
+
+    warmup = asyncio.run(scenario())
+    status = warmup.status()
+    assert warmup.done
+    assert order == ["connect", "load", "other"]
+    assert {name: step["status"] for name, step in status["steps"].items()} == {
+        "connect": "failed", "preload": "skipped", "load": "failed", "other": "ok"
+    }
+    assert status["steps"]["load"]["error"] == "refused"
+    assert status["steps"]["preload"]["error"] == "connect failed"
@@ -0,0 +1,133 @@
+import sys
+import os
+import asyncio
+import json
+import threading
+import time
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core import tracing
+from src.core.config import settings
+from src.core.profiler import SamplingProfiler, read_folded, render_flamegraph, write_folded
+
+class Store:
+    @tracing.traced("chroma.query_collection_batch")
+    def query(self, collection_name, n_results=3):
+        time.sleep(0.01)
+        return collection_name
+
+    @tracing.traced("ollama.generate")
+    async def generate(self):
+        with tracing.span("ollama.http") as span:
+            span.set(eval_duration_ms=12.5)
+        return "answer"
+
+async def app(scope, receive, send):
+    store = Store()
+    store.query("docs", n_results=5)
+    await asyncio.to_thread(store.query, "other")
+    await store.generate()
+    if scope["path"] == "/busy":
+        # Keep a thread busy long enough to be sampled
+        deadline = time.perf_counter() + 0.2
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+def call(middleware, path, headers=(), query=b""):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": list(headers), "query_string": query}
+    asyncio.run(middleware(scope, None, send))
+    return dict(sent[0]["headers"])
+
+def test_spans_are_not_recorded_outside_a_trace():
+    assert tracing.current_trace() is None
+    with tracing.span("stage.retrieve") as span:
+        span.set(ignored=True)
+    assert Store().query("docs") == "docs"
+
+def test_requests_asking_for_it_are_traced_across_threads_and_tasks(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 0.0)
+    sink = tracing.TraceSink(str(tmp_path / "traces.jsonl"))
+    middleware = tracing.TracingMiddleware(app, sink)
+
+    assert b"x-trace-id" not in call(middleware, "/ask")
+    headers = call(middleware, "/ask", headers=[(b"x-trace", b"1")])
+    trace_id = headers[b"x-trace-id"].decode()
+
+    trace = sink.find(trace_id)
+    root, *spans = trace["spans"]
+    assert root["name"] == "GET /ask" and root["attributes"]["status"] == 200
+    assert [span["name"] for span in spans] == [
+        "chroma.query_collection_batch", "chroma.query_collection_batch", "ollama.generate", "ollama.http"
+    ]
+    assert spans[0]["attributes"] == {"collection_name": "docs", "n_results": 5}
+    assert spans[1]["parent_id"] == root["span_id"] and spans[0]["duration_ms"] >= 10
+    assert spans[3]["parent_id"] == spans[2]["span_id"]
+    assert spans[3]["attributes"]["eval_duration_ms"] == 12.5
+
+def test_profiled_requests_save_their_stacks(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(settings, "PROFILE_INTERVAL", 0.001)
+    sink = tracing.TraceSink(str(tmp_path / "traces.jsonl"))
+    middleware = tracing.TracingMiddleware(app, sink)
+
+    # Profiling is off unless enabled
+    assert b"x-trace-id" not in call(middleware, "/busy", query=b"profile=1")
+    monkeypatch.setattr(settings, "PROFILING_ENABLED", True)
+    headers = call(middleware, "/busy", query=b"profile=1")
+    trace_id = headers[b"x-trace-id"].decode()
+
+    stacks = read_folded(tracing.profile_path(trace_id))
+    assert any("app (test_tracing.py" in stack for stack in stacks)
+    root = sink.find(trace_id)["spans"][0]["attributes"]
+    assert root["profile_samples"] > 0 and "all threads" in root["profile_scope"]
+
+def test_only_the_latest_profiles_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILE_MAX_FILES", 2)
+    for i, trace_id in enumerate("abc"):
+        tracing.save_profile(trace_id, {"main;work": 1})
+        os.utime(tracing.profile_path(trace_id), (i, i))
+    tracing.save_profile("d", {"main;work": 1})
+    assert sorted(os.listdir(tmp_path)) == ["c.folded", "d.folded"]
+
+def test_profiler_folds_stacks_and_renders_a_flamegraph(tmp_path):
+    stop = threading.Event()
+
+    def spin():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=spin, name="spinner")
+    worker.start()
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    time.sleep(0.05)
+    stacks = profiler.stop()
+    stop.set()
+    worker.join()
+
+    assert any(stack.startswith("spinner;") and "spin (test_tracing.py" in stack for stack in stacks)
+    write_folded(str(tmp_path / "profile.folded"), stacks)
+    assert read_folded(str(tmp_path / "profile.folded")) == stacks
+    svg = render_flamegraph(stacks, title="test")
+    assert svg.startswith("<svg") and "spinner" in svg
+
+def test_sink_rotates_and_still_finds_older_traces(tmp_path):
+    sink = tracing.TraceSink(str(tmp_path / "traces.jsonl"), max_bytes=10)
+    sink.write({"trace_id": "a" * 32, "spans": []})
+    sink.write({"trace_id": "b" * 32, "spans": []})
+    assert os.path.exists(sink.path + ".1")
+    assert sink.find("a" * 32)["trace_id"] == "a" * 32
+    assert sink.find("b" * 32)["trace_id"] == "b" * 32
+    assert sink.find("c" * 32) is None
+    with open(sink.path) as f:
+        assert json.loads(f.readline())["trace_id"] == "b" * 32
@@ -0,0 +1,68 @@
+import sys
+import os
+
+import pytest
+
+# Add the parent directory to the path so we can import the src module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.db.embedded_store import EmbeddedVectorStore
+
+def add_points(store):
+    store.add(
+        "points",
+        ids=["a", "b", "c"],
+        documents=["east", "north", "north-east"],
+        metadatas=[{"source": "a.txt", "chunk": 0}, {"source": "b.txt", "chunk": 0}, {"source": "c.txt", "chunk": 0}],
+        embeddings=[[1.0, 0.0], [0.0, 2.0], [1.0, 1.0]]
+    )
+
+def test_query_returns_nearest_documents_in_order(tmp_path):
+    store = EmbeddedVectorStore(str(tmp_path))
+    add_points(store)
+
+    results = store.query("points", query_embeddings=[[1.0, 0.1], [0.0, 1.0]], n_results=2)
+
+    assert results["ids"] == [["a", "c"], ["b", "c"]]
+    assert results["documents"][0] == ["east", "north-east"]
+    assert results["distances"][1][0] == pytest.approx(0.0, abs=1e-6)
+
+def test_deletes_and_updates_survive_reload(tmp_path):
+    store = EmbeddedVectorStore(str(tmp_path))
+    add_points(store)
+    store.delete("points", ["a"])
+    store.update_metadatas("points", ["c"], [{"source": "c.txt", "chunk": 3}])
+    store.add("points", ids=["b"], documents=["north again"], metadatas=[{"source": "b.txt", "chunk": 1}],
+              embeddings=[[0.0, 1.0]])
+
+    reloaded = EmbeddedVectorStore(str(tmp_path))
+    results = reloaded.query("points", query_embeddings=[[1.0, 0.0]], n_results=5)
+
+    assert reloaded.list_collections() == ["points"]
+    assert results["ids"] == [["c", "b"]]
+    assert results["metadatas"][0] == [{"source": "c.txt", "chunk": 3}, {"source": "b.txt", "chunk": 1}]
+
+def test_rejects_mismatched_dimensions_and_bad_names(tmp_path):
+    store = EmbeddedVectorStore(str(tmp_path))
+    add_points(store)
+
+    with pytest.raises(ValueError):
+        store.add("points", ids=["d"], documents=["up"], metadatas=[{}], embeddings=[[0.0, 0.0, 1.0]])
+    with pytest.raises(ValueError):
+        store.create_collection("../escape")
+
+def test_paging_skips_deleted_rows_and_sees_later_writes(tmp_path):
+    store = EmbeddedVectorStore(str(tmp_path))
+    add_points(store)
+    store.delete("points", ["b"])
+
+    assert store.get("points", offset=0, limit=1)["ids"] == ["a"]
+    assert store.get("points", offset=1, limit=1)["ids"] == ["c"]
+    assert store.get("points", offset=2, limit=1)["ids"] == []
+
+    store.add("points", ids=["a"], documents=["east again"], metadatas=[{"source": "a.txt", "chunk": 1}],
+              embeddings=[[1.0, 0.0]])
+    store.delete("points", ["c"])
+    page = store.get("points", offset=0, limit=5, include_embeddings=True)
+    assert page["ids"] == ["a"] and page["documents"] == ["east again"]
+    assert page["embeddings"].shape == (1, 2)